@@ -1 +1,15 @@
-from .task import Finder, Parser
+from .cache import ResultCache
+from .coordinator import Coordinator
+from .profiler import Profiler
+from .task import (
+    LSH,
+    Cluster,
+    CountScorer,
+    Finder,
+    IdfScorer,
+    Parser,
+    Scorer,
+    SearchIndex,
+    SimilarityGraph,
+    parsePredicates,
+)
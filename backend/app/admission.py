@@ -0,0 +1,193 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import math
+import time
+
+from .metrics import metrics
+
+ADMITTED = 200
+QUEUE_FULL = 429
+WAIT_TIMEOUT = 503
+
+
+class AdmissionLane:
+    """
+    Limits number of requests doing a kind of work(i.e. parsing STE) at the
+    same time. Requests over the limit wait in a bounded queue ordered by
+    priority, smaller first, so small STEs are not stuck behind large ones.
+    Requests are rejected right away when queue is full, and after maxWait
+    seconds in queue, so server sheds load instead of slowing every request.
+    Lane is used from event loop only.
+    """
+
+    def __init__(
+        self, name: str, limit: int, queueSize: int, maxWait: float = 30
+    ) -> None:
+        self.name = name
+        self.limit = max(limit, 1)
+        self.queueSize = max(queueSize, 0)
+        self.maxWait = maxWait
+
+        self.running = 0
+        self.queued = 0
+        self.waiters = []
+        self.sequence = itertools.count()
+        # Moving average of seconds each admitted request holds the lane
+        self.serviceTime = 1.0
+
+    def getRetryAfter(self) -> int:
+        """Estimates seconds until queue of lane has room.
+
+        Returns:
+            int: Seconds to wait before retry
+        """
+        return max(math.ceil(self.serviceTime * (self.queued + 1) / self.limit), 1)
+
+    def isFull(self) -> bool:
+        """Checks if request would be rejected right away by acquire().
+
+        Returns:
+            bool: True if every slot is taken and queue is full
+        """
+        isFree = self.running < self.limit and self.queued == 0
+        return not isFree and self.queued >= self.queueSize
+
+    async def acquire(self, priority: float = 0) -> tuple:
+        """Takes a slot of lane. Waits in queue if lane is full.
+
+        Args:
+            priority (float, optional): Priority of request, smaller first.
+            Defaults to 0.
+
+        Returns:
+            tuple: (status, retryAfter). status is 200 if admitted, 429 if queue
+            is full, 503 if request waited for maxWait seconds. retryAfter is
+            seconds to wait before retry if rejected.
+        """
+        if self.running < self.limit and self.queued == 0:
+            self.running += 1
+            metrics.observe(
+                "admission_wait_seconds",
+                ("lane", self.name),
+                0.0,
+                "Seconds waited in admission queue",
+            )
+            return ADMITTED, 0
+        if self.queued >= self.queueSize:
+            logging.warning("Rejected %s request. Queue is full", self.name)
+            metrics.inc(
+                "admission_rejected_total",
+                ("lane", self.name),
+                help="Number of requests rejected with full queue",
+            )
+            return QUEUE_FULL, self.getRetryAfter()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), future))
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.maxWait)
+        except asyncio.TimeoutError:
+            logging.warning(
+                "Rejected %s request after waiting %.1f seconds",
+                self.name,
+                self.maxWait,
+            )
+            metrics.inc(
+                "admission_shed_total",
+                ("lane", self.name),
+                help="Number of requests rejected after waiting for maxWait",
+            )
+            return WAIT_TIMEOUT, self.getRetryAfter()
+        except asyncio.CancelledError:
+            # Client left. Hand over slot if it was given already
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                self.queued -= 1
+        metrics.observe(
+            "admission_wait_seconds",
+            ("lane", self.name),
+            time.perf_counter() - start,
+            "Seconds waited in admission queue",
+        )
+        return ADMITTED, 0
+
+    def release(self) -> None:
+        """Gives slot to request with highest priority in queue, or frees it."""
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                self.queued -= 1
+                future.set_result(True)
+                return
+        self.running -= 1
+
+    @contextlib.asynccontextmanager
+    async def admit(self, priority: float = 0):
+        """Holds slot of lane while block runs.
+
+        Example:
+            async with lane.admit(fileSize) as (status, retryAfter):
+                if status != ADMITTED:
+                    raise HTTPException(status, headers={"Retry-After": ...})
+                ...
+
+        Args:
+            priority (float, optional): Priority of request, smaller first.
+            Defaults to 0.
+        """
+        status, retryAfter = await self.acquire(priority)
+        if status != ADMITTED:
+            yield status, retryAfter
+            return
+        start = time.perf_counter()
+        try:
+            yield status, retryAfter
+        finally:
+            elapsed = time.perf_counter() - start
+            self.serviceTime = 0.8 * self.serviceTime + 0.2 * elapsed
+            self.release()
+
+
+class AdmissionController:
+    """
+    Admission lanes of server, i.e. parsing and searching, each with its own
+    concurrency limit and queue.
+    """
+
+    def __init__(self, lanes: list) -> None:
+        self.lanes = {lane.name: lane for lane in lanes}
+
+    def __getitem__(self, name: str) -> AdmissionLane:
+        return self.lanes[name]
+
+    def collect(self) -> list:
+        """Collects running and queued requests of each lane for /metrics.
+
+        Returns:
+            list: list of (name, help, value)
+        """
+        items = []
+        for name, lane in self.lanes.items():
+            items.append(
+                (
+                    f"admission_{name}_running",
+                    f"Number of {name} requests running",
+                    lane.running,
+                )
+            )
+            items.append(
+                (
+                    f"admission_{name}_queued",
+                    f"Number of {name} requests waiting in queue",
+                    lane.queued,
+                )
+            )
+        return items
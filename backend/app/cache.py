@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from .utils import Encoder
+
+
+class ResultCache:
+    """
+    LRU cache of search results. Keyed by fingerprint of input TCL data,
+    normalized search configuration and version of database.
+    """
+
+    def __init__(self, maxSize: int = 128) -> None:
+        self.maxSize = maxSize
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def makeKey(self, tclData: dict, findConfig: dict, version: int) -> str:
+        """Creates canonical key of search. Filters are normalized so
+        order of test cases and TCL variables doesn't matter.
+
+        Args:
+            tclData (dict): Parsed TCL data of input STE
+            findConfig (dict): Search configuration. Filters should be
+            dictionary of {testCase : list of TCL variables}.
+            version (int): Version of database
+
+        Returns:
+            str: SHA-256 hex digest of search
+        """
+        config = {}
+        for name, value in findConfig.items():
+            if isinstance(value, dict):
+                value = {
+                    key: sorted(item) if isinstance(item, list) else item
+                    for key, item in value.items()
+                }
+            config[name] = value
+        fingerprint = json.dumps(
+            [tclData, config, version],
+            sort_keys=True,
+            separators=(",", ":"),
+            cls=Encoder,
+        )
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def get(self, key: str) -> dict:
+        """Gets cached result and marks it as recently used.
+
+        Args:
+            key (str): Key of search
+
+        Returns:
+            dict: Cached result. None if not cached.
+        """
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+
+    def put(self, key: str, result: dict) -> None:
+        """Caches result. Evicts least recently used item when cache is full.
+
+        Args:
+            key (str): Key of search
+            result (dict): Search result
+        """
+        with self.lock:
+            self.items[key] = result
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxSize:
+                self.items.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes every cached result."""
+        with self.lock:
+            count = len(self.items)
+            self.items.clear()
+        logging.debug("Cleared %d cached results", count)
+
+    def apply(self, change: dict) -> None:
+        """Invalidates cache on change of database.
+
+        Args:
+            change (dict): Change from database
+        """
+        self.clear()
+
+    def getStats(self) -> dict:
+        """Returns statistics of cache.
+
+        Returns:
+            dict: size, maxSize, hits, misses of cache
+        """
+        with self.lock:
+            return {
+                "size": len(self.items),
+                "maxSize": self.maxSize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+from .metrics import metrics
+from .task import Finder, IdfScorer
+from .utils import Encoder
+
+
+class Coordinator:
+    """
+    Scatters search to shards and gathers their results. Each shard is a
+    backend server holding its own slice of test sessions, i.e. test sessions
+    of some TAS libraries. Shards return tie-inclusive top K of their own test
+    sessions, which are merged with same semantics as Finder.getTopk, and
+    detail of selected test sessions is read from the shard that owns them.
+    Search with "idf" scorer sends counts merged over every shard first, so
+    weights are same as single backend.
+    """
+
+    def __init__(self, shards: list, timeout: float = 60) -> None:
+        self.shards = [shard.rstrip("/") for shard in shards if shard]
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def post(
+        self, session: aiohttp.ClientSession, shard: str, path: str, item: str
+    ) -> tuple:
+        """Sends POST request to shard with error handling.
+
+        Args:
+            session (aiohttp.ClientSession): Session of requests
+            shard (str): URL of shard
+            path (str): Path of shard API
+            item (str): JSON body of request
+
+        Returns:
+            tuple: Status and JSON item
+        """
+        url = f"{shard}{path}"
+        try:
+            with metrics.timer("coordinator.shard"):
+                async with session.post(
+                    url, data=item, headers={"Content-Type": "application/json"}
+                ) as response:
+                    if response.status != 200:
+                        logging.error(
+                            "HTTP Error : %s [URL: %s] %s",
+                            response.status,
+                            url,
+                            await response.text(),
+                        )
+                        return False, {}
+                    return True, await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logging.error("Failed to connect [URL: %s]", url)
+            return False, {}
+
+    async def getReadiness(self) -> dict:
+        """Checks readiness of every shard.
+
+        Returns:
+            dict: {shard : True if ready}
+        """
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+
+            async def isReady(shard: str) -> bool:
+                try:
+                    async with session.get(f"{shard}/ready") as response:
+                        return response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    return False
+
+            results = await asyncio.gather(*[isReady(shard) for shard in self.shards])
+        return dict(zip(self.shards, results))
+
+    async def getFrequency(
+        self, session: aiohttp.ClientSession, testCases: list
+    ) -> dict:
+        """Gets counts of IDF scorer of every shard and merges them, so shards
+        weight TCL variables same as single backend over whole database.
+        Counts of shards that fail are left out.
+
+        Args:
+            session (aiohttp.ClientSession): Session of requests
+            testCases (list): Names of test cases of input
+
+        Returns:
+            dict: Merged frequency given by IdfScorer.mergeFrequency()
+        """
+        item = json.dumps({"testCases": testCases})
+        with metrics.timer("coordinator.frequency"):
+            results = await asyncio.gather(
+                *[
+                    self.post(session, shard, "/Shard/Frequency", item)
+                    for shard in self.shards
+                ]
+            )
+        return IdfScorer.mergeFrequency(
+            [item["frequency"] for status, item in results if status]
+        )
+
+    async def find(self, steData: dict, findConfig: dict) -> dict:
+        """Finds similar test sessions over every shard. Shards are searched in
+        parallel, and shards that fail are reported in failedShards instead
+        of failing whole search.
+
+        Args:
+            steData (dict): Parsed STE data
+            findConfig (dict): Configuration about topk and TCL constraints on search
+
+        Returns:
+            dict: name, top score, version of each shard, failed shards and
+            similarity analysis. Empty dict if no test session is found.
+        """
+        logging.info(
+            "Finding similar test suites with %s over %d shards",
+            steData["name"],
+            len(self.shards),
+        )
+        steJson = json.loads(json.dumps(steData, cls=Encoder))
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            frequency = None
+            if findConfig.get("scorer", None) == IdfScorer.name:
+                frequency = await self.getFrequency(
+                    session, list(steData["tclData"].keys())
+                )
+            findItem = json.dumps(
+                {"steData": steJson, "findConfig": findConfig, "frequency": frequency}
+            )
+            with metrics.timer("coordinator.scatter"):
+                results = await asyncio.gather(
+                    *[
+                        self.post(session, shard, "/Shard/Find", findItem)
+                        for shard in self.shards
+                    ]
+                )
+
+            scores, versions, failedShards = {}, {}, []
+            for shard, (status, item) in zip(self.shards, results):
+                if not status:
+                    failedShards.append(shard)
+                    continue
+                versions[shard] = item["version"]
+                for testSessionId, score in item["scores"].items():
+                    scores[(shard, int(testSessionId))] = score
+            if not scores:
+                logging.error("No shard found similar test suites")
+                return {}
+
+            with metrics.timer("finder.topk"):
+                topkResult, topScore = Finder.getTopk(scores, findConfig["topk"])
+            owned = {}
+            for (shard, testSessionId), score in topkResult.items():
+                owned.setdefault(shard, {})[testSessionId] = score
+
+            with metrics.timer("coordinator.gather"):
+                results = await asyncio.gather(
+                    *[
+                        self.post(
+                            session,
+                            shard,
+                            "/Shard/Detail",
+                            json.dumps(
+                                {"steData": steJson, "scores": shardScores},
+                                cls=Encoder,
+                            ),
+                        )
+                        for shard, shardScores in owned.items()
+                    ]
+                )
+
+        details = {}
+        for shard, (status, item) in zip(owned.keys(), results):
+            if not status:
+                failedShards.append(shard)
+                continue
+            for testSession in item["info"]:
+                details[(shard, testSession["id"])] = dict(testSession, shard=shard)
+        logging.info(
+            "Found %d items in top %d from %d shards",
+            len(details),
+            findConfig["topk"],
+            len(versions),
+        )
+        return {
+            "name": steData["name"],
+            "topScore": topScore,
+            "version": versions,
+            "failedShards": failedShards,
+            "info": [details[key] for key in topkResult if key in details],
+        }
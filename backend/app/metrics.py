@@ -0,0 +1,226 @@
+import contextvars
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+# Trace ID of request being handled
+traceId = contextvars.ContextVar("traceId", default="-")
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def newTraceId(value: str = None) -> str:
+    """Sets trace ID of current context. Creates new one if value is not given.
+
+    Args:
+        value (str, optional): Trace ID from client. Defaults to None.
+
+    Returns:
+        str: Trace ID
+    """
+    value = value or uuid.uuid4().hex
+    traceId.set(value)
+    return value
+
+
+def getTraceId() -> str:
+    """Gets trace ID of current context.
+
+    Returns:
+        str: Trace ID. "-" if not in a request.
+    """
+    return traceId.get()
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, as Prometheus histogram.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Timer:
+    """
+    Context manager which observes elapsed seconds to histogram.
+    """
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Registry of counters and histograms which is rendered in Prometheus
+    text exposition format. Metrics are keyed by name and a single label.
+    """
+
+    def __init__(self, prefix: str = "cifinder") -> None:
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = []
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name: str, label: tuple, help: str = "") -> Histogram:
+        """Gets histogram of name and label. Creates one if it doesn't exist.
+
+        Args:
+            name (str): Name of metric
+            label (tuple): (label name, label value)
+            help (str, optional): Description of metric. Defaults to "".
+
+        Returns:
+            Histogram: Histogram of name and label
+        """
+        key = (name, label)
+        histogram = self.histograms.get(key, None)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+                self.help.setdefault(name, help)
+        return histogram
+
+    def timer(self, stage: str) -> Timer:
+        """Times a stage of hot path.
+
+        Example:
+            with metrics.timer("finder.find"):
+                ...
+
+        Args:
+            stage (str): Name of stage
+
+        Returns:
+            Timer: Context manager which observes elapsed time of stage
+        """
+        return Timer(
+            self.histogram(
+                "stage_seconds", ("stage", stage), "Elapsed time of each stage"
+            )
+        )
+
+    def observe(self, name: str, label: tuple, value: float, help: str = "") -> None:
+        """Observes value to histogram.
+
+        Args:
+            name (str): Name of metric
+            label (tuple): (label name, label value)
+            value (float): Observed value
+            help (str, optional): Description of metric. Defaults to "".
+        """
+        self.histogram(name, label, help).observe(value)
+
+    def inc(self, name: str, label: tuple, value: float = 1, help: str = "") -> None:
+        """Increases counter.
+
+        Args:
+            name (str): Name of metric
+            label (tuple): (label name, label value)
+            value (float, optional): Amount to increase. Defaults to 1.
+            help (str, optional): Description of metric. Defaults to "".
+        """
+        key = (name, label)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.help.setdefault(name, help)
+
+    def addCollector(self, collector) -> None:
+        """Registers function which returns current values of gauges when rendered.
+
+        Args:
+            collector (callable): Function that returns list of
+            (name, help, value) tuples
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Renders metrics in Prometheus text exposition format.
+
+        Returns:
+            str: Metrics text
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        described = set()
+
+        def describe(name, metricType):
+            if name in described:
+                return
+            described.add(name)
+            lines.append(f"# HELP {self.prefix}_{name} {self.help.get(name, '')}")
+            lines.append(f"# TYPE {self.prefix}_{name} {metricType}")
+
+        for (name, (labelName, labelValue)), value in counters:
+            describe(name, "counter")
+            lines.append(f'{self.prefix}_{name}{{{labelName}="{labelValue}"}} {value}')
+
+        for (name, (labelName, labelValue)), histogram in histograms:
+            describe(name, "histogram")
+            label = f'{labelName}="{labelValue}"'
+            with histogram.lock:
+                counts = list(histogram.counts)
+                total, count = histogram.sum, histogram.count
+            cumulative = 0
+            for bound, bucketCount in zip(histogram.buckets, counts):
+                cumulative += bucketCount
+                lines.append(
+                    f'{self.prefix}_{name}_bucket{{{label},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{self.prefix}_{name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.prefix}_{name}_sum{{{label}}} {total}")
+            lines.append(f"{self.prefix}_{name}_count{{{label}}} {count}")
+
+        for collector in self.collectors:
+            for name, help, value in collector():
+                self.help.setdefault(name, help)
+                describe(name, "gauge")
+                lines.append(f"{self.prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of this process
+metrics = Metrics()
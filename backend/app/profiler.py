@@ -0,0 +1,178 @@
+import contextlib
+import contextvars
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+
+# Profile session of request being handled
+activeSession = contextvars.ContextVar("activeSession", default=None)
+
+
+class ProfileSession:
+    """
+    Profile of a single request. Stored once pipeline of request is finished.
+    """
+
+    __slots__ = ("profileId", "route", "stored")
+
+    def __init__(self, profileId: str, route: str) -> None:
+        self.profileId = profileId
+        self.route = route
+        self.stored = False
+
+
+class Profiler:
+    """
+    Opt-in profiler for individual requests. Admin sends token with
+    X-Profile-Token header or `profile` query parameter, and the pipeline of
+    request runs under cProfile. Profiles are saved as pstats files under
+    profile ID and can be fetched afterwards.
+    Profiling is disabled when token is not set, and costs nothing but a
+    context variable lookup.
+    """
+
+    def __init__(
+        self,
+        token: str = None,
+        profilePath: str = None,
+        interval: float = 60.0,
+        maxProfiles: int = 20,
+    ) -> None:
+        self.token = token or None
+        self.profilePath = profilePath
+        self.interval = interval
+        self.maxProfiles = maxProfiles
+        self.lastStarted = 0.0
+        self.running = False
+        self.lock = threading.Lock()
+        if self.isEnabled():
+            os.makedirs(self.profilePath, exist_ok=True)
+
+    def isEnabled(self) -> bool:
+        return self.token is not None and self.profilePath is not None
+
+    def isAuthorized(self, token: str) -> bool:
+        """Checks admin token in constant time.
+
+        Args:
+            token (str): Token from client
+
+        Returns:
+            bool: True if token matches
+        """
+        if not self.isEnabled() or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def start(self, route: str):
+        """Starts profile session of request if rate limit allows it.
+        Only one request is profiled at a time, at most once per interval.
+
+        Args:
+            route (str): Path of request
+
+        Returns:
+            tuple: (ProfileSession, retryAfter). ProfileSession is None
+            and retryAfter is seconds to wait if it is rate limited.
+        """
+        with self.lock:
+            now = time.monotonic()
+            retryAfter = self.lastStarted + self.interval - now
+            if self.running or retryAfter > 0:
+                return None, max(int(retryAfter) + 1, 1)
+            self.running = True
+            self.lastStarted = now
+        session = ProfileSession(uuid.uuid4().hex, route)
+        activeSession.set(session)
+        return session, 0
+
+    def finish(self, session: ProfileSession) -> None:
+        """Releases profiler for next request.
+
+        Args:
+            session (ProfileSession): Session given by start()
+        """
+        activeSession.set(None)
+        with self.lock:
+            self.running = False
+
+    @contextlib.contextmanager
+    def profile(self):
+        """Runs block under cProfile if current request is being profiled.
+
+        Example:
+            with profiler.profile():
+                scores = finder.find(...)
+        """
+        session = activeSession.get()
+        if session is None or session.stored:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.save(session, profile)
+
+    def save(self, session: ProfileSession, profile: cProfile.Profile) -> None:
+        """Saves profile as pstats file and removes oldest profiles over maxProfiles.
+
+        Args:
+            session (ProfileSession): Session of request
+            profile (cProfile.Profile): Finished profile
+        """
+        filePath = self.getProfilePath(session.profileId)
+        try:
+            profile.dump_stats(filePath)
+        except OSError:
+            logging.error("Failed to save profile %s", session.profileId)
+            return
+        session.stored = True
+        logging.info("Saved profile %s of %s", session.profileId, session.route)
+
+        profiles = sorted(
+            (entry for entry in os.scandir(self.profilePath) if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[: max(len(profiles) - self.maxProfiles, 0)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                logging.error("Failed to remove old profile %s", entry.name)
+
+    def getProfilePath(self, profileId: str) -> str:
+        return os.path.join(self.profilePath, f"{profileId}.prof")
+
+    def getProfile(self, profileId: str, sortBy: str = "cumulative", limit: int = 50):
+        """Gets saved profile.
+
+        Args:
+            profileId (str): ID of profile
+            sortBy (str, optional): pstats sort key of summary. Defaults to "cumulative".
+            limit (int, optional): Number of functions in summary. Defaults to 50.
+
+        Returns:
+            tuple: (path to pstats file, text summary). (None, None) if not found.
+        """
+        if not profileId.isalnum():
+            return None, None
+        filePath = self.getProfilePath(profileId)
+        if not os.path.isfile(filePath):
+            return None, None
+        stream = io.StringIO()
+        try:
+            stats = pstats.Stats(filePath, stream=stream)
+            stats.sort_stats(sortBy).print_stats(limit)
+        except (KeyError, OSError, TypeError, ValueError):
+            logging.error("Failed to read profile %s", profileId)
+            return None, None
+        return filePath, stream.getvalue()
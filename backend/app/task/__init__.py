@@ -1,2 +1,7 @@
+from .cluster import Cluster
 from .finder import Finder
+from .lsh import LSH
 from .parser import Parser
+from .scorer import CountScorer, IdfScorer, Scorer
+from .searchIndex import SearchIndex, parsePredicates
+from .similarity import SimilarityGraph
@@ -0,0 +1,301 @@
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from .snapshot import Snapshot, writeSnapshot
+
+
+class Cluster:
+    def __init__(
+        self,
+        db,
+        modelPath: str = None,
+        k: int = 8,
+        maxIter: int = 100,
+        seed: int = 0,
+    ) -> None:
+        self.db = db
+        self.modelPath = modelPath
+        self.k = k
+        self.maxIter = maxIter
+        self.seed = seed
+
+        # Model
+        self.vocabulary = {}
+        self.idf = None
+        self.centroids = None
+        self.testSessionIds = None
+        self.labels = None
+        self.invalid = set()
+        self.version = -1
+
+    def isReady(self) -> bool:
+        """Checks if model is built or loaded.
+
+        Returns:
+            bool: True if model is ready for prediction.
+        """
+        return self.centroids is not None
+
+    def build(self) -> bool:
+        """Builds TF-IDF vectors from True TCL variables of every test session
+        inside TestCase table, and clusters them with k-means.
+        Term frequency is number of test cases in test session that has such
+        TCL variable as True. Test sessions that are not able to download are
+        clustered too and excluded from candidates, so they become candidates
+        again when their status changes.
+
+        Returns:
+            bool: True if model is built.
+        """
+        logging.info("Building cluster model")
+        version = self.db.version
+        testCaseData = self.db.getEveryTestCaseData(downloadAvailOnly=False)
+        if not testCaseData:
+            logging.error("Failed to read test case data. Aborting build")
+            return False
+        validIds = set(self.db.TESTSESSION.getValidTestSessionIds())
+
+        documents = {}
+        for testSessionId, _, tcData in testCaseData:
+            documents.setdefault(testSessionId, []).extend(tcData.getTrueTcls())
+
+        terms = sorted({tcl for document in documents.values() for tcl in document})
+        if not terms:
+            logging.error("No True TCL variables in database. Aborting build")
+            return False
+        self.vocabulary = {tcl: idx for idx, tcl in enumerate(terms)}
+        self.testSessionIds = np.array(list(documents.keys()), dtype=np.int64)
+
+        tf = self.countTerms(list(documents.values()))
+        df = np.bincount(tf.indices, minlength=len(terms))
+        self.idf = np.log((1 + tf.shape[0]) / (1 + df)) + 1
+        X = self.normalize(tf.multiply(self.idf).tocsr())
+
+        self.centroids, self.labels = self.kmeans(X, min(self.k, X.shape[0]))
+        self.invalid = set(documents.keys()) - validIds
+        self.version = version
+        logging.info(
+            "Built cluster model | %d test sessions, %d TCL variables, %d clusters",
+            X.shape[0],
+            X.shape[1],
+            self.centroids.shape[0],
+        )
+        return True
+
+    def save(self, modelPath: str = None) -> bool:
+        """Saves model to modelPath.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if saved.
+        """
+        modelPath = modelPath or self.modelPath
+        if not self.isReady() or modelPath is None:
+            logging.error("No model or path to save")
+            return False
+        logging.debug("Saving cluster model at %s", modelPath)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        return writeSnapshot(
+            modelPath,
+            {
+                "terms": np.array(terms, dtype=str),
+                "idf": self.idf,
+                "centroids": self.centroids,
+                "testSessionIds": self.testSessionIds,
+                "labels": self.labels,
+                "invalid": np.array(sorted(self.invalid), dtype=np.int64),
+            },
+            {"version": self.version},
+        )
+
+    def load(self, modelPath: str = None) -> bool:
+        """Loads model from modelPath. Arrays are memory-mapped from snapshot.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if loaded.
+        """
+        modelPath = modelPath or self.modelPath
+        if modelPath is None:
+            logging.info("No path to cluster model")
+            return False
+        logging.debug("Loading cluster model from %s", modelPath)
+        model = Snapshot(modelPath)
+        if not model.open():
+            return False
+        self.vocabulary = {tcl: idx for idx, tcl in enumerate(model["terms"].tolist())}
+        self.idf = model["idf"]
+        self.centroids = model["centroids"]
+        self.testSessionIds = model["testSessionIds"]
+        self.labels = model["labels"]
+        self.invalid = set(model["invalid"].tolist())
+        self.version = int(model.meta["version"])
+        logging.info("Loaded cluster model with %d clusters", self.centroids.shape[0])
+        return True
+
+    def predict(self, tclData: dict) -> int:
+        """Predicts cluster of given test suite.
+
+        Args:
+            tclData (dict): TCL data of test suite, keyed by test case
+
+        Returns:
+            int: Index of cluster. -1 if it can't be predicted.
+        """
+        document = [
+            tcl
+            for tcData in tclData.values()
+            for tcl, value in tcData["boolean"].items()
+            if value
+        ]
+        x = self.normalize(self.countTerms([document]).multiply(self.idf).tocsr())
+        if x.nnz == 0:
+            logging.debug("No known True TCL variables in input")
+            return -1
+        distance = (self.centroids**2).sum(axis=1) - 2 * (x @ self.centroids.T)[0]
+        return int(np.argmin(distance))
+
+    def getCandidates(self, tclData: dict) -> set:
+        """Gets test sessions inside predicted cluster of given test suite.
+
+        Args:
+            tclData (dict): TCL data of test suite, keyed by test case
+
+        Returns:
+            set: Test session IDs inside cluster. None if cluster can't be predicted.
+        """
+        if not self.isReady():
+            return None
+        label = self.predict(tclData)
+        if label == -1:
+            return None
+        candidates = set(self.testSessionIds[self.labels == label].tolist())
+        candidates -= self.invalid
+        logging.debug("Cluster %d has %d test sessions", label, len(candidates))
+        return candidates
+
+    def apply(self, change: dict) -> None:
+        """Applies change of database incrementally. New test sessions are
+        assigned to the nearest cluster without re-training, and test sessions
+        that are not able to download are excluded from candidates.
+
+        Args:
+            change (dict): Change from database including version, table,
+            testSessionId, action, value
+        """
+        if not self.isReady() or change["version"] <= self.version:
+            return
+        testSessionId = change["testSessionId"]
+        if change["table"] == "TestSession":
+            if change["value"]:
+                self.invalid.discard(testSessionId)
+            else:
+                self.invalid.add(testSessionId)
+        elif change["table"] == "TestCase":
+            tclData = self.db.TESTCASE.getTestCaseByTestSessionId(testSessionId)
+            keep = self.testSessionIds != testSessionId
+            self.testSessionIds = self.testSessionIds[keep]
+            self.labels = self.labels[keep]
+            label = self.predict(tclData) if tclData else -1
+            if label != -1:
+                logging.debug(
+                    "Assigned test session %d to cluster %d", testSessionId, label
+                )
+                self.testSessionIds = np.append(self.testSessionIds, testSessionId)
+                self.labels = np.append(self.labels, label)
+        self.version = change["version"]
+
+    def countTerms(self, documents: list) -> sparse.csr_matrix:
+        """Counts known TCL variables of each document.
+
+        Args:
+            documents (list): list of documents(list of TCL variables)
+
+        Returns:
+            sparse.csr_matrix: Term frequency matrix(documents x vocabulary)
+        """
+        rows, cols = [], []
+        for row, document in enumerate(documents):
+            for tcl in document:
+                col = self.vocabulary.get(tcl, None)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        tf = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(documents), len(self.vocabulary)),
+        )
+        tf.sum_duplicates()
+        return tf
+
+    def normalize(self, X: sparse.csr_matrix) -> sparse.csr_matrix:
+        """L2 normalizes each row of X.
+
+        Args:
+            X (sparse.csr_matrix): Matrix to normalize
+
+        Returns:
+            sparse.csr_matrix: Normalized matrix
+        """
+        norm = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norm[norm == 0] = 1
+        return sparse.diags(1 / norm) @ X
+
+    def kmeans(self, X: sparse.csr_matrix, k: int) -> tuple:
+        """Clusters rows of X with k-means(Lloyd's algorithm) and k-means++
+        initialization.
+
+        Args:
+            X (sparse.csr_matrix): L2 normalized TF-IDF matrix
+            k (int): Number of clusters
+
+        Returns:
+            tuple: Centroids(k x vocabulary) and labels of each row
+        """
+        rng = np.random.default_rng(self.seed)
+        squaredNorm = np.asarray(X.multiply(X).sum(axis=1)).ravel()
+
+        def distanceTo(centroids):
+            return (
+                squaredNorm[:, None]
+                + (centroids**2).sum(axis=1)[None, :]
+                - 2 * np.asarray(X @ centroids.T)
+            )
+
+        # k-means++ initialization
+        centroids = X[rng.integers(X.shape[0])].toarray()
+        for _ in range(1, k):
+            distance = np.maximum(distanceTo(centroids).min(axis=1), 0)
+            if distance.sum() == 0:
+                idx = rng.integers(X.shape[0])
+            else:
+                idx = rng.choice(X.shape[0], p=distance / distance.sum())
+            centroids = np.vstack([centroids, X[idx].toarray()])
+
+        labels = np.full(X.shape[0], -1)
+        for iteration in range(self.maxIter):
+            distance = distanceTo(centroids)
+            newLabels = distance.argmin(axis=1)
+            if np.array_equal(labels, newLabels):
+                break
+            labels = newLabels
+            membership = sparse.csr_matrix(
+                (np.ones(X.shape[0]), (labels, np.arange(X.shape[0]))),
+                shape=(k, X.shape[0]),
+            )
+            counts = np.asarray(membership.sum(axis=1)).ravel()
+            sums = np.asarray((membership @ X).todense())
+            for label in np.flatnonzero(counts == 0):
+                # Re-seed empty cluster with farthest item
+                farthest = distance.min(axis=1).argmax()
+                sums[label] = X[farthest].toarray()
+                counts[label] = 1
+            centroids = sums / counts[:, None]
+        logging.debug("k-means finished after %d iterations", iteration + 1)
+        return centroids, labels
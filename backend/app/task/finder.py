@@ -4,13 +4,55 @@ from heapq import nlargest
 
 import numpy as np
 
+from ..metrics import metrics
+from .scorer import CountScorer, Scorer
+from .vocab import TclData, indexOf, vocabulary
+
+# Digits of total score compared by getTopk. Weighted scores are sums of
+# floats whose last bits depend on order of summation, so totals are rounded
+# before tied scores are compared.
+SCORE_DIGITS = 9
+
+# Patterns of string values which are not compared: bytes(0x...), byte(4 digits),
+# address(www.sprient.com), port(#(N000)), number(#(000)), ipv4 and ipv6
+STRING_PATTERNS = [
+    re.compile(r"^0x[a-fA-F0-9_]+"),
+    re.compile(r"^[a-fA-F0-9_]{4}"),
+    re.compile(
+        r"[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)"
+    ),
+    re.compile(r"[a-zA-Z]*#\(N[a-zA-Z0-9 /]+\)"),
+    re.compile(r"[a-zA-Z]*#\([a-zA-Z0-9 /]+\)"),
+    re.compile(
+        r"((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])"
+    ),
+    re.compile(
+        r"(([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,7}:|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}|[0-9a-fA-F]{1,4}:((:[0-9a-fA-F]{1,4}){1,6})|:((:[0-9a-fA-F]{1,4}){1,7}|:)|fe80:(:[0-9a-fA-F]{0,4}){0,4}%[0-9a-zA-Z]{1,}|::(ffff(:0{1,4}){0,1}:){0,1}((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])|([0-9a-fA-F]{1,4}:){1,4}:((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9]))"
+    ),
+]
+
 
 class Finder:
-    def __init__(self, db) -> None:
+    def __init__(self, db, cluster=None, lsh=None, index=None, scorers=None) -> None:
         self.db = db
+        self.cluster = cluster
+        self.lsh = lsh
+        self.index = index
+        self.scorers = {CountScorer.name: CountScorer()}
+        for scorer in scorers or []:
+            self.scorers[scorer.name] = scorer
 
     def find(
-        self, inputSte, filterConfigBoolean: dict = {}, filterConfigString: dict = {}
+        self,
+        inputSte,
+        filterConfigBoolean: dict = {},
+        filterConfigString: dict = {},
+        mode: str = "exact",
+        numericConfig: dict = None,
+        scorer: str = "count",
+        snapshot=None,
+        booleanScores: dict = None,
+        textConfig: dict = None,
     ) -> dict:
         """Calculates test suite score using inputSTE.
         It uses filterConfigBoolean and filerConfigString to constraint search results
@@ -23,83 +65,653 @@ class Finder:
             inputSte (dict): client's parsed STE data
             filterConfigBoolean (dict, optional): Filter for boolean type TCL variables. Defaults to {}.
             filterConfigString (dict, optional): Filter for string type TCL variables. Defaults to {}.
+            mode (str, optional): Search mode. "exact" compares every test session,
+            "cluster" compares test sessions inside predicted cluster only, "lsh" compares
+            shortlist of test sessions from LSH index. Defaults to "exact".
+            numericConfig (dict, optional): Scoring of numeric TCL variables, including
+            mode("exact", "tolerance", "relative"), tolerance and weight.
+            Defaults to None, which doesn't score numeric TCL variables.
+            scorer (str | Scorer, optional): Name of scorer of boolean TCL variables.
+            "count" counts agreeing TCL variables, "idf" weights them by rarity of
+            value. Defaults to "count".
+            snapshot (SearchSnapshot, optional): Search index snapshot to search.
+            Defaults to None, which uses current snapshot of search index.
+            booleanScores (dict, optional): Boolean scores of each test case over rows
+            of its partition, computed by findBatch(). Defaults to None.
+            textConfig (dict, optional): Text relevance of name, description and keywords,
+            including query and weight. Defaults to None, which doesn't score text.
 
         Returns:
             dict: dictionary of key[testSessionId] : value[Score] accumulated for each test case.
         """
-        logging.info(f"Finding similar test suites with {inputSte['name']}")
+        logging.info("Finding similar test suites with %s", inputSte["name"])
+        candidates = self.getCandidates(inputSte, mode)
+        scorer = self.getScorer(scorer)
+        if snapshot is None and self.index is not None:
+            snapshot = self.index.getSnapshot()
+        booleanScores = booleanScores or {}
+        sessionMask = snapshot.getSessionMask(candidates) if snapshot else None
+        if numericConfig is not None:
+            logging.debug("Scoring numeric TCL variables with %s", numericConfig)
         scores = {}
         ensureTestCase = []
-        compareString = False
         for idx, (testCase, inputTcData) in enumerate(inputSte["tclData"].items()):
-            logging.debug(f"Calculating testcase {testCase}")
-            dbData = self.db.getTestCaseData(testCase)
-            if not dbData:
-                logging.error("%s has no items in database", testCase)
-                continue
-
-            inputStrData = inputTcData["string"]
-            inputTclData = inputTcData["boolean"]
-            inputTcls = set(inputTclData.keys())
-            compareString = "TestActivity" in inputStrData
-            logging.debug("Compare string - %s", compareString)
-
+            logging.debug("Calculating testcase %s", testCase)
             filterTcls = filterConfigBoolean.get(testCase, None)
             filterStrs = filterConfigString.get(testCase, None)
+            if snapshot is not None:
+                testCaseScores = self.scoreFromSnapshot(
+                    snapshot,
+                    sessionMask,
+                    testCase,
+                    inputTcData,
+                    filterTcls,
+                    filterStrs,
+                    numericConfig,
+                    scorer,
+                    booleanScores.get(testCase, None),
+                )
+                # Test sessions changed after snapshot was built
+                overlayRows = snapshot.getOverlayRows(testCase, candidates)
+                if overlayRows:
+                    testCaseScores = (testCaseScores or []) + self.scoreRows(
+                        overlayRows,
+                        testCase,
+                        inputTcData,
+                        filterTcls,
+                        filterStrs,
+                        numericConfig,
+                        scorer,
+                    )
+            else:
+                testCaseScores = self.scoreFromDatabase(
+                    candidates,
+                    testCase,
+                    inputTcData,
+                    filterTcls,
+                    filterStrs,
+                    numericConfig,
+                    scorer,
+                )
+            if testCaseScores is None:
+                logging.error("%s has no items in database", testCase)
+                continue
             if filterTcls is not None or filterStrs is not None:
                 ensureTestCase.append(testCase)
 
-            for testSessionId, targetTclData, targetNumData, targetStrData in dbData:
-                targetTcls = set(targetTclData.keys())
-                if filterTcls is not None:
-                    if not set(filterTcls).issubset(targetTcls):
-                        continue
-                    if not self.isMatch(filterTcls, inputTclData, targetTclData):
-                        continue
-
-                targetStrs = set(targetStrData.keys())
-                if filterStrs is not None:
-                    if not set(filterStrs).issubset(targetStrs):
-                        continue
-                    if not self.isMatch(filterStrs, inputStrData, targetStrData):
-                        continue
-
-                # Calculate String TCL matching score
-                strScore = 0
-                if compareString:
-                    strScore = self.compareStrData(inputStrData, targetStrData)
-                    if strScore == -1:
-                        continue
-
-                # Calculate score
-                intersectTcls = list(inputTcls.intersection(targetTcls))
-                inputVector = self.vectorize(intersectTcls, inputTclData)
-                targetVector = self.vectorize(intersectTcls, targetTclData)
-                score = np.sum(inputVector == targetVector)
-
-                # Accumulate score
+            # Accumulate score
+            for testSessionId, score, strScore, numScore in testCaseScores:
                 if testSessionId not in scores:
                     scores[testSessionId] = {
                         "testCase": [testCase],
                         "boolean": score,
                         "string": strScore,
+                        "numeric": numScore,
                     }
                 else:
                     scores[testSessionId]["testCase"].append(testCase)
                     scores[testSessionId]["boolean"] += score
                     scores[testSessionId]["string"] += strScore
+                    scores[testSessionId]["numeric"] += numScore
         if ensureTestCase:
             logging.debug(
-                "Ensuring search result to include %s testcases", str(ensureTestCase)
+                "Ensuring search result to include %s testcases", ensureTestCase
             )
             newScores = {}
             for ciTest, item in scores.items():
                 if set(ensureTestCase).issubset(set(item["testCase"])):
                     newScores[ciTest] = item
             scores = newScores
+        if textConfig is not None:
+            textScores = self.getTextScores(inputSte, textConfig)
+            for testSessionId, item in scores.items():
+                item["text"] = textScores.get(testSessionId, 0)
+
+        return scores
+
+    def getTextScores(self, inputSte: dict, textConfig: dict) -> dict:
+        """Scores text relevance of test sessions to query with full-text index
+        of database. Relevance is BM25 of name, description and keywords,
+        divided by relevance of best match and multiplied by weight, so best
+        match gets weight and unrelated test sessions get 0.
+
+        Args:
+            inputSte (dict): client's parsed STE data
+            textConfig (dict): query and weight. Query defaults to name,
+            description and keywords of input.
+
+        Returns:
+            dict: {testSessionId : text score}
+        """
+        query = textConfig.get("query", None)
+        if not query:
+            query = " ".join(
+                [inputSte.get("name") or "", inputSte.get("description") or ""]
+                + list(inputSte.get("keywords") or [])
+            )
+        weight = textConfig.get("weight", 1.0)
+        logging.debug("Scoring text relevance with %s", query)
+        with metrics.timer("finder.text"):
+            items = self.db.TESTSESSION.search(query)
+        if not items:
+            return {}
+        best = items[0][1]
+        if best <= 0:
+            return {}
+        return {
+            testSessionId: weight * relevance / best
+            for testSessionId, relevance in items
+        }
+
+    def findBatch(
+        self,
+        inputStes: list,
+        filterConfigBoolean: dict = {},
+        filterConfigString: dict = {},
+        mode: str = "exact",
+        numericConfig: dict = None,
+        scorer: str = "count",
+        textConfig: dict = None,
+    ) -> list:
+        """Calculates test suite scores of many inputs at once. Every input is
+        searched in one search index snapshot, and boolean scores of each test
+        case are computed for all inputs together with matrix products.
+        Gives same scores as find() for each input.
+
+        Args:
+            inputStes (list): list of client's parsed STE data
+            filterConfigBoolean (dict, optional): Filter for boolean type TCL variables. Defaults to {}.
+            filterConfigString (dict, optional): Filter for string type TCL variables. Defaults to {}.
+            mode (str, optional): Search mode. Defaults to "exact".
+            numericConfig (dict, optional): Scoring of numeric TCL variables. Defaults to None.
+            scorer (str, optional): Name of scorer of boolean TCL variables. Defaults to "count".
+            textConfig (dict, optional): Text relevance of test sessions. Defaults to None.
+
+        Returns:
+            list: Scores of each input, same as find()
+        """
+        logging.info("Finding similar test suites with %d inputs", len(inputStes))
+        snapshot = self.index.getSnapshot() if self.index is not None else None
+        booleanScores = [{} for _ in inputStes]
+        if snapshot is not None:
+            testCases = {
+                testCase for inputSte in inputStes for testCase in inputSte["tclData"]
+            }
+            with metrics.timer("finder.batchScore"):
+                for testCase in testCases:
+                    members = [
+                        idx
+                        for idx, inputSte in enumerate(inputStes)
+                        if testCase in inputSte["tclData"]
+                    ]
+                    batchScores = self.scoreBatchFromSnapshot(
+                        snapshot,
+                        testCase,
+                        [inputStes[idx]["tclData"][testCase] for idx in members],
+                        self.getScorer(scorer),
+                    )
+                    if batchScores is None:
+                        continue
+                    for idx, scores in zip(members, batchScores):
+                        booleanScores[idx][testCase] = scores
+
+        return [
+            self.find(
+                inputSte,
+                filterConfigBoolean,
+                filterConfigString,
+                mode,
+                numericConfig,
+                scorer,
+                snapshot=snapshot,
+                booleanScores=scores,
+                textConfig=textConfig,
+            )
+            for inputSte, scores in zip(inputStes, booleanScores)
+        ]
+
+    def scoreBatchFromSnapshot(
+        self, snapshot, testCase: str, inputTcDatas: list, scorer
+    ) -> np.ndarray:
+        """Scores boolean TCL variables of test case for many inputs over every
+        row of its partition. With input value x(-1/0/1, 0 if input doesn't have
+        TCL variable) and target value t(-1/0/1), target agrees with input
+        where (x * t + t * t) / 2 is 1, so weighted agreement of every input
+        and row is ((W * X) @ T.T + W @ (T * T).T) / 2.
+
+        Args:
+            snapshot (SearchSnapshot): Search index snapshot
+            testCase (str): Name of test case
+            inputTcDatas (list): TCL data of test case in each input
+            scorer (Scorer): Scorer of boolean TCL variables
+
+        Returns:
+            np.ndarray: (inputs x rows of partition) boolean scores.
+            None if test case is not in snapshot.
+        """
+        partition = snapshot.getPartition(testCase)
+        if partition is None:
+            return None
+
+        inputTclDatas = [
+            {
+                tcl: value
+                for tcl, value in inputTcData["boolean"].items()
+                if isinstance(value, bool)
+            }
+            for inputTcData in inputTcDatas
+        ]
+        tcls = list(dict.fromkeys(tcl for data in inputTclDatas for tcl in data))
+        cols = partition.columns(partition.booleanCols, snapshot.lookupTcls(tcls))
+        found = cols != -1
+        tcls = [tcl for tcl, isFound in zip(tcls, found.tolist()) if isFound]
+        values = np.array(
+            [
+                [(1 if data[tcl] else -1) if tcl in data else 0 for tcl in tcls]
+                for data in inputTclDatas
+            ],
+            dtype=np.float64,
+        ).reshape(len(inputTclDatas), len(tcls))
+
+        dtype = scorer.dtype
+        weights = np.zeros(values.shape, dtype=np.float64)
+        for idx, row in enumerate(values):
+            present = np.flatnonzero(row)
+            weights[idx, present] = scorer.getWeights(
+                testCase, [tcls[col] for col in present.tolist()], row[present] == 1
+            )
 
+        target = partition.boolean[:, cols[found]].astype(np.float64)
+        scores = ((weights * values) @ target.T + weights @ (target * target).T) / 2
+        if np.issubdtype(dtype, np.integer):
+            scores = np.rint(scores).astype(np.int64)
         return scores
 
+    def scoreFromDatabase(
+        self,
+        candidates: set,
+        testCase: str,
+        inputTcData: dict,
+        filterTcls: list = None,
+        filterStrs: list = None,
+        numericConfig: dict = None,
+        scorer=None,
+    ) -> list:
+        """Scores test case of every test session by decoding TestCase table.
+        Used when search index snapshot is not ready.
+
+        Args:
+            candidates (set): Test session IDs to compare. None for every test session.
+            testCase (str): Name of test case
+            inputTcData (dict): TCL data of test case in input
+            filterTcls (list, optional): Boolean TCL variables that must match. Defaults to None.
+            filterStrs (list, optional): String TCL variables that must match. Defaults to None.
+            numericConfig (dict, optional): Scoring of numeric TCL variables. Defaults to None.
+            scorer (Scorer, optional): Scorer of boolean TCL variables. Defaults to None,
+            which counts agreeing TCL variables.
+
+        Returns:
+            list: list of tuple(testSessionId, boolean score, string score, numeric score).
+            None if test case is not in database.
+        """
+        with metrics.timer("finder.fetch"):
+            dbData = self.db.getTestCaseData(testCase)
+        if not dbData:
+            return None
+        if candidates is not None:
+            dbData = [row for row in dbData if row[0] in candidates]
+        return self.scoreRows(
+            dbData, testCase, inputTcData, filterTcls, filterStrs, numericConfig, scorer
+        )
+
+    def scoreRows(
+        self,
+        rows: list,
+        testCase: str,
+        inputTcData: dict,
+        filterTcls: list = None,
+        filterStrs: list = None,
+        numericConfig: dict = None,
+        scorer=None,
+    ) -> list:
+        """Scores test case of given test sessions one by one. Used for rows
+        of TestCase table, and for test sessions in overlay of search index
+        snapshot.
+
+        Args:
+            rows (list): list of tuple(testSessionId, TclData)
+            testCase (str): Name of test case
+            inputTcData (dict): TCL data of test case in input
+            filterTcls (list, optional): Boolean TCL variables that must match. Defaults to None.
+            filterStrs (list, optional): String TCL variables that must match. Defaults to None.
+            numericConfig (dict, optional): Scoring of numeric TCL variables. Defaults to None.
+            scorer (Scorer, optional): Scorer of boolean TCL variables. Defaults to None,
+            which counts agreeing TCL variables.
+
+        Returns:
+            list: list of tuple(testSessionId, boolean score, string score, numeric score)
+        """
+        inputStrData = inputTcData["string"]
+        inputTclData = inputTcData["boolean"]
+        compareString = "TestActivity" in inputStrData
+        inputTestActivity = inputStrData.get("TestActivity", None)
+        logging.debug("Compare string - %s", compareString)
+        inputNumTcls, inputNumValues = self.getNumData(inputTcData["numeric"])
+        scorer = scorer or self.scorers["count"]
+
+        # Input is read as vocabulary IDs once, and compared with IDs and
+        # values of each target without building dictionaries
+        inputTcls = list(inputTclData.keys())
+        inputValues = np.array(
+            [inputTclData[tcl] is True for tcl in inputTcls], dtype=bool
+        )
+        inputWeights = scorer.getWeights(testCase, inputTcls, inputValues)
+        inputIds = vocabulary.getIds(inputTcls)
+        if filterTcls is not None:
+            if any(tcl not in inputTclData for tcl in filterTcls):
+                return []
+            filterTclIds = vocabulary.getIds(list(filterTcls))
+            filterTclValues = np.array(
+                [inputTclData[tcl] is True for tcl in filterTcls], dtype=bool
+            )
+        if filterStrs is not None:
+            if any(tcl not in inputStrData for tcl in filterStrs):
+                return []
+            filterStrIds = vocabulary.getIds(list(filterStrs))
+            filterStrValues = [inputStrData[tcl] for tcl in filterStrs]
+        testActivityId = vocabulary.getIds(["TestActivity"])
+        inputStrs = self.stringFilter(inputStrData) if compareString else {}
+        inputStrIds = vocabulary.getIds(list(inputStrs.keys()))
+        inputStrValues = list(inputStrs.values())
+        inputNumIds = vocabulary.getIds(inputNumTcls)
+
+        testCaseScores = []
+        with metrics.timer("finder.score"):
+            for testSessionId, targetTcData in rows:
+                targetStrValues = targetTcData.stringValues
+                if compareString:
+                    pos = indexOf(targetTcData.stringIds, testActivityId)[0]
+                    if pos == -1 or targetStrValues[pos] != inputTestActivity:
+                        continue
+                targetValues = targetTcData.getBooleanValues()
+                if filterTcls is not None:
+                    pos = indexOf(targetTcData.booleanIds, filterTclIds)
+                    if (pos == -1).any() or (
+                        targetValues[pos] != filterTclValues
+                    ).any():
+                        continue
+                if filterStrs is not None:
+                    pos = indexOf(targetTcData.stringIds, filterStrIds)
+                    if (pos == -1).any() or any(
+                        targetStrValues[idx] != value
+                        for idx, value in zip(pos.tolist(), filterStrValues)
+                    ):
+                        continue
+
+                # Calculate String TCL matching score. TestActivity is same
+                # already, and filter of strings depends on name and value, so
+                # equal values of filtered input are filtered values of target
+                strScore = 0
+                if compareString:
+                    pos = indexOf(targetTcData.stringIds, inputStrIds).tolist()
+                    strScore = sum(
+                        1
+                        for idx, value in zip(pos, inputStrValues)
+                        if idx != -1 and targetStrValues[idx] == value
+                    )
+
+                # Calculate score
+                pos = indexOf(targetTcData.booleanIds, inputIds)
+                found = pos != -1
+                score = scorer.score(
+                    inputValues[found] == targetValues[pos[found]],
+                    inputWeights[found],
+                )
+
+                # Calculate numeric TCL score
+                numScore = 0
+                if numericConfig is not None:
+                    targetNumValues = targetTcData.numericValues
+                    targetNumValues = np.array(
+                        [
+                            [
+                                targetNumValues[idx] if idx != -1 else np.nan
+                                for idx in indexOf(
+                                    targetTcData.numericIds, inputNumIds
+                                ).tolist()
+                            ]
+                        ],
+                        dtype=np.float64,
+                    )
+                    numScore = self.compareNumData(
+                        inputNumValues, targetNumValues, numericConfig
+                    )[0]
+                testCaseScores.append((testSessionId, score, strScore, numScore))
+        return testCaseScores
+
+    def scoreFromSnapshot(
+        self,
+        snapshot,
+        sessionMask: np.ndarray,
+        testCase: str,
+        inputTcData: dict,
+        filterTcls: list = None,
+        filterStrs: list = None,
+        numericConfig: dict = None,
+        scorer=None,
+        booleanScores: np.ndarray = None,
+    ) -> list:
+        """Scores test case of every test session with matrices of search
+        index snapshot. Gives same scores as scoreFromDatabase.
+        Boolean score is dot product of agreement(input == target) over -1/0/1
+        matrix and weights of scorer. Input has no 0 in columns of its TCL
+        variables, so target without TCL variable never agrees.
+
+        Args:
+            snapshot (SearchSnapshot): Search index snapshot
+            sessionMask (np.ndarray): Test sessions to compare
+            testCase (str): Name of test case
+            inputTcData (dict): TCL data of test case in input
+            filterTcls (list, optional): Boolean TCL variables that must match. Defaults to None.
+            filterStrs (list, optional): String TCL variables that must match. Defaults to None.
+            numericConfig (dict, optional): Scoring of numeric TCL variables. Defaults to None.
+            scorer (Scorer, optional): Scorer of boolean TCL variables. Defaults to None,
+            which counts agreeing TCL variables.
+            booleanScores (np.ndarray, optional): Precomputed boolean score of every
+            row of partition. Defaults to None.
+
+        Returns:
+            list: list of tuple(testSessionId, boolean score, string score, numeric score).
+            None if test case is not in snapshot.
+        """
+        partition = snapshot.getPartition(testCase)
+        if partition is None:
+            return None
+
+        inputStrData = inputTcData["string"]
+        inputTclData = {
+            tcl: value
+            for tcl, value in inputTcData["boolean"].items()
+            if isinstance(value, bool)
+        }
+        compareString = "TestActivity" in inputStrData
+        logging.debug("Compare string - %s", compareString)
+
+        def booleanColumns(tcls):
+            cols = partition.columns(partition.booleanCols, snapshot.lookupTcls(tcls))
+            values = np.array(
+                [1 if inputTclData.get(tcl, None) else -1 for tcl in tcls],
+                dtype=np.int8,
+            )
+            return cols, values
+
+        def stringColumns(tcls):
+            cols = partition.columns(partition.stringCols, snapshot.lookupTcls(tcls))
+            values = snapshot.lookupValues(
+                [inputStrData.get(tcl, None) for tcl in tcls]
+            )
+            return cols, values
+
+        with metrics.timer("finder.score"):
+            if compareString:
+                # Only rows of same TestActivity are compared, so start from
+                # postings of the value instead of every row of test case
+                cols, values = stringColumns(["TestActivity"])
+                if cols[0] == -1:
+                    return []
+                rows = partition.getStringRows(cols[0], values[0])
+                rows = rows[sessionMask[partition.rows[rows]]]
+            else:
+                rows = np.flatnonzero(sessionMask[partition.rows])
+            if filterTcls:
+                if any(tcl not in inputTclData for tcl in filterTcls):
+                    return []
+                cols, values = booleanColumns(list(filterTcls))
+                if (cols == -1).any():
+                    return []
+                target = partition.boolean[rows[:, None], cols]
+                rows = rows[(target == values).all(axis=1)]
+
+            if filterStrs:
+                if any(tcl not in inputStrData for tcl in filterStrs):
+                    return []
+                cols, values = stringColumns(list(filterStrs))
+                if (cols == -1).any():
+                    return []
+                target = partition.string[rows[:, None], cols]
+                rows = rows[(target == values).all(axis=1)]
+
+            # Calculate String TCL matching score
+            strScores = np.zeros(len(rows), dtype=np.int64)
+            if compareString:
+                tcls = list(self.stringFilter(inputStrData).keys())
+                cols, values = stringColumns(tcls)
+                found = cols != -1
+                target = partition.string[rows[:, None], cols[found]]
+                strScores = (target == values[found]).sum(axis=1)
+
+            # Calculate score
+            if booleanScores is not None:
+                scores = booleanScores[rows]
+            else:
+                scorer = scorer or self.scorers["count"]
+                tcls = list(inputTclData.keys())
+                cols, values = booleanColumns(tcls)
+                found = cols != -1
+                target = partition.boolean[rows[:, None], cols[found]]
+                weights = scorer.getWeights(
+                    testCase,
+                    [tcl for tcl, isFound in zip(tcls, found.tolist()) if isFound],
+                    values[found] == 1,
+                )
+                scores = scorer.score(target == values[found], weights)
+
+            # Calculate numeric TCL score over aligned columns
+            numScores = np.zeros(len(rows), dtype=np.int64)
+            if numericConfig is not None:
+                tcls, values = self.getNumData(inputTcData["numeric"])
+                cols = partition.columns(
+                    partition.numericCols, snapshot.lookupTcls(tcls)
+                )
+                found = cols != -1
+                target = partition.numeric[rows[:, None], cols[found]]
+                numScores = self.compareNumData(values[found], target, numericConfig)
+            testSessionIds = snapshot.sessionIds[partition.rows[rows]]
+        return list(
+            zip(
+                testSessionIds.tolist(),
+                scores.tolist(),
+                strScores.tolist(),
+                numScores.tolist(),
+            )
+        )
+
+    def getCandidates(self, inputSte: dict, mode: str = "exact") -> set:
+        """Pre-selects test sessions to compare with inputSte.
+
+        Args:
+            inputSte (dict): client's parsed STE data
+            mode (str, optional): Search mode. Defaults to "exact".
+
+        Returns:
+            set: Test session IDs to compare. None if every test session should be compared.
+        """
+        if mode == "exact":
+            return None
+        if mode == "cluster":
+            if self.cluster is None or not self.cluster.isReady():
+                logging.warning(
+                    "Cluster model is not ready. Comparing every test session"
+                )
+                return None
+            return self.cluster.getCandidates(inputSte["tclData"])
+        if mode == "lsh":
+            if self.lsh is None or not self.lsh.isReady():
+                logging.warning("LSH index is not ready. Comparing every test session")
+                return None
+            return self.lsh.getCandidates(inputSte["tclData"])
+        logging.warning("Unknown search mode %s. Comparing every test session", mode)
+        return None
+
+    def getScorer(self, name):
+        """Gets scorer of boolean TCL variables.
+
+        Args:
+            name (str | Scorer): Name of scorer, or scorer itself i.e. IDF scorer
+            with frequency of every shard
+
+        Returns:
+            Scorer: Scorer. Count scorer if scorer is unknown or not ready.
+        """
+        scorer = name if isinstance(name, Scorer) else self.scorers.get(name, None)
+        if scorer is None:
+            logging.warning("Unknown scorer %s. Counting agreeing TCL variables", name)
+            return self.scorers["count"]
+        if not scorer.isReady():
+            logging.warning(
+                "Scorer %s is not ready. Counting agreeing TCL variables", name
+            )
+            return self.scorers["count"]
+        return scorer
+
+    def evaluateRecall(
+        self, mode: str, topk: int = 5, inputStes: list = None, sampleSize: int = 50
+    ) -> float:
+        """Measures recall of top k items found with given mode against exhaustive search.
+        If inputStes is not given, stored test sessions are sampled as inputs.
+
+        Args:
+            mode (str): Search mode to evaluate
+            topk (int, optional): Top K value. Defaults to 5.
+            inputStes (list, optional): List of parsed STE data. Defaults to None.
+            sampleSize (int, optional): Number of test sessions to sample. Defaults to 50.
+
+        Returns:
+            float: Mean recall@k over inputs
+        """
+        if inputStes is None:
+            testSessionIds = self.db.TESTSESSION.getValidTestSessionIds()
+            rng = np.random.default_rng(0)
+            sample = rng.permutation(testSessionIds)[:sampleSize]
+            inputStes = [self.db.getTestSessionDetail(int(_id)) for _id in sample]
+            inputStes = [inputSte for inputSte in inputStes if inputSte]
+
+        recalls = []
+        for inputSte in inputStes:
+            exactScores = self.find(inputSte)
+            if not exactScores:
+                continue
+            exactTopk, _ = self.getTopk(exactScores, topk)
+            scores = self.find(inputSte, mode=mode)
+            topkItems = self.getTopk(scores, topk)[0] if scores else {}
+            recalls.append(len(exactTopk.keys() & topkItems.keys()) / len(exactTopk))
+        if not recalls:
+            logging.error("No inputs to evaluate recall")
+            return 0.0
+        recall = float(np.mean(recalls))
+        logging.info("Recall@%d of %s search : %.4f", topk, mode, recall)
+        return recall
+
     def compareStrData(self, inputStrData: dict, targetStrData: dict) -> int:
         """Compares string type TCL variables form input and target STE.
         Will return -1 if either input or target doens't have "TestActivity".
@@ -111,7 +723,6 @@ class Finder:
         Returns:
             int: Number of matching TCL variables
         """
-        logging.debug("Comparing String TCL variables")
         try:
             inputTestActivity = inputStrData["TestActivity"]
         except KeyError:
@@ -125,7 +736,6 @@ class Finder:
         if inputTestActivity != targetTestActivity:
             return -1
 
-        logging.debug("Found target test suite with matching test activity")
         inputStrData = self.stringFilter(inputStrData)
         targetStrData = self.stringFilter(targetStrData)
 
@@ -135,10 +745,60 @@ class Finder:
                 continue
             if value == targetStrData[tcl]:
                 score += 1
-        logging.debug("Score : %d", score)
-
         return score
 
+    def getNumData(self, numData: dict) -> tuple:
+        """Gets finite numeric TCL variables and their values.
+
+        Args:
+            numData (dict): Numeric type TCL variables
+
+        Returns:
+            tuple: list of TCL variables and np.ndarray of their values
+        """
+        tcls = [
+            tcl
+            for tcl, value in numData.items()
+            if isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and np.isfinite(value)
+        ]
+        return tcls, np.array([numData[tcl] for tcl in tcls], dtype=np.float64)
+
+    def compareNumData(
+        self, inputValues: np.ndarray, targetValues: np.ndarray, numericConfig: dict
+    ) -> np.ndarray:
+        """Compares numeric TCL variables of input with targets.
+        "exact" counts equal values, "tolerance" counts values within absolute
+        tolerance, and "relative" sums 1 - |target - input| / max(|target|, |input|)
+        clipped to [0, 1]. Missing values of target score 0.
+
+        Args:
+            inputValues (np.ndarray): Values of input TCL variables
+            targetValues (np.ndarray): Values of targets(rows x TCL variables),
+            aligned with inputValues. NaN if target doesn't have TCL variable.
+            numericConfig (dict): mode, tolerance and weight
+
+        Returns:
+            np.ndarray: Weighted numeric score of each target
+        """
+        mode = numericConfig.get("mode", "relative")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if mode == "exact":
+                similarity = targetValues == inputValues
+            elif mode == "tolerance":
+                tolerance = numericConfig.get("tolerance", 0.0)
+                similarity = np.abs(targetValues - inputValues) <= tolerance
+            else:
+                scale = np.maximum(np.abs(targetValues), np.abs(inputValues))
+                distance = np.abs(targetValues - inputValues)
+                similarity = np.where(
+                    scale > 0, 1 - distance / np.where(scale > 0, scale, 1), 1.0
+                )
+                similarity = np.clip(similarity, 0, 1)
+                similarity[np.isnan(targetValues)] = 0
+        return numericConfig.get("weight", 1.0) * similarity.sum(axis=1)
+
     def analyzeTclDifference(self, inputTclData: dict, targetTclData: dict) -> dict:
         """Analyze difference between input and target STE data.
         Compares matching / mismatching / onlyInput / onlyTarget cases.
@@ -154,93 +814,88 @@ class Finder:
         """
         logging.debug("Analyzing difference between input and target CI test suite")
 
-        def analyzeTcData(inputTcl, targetTcl):
-            difference = {}
-            intersection = list(set(inputTcl.keys()).intersection(targetTcl.keys()))
-
-            difference["match"] = {}
-            difference["mismatch"] = {}
-            for tcl in intersection:
-                if inputTcl[tcl] == targetTcl[tcl]:
-                    difference["match"][tcl] = inputTcl[tcl]
+        names = vocabulary.names
+
+        def analyzeTcData(inputIds, inputValues, targetIds, targetValues):
+            difference = {"match": {}, "mismatch": {}, "onlyInput": {}, "onlyCI": {}}
+            targetIndex = {tclId: idx for idx, tclId in enumerate(targetIds)}
+            for tclId, value in zip(inputIds, inputValues):
+                idx = targetIndex.pop(tclId, None)
+                if idx is None:
+                    difference["onlyInput"][names[tclId]] = value
+                elif value == targetValues[idx]:
+                    difference["match"][names[tclId]] = value
                 else:
-                    difference["mismatch"][tcl] = {
-                        "input": inputTcl[tcl],
-                        "target": targetTcl[tcl],
+                    difference["mismatch"][names[tclId]] = {
+                        "input": value,
+                        "target": targetValues[idx],
                     }
-            difference["onlyInput"] = {}
-            for tcl in set(inputTcl.keys()).difference(intersection):
-                difference["onlyInput"][tcl] = inputTcl[tcl]
-            difference["onlyCI"] = {}
-            for tcl in set(targetTcl.keys()).difference(intersection):
-                difference["onlyCI"][tcl] = targetTcl[tcl]
+            for tclId, idx in targetIndex.items():
+                difference["onlyCI"][names[tclId]] = targetValues[idx]
             return difference
 
-        # Compare test cases
-        inputTestCases = set(inputTclData.keys())
-        targetTestCases = set(targetTclData.keys())
-        matchTestCases = inputTestCases.intersection(targetTestCases)
+        def filterStrings(tcData):
+            ids, values = [], []
+            for tclId, value in zip(tcData.stringIds.tolist(), tcData.stringValues):
+                if self.isComparableString(names[tclId], value):
+                    ids.append(tclId)
+                    values.append(value)
+            return ids, values
 
+        # Compare test cases
+        testActivityId = vocabulary.getIds(["TestActivity"])
         analysis = {}
-        for testCase in matchTestCases:
+        for testCase in inputTclData.keys() & targetTclData.keys():
+            inputTcData = self.asTclData(inputTclData[testCase])
+            targetTcData = self.asTclData(targetTclData[testCase])
             analysis[testCase] = {
                 "boolean": analyzeTcData(
-                    inputTclData[testCase]["boolean"],
-                    targetTclData[testCase]["boolean"],
+                    inputTcData.booleanIds.tolist(),
+                    inputTcData.getBooleanValues().tolist(),
+                    targetTcData.booleanIds.tolist(),
+                    targetTcData.getBooleanValues().tolist(),
                 ),
                 "string": {},
             }
-            inputStrData = inputTclData[testCase]["string"]
-            targetStrData = targetTclData[testCase]["string"]
-            if "TestActivity" not in inputStrData:
+            inputPos = indexOf(inputTcData.stringIds, testActivityId)[0]
+            if inputPos == -1:
                 continue
             logging.debug(
                 "Found TestActivity inside input data : %s",
-                inputStrData["TestActivity"],
+                inputTcData.stringValues[inputPos],
             )
-            if "TestActivity" not in targetStrData:
+            targetPos = indexOf(targetTcData.stringIds, testActivityId)[0]
+            if targetPos == -1:
                 continue
+            targetTestActivity = targetTcData.stringValues[targetPos]
             logging.debug(
-                "Found TestActivity inside target data : %s",
-                targetStrData["TestActivity"],
+                "Found TestActivity inside target data : %s", targetTestActivity
             )
             analysis[testCase]["string"] = analyzeTcData(
-                self.stringFilter(inputStrData), self.stringFilter(targetStrData)
+                *filterStrings(inputTcData), *filterStrings(targetTcData)
             )
 
             analysis[testCase]["string"]["TestActivity"] = {
-                "input": targetStrData["TestActivity"],
-                "target": targetStrData["TestActivity"],
+                "input": targetTestActivity,
+                "target": targetTestActivity,
             }
 
         return analysis
 
-    def vectorize(self, tcls: list, data: dict) -> np.ndarray:
-        """Vectorize data(dict) using index of tcls(list). If same tcls
-        are given, resulting vectors should have same index.
-
-        Args:
-            tcls (list): list of tcl variables
-            data (dict): dictionary of tcl variables including name and value
+    @staticmethod
+    def asTclData(tcData) -> TclData:
+        """Gets TCL data of test case as TclData, converting dictionary."""
+        return tcData if isinstance(tcData, TclData) else TclData.fromDict(tcData)
 
-        Returns:
-            np.ndarray: vectorized item of data
-        """
-        return np.array([data[tcl] for tcl in tcls])
-
-    def isMatch(self, filterTargets: list, inputData: dict, targetData: dict) -> bool:
-        for filterTarget in filterTargets:
-            inputValue = inputData[filterTarget]
-            targetValue = targetData[filterTarget]
-            if inputValue != targetValue:
-                return False
-        return True
-
-    def getTopk(self, scores: dict, topk: int = 5) -> dict:
+    @staticmethod
+    def getTopk(scores: dict, topk: int = 5) -> dict:
         """Selects top K items from scores(dict). When multiple items
         have same score, then it will acknowledge those items also.
         First, we sort the scores in ascending manner, cuts at topk,
         get score from that index, and get all items over given threshold.
+        Totals are rounded to SCORE_DIGITS, so ties do not depend on order in
+        which weights were summed. Union of top K of each part of scores has every item of top K of whole
+        scores, so shards can be merged with this function again.
 
         Args:
             scores (dict): Dictionary of {testSessionId : Score}
@@ -253,7 +908,14 @@ class Finder:
         logging.debug("Calculating top %d CI tests", topk)
 
         scores = {
-            name: score["boolean"] + score["string"] for name, score in scores.items()
+            name: round(
+                score["boolean"]
+                + score["string"]
+                + score.get("numeric", 0)
+                + score.get("text", 0),
+                SCORE_DIGITS,
+            )
+            for name, score in scores.items()
         }
 
         topkScores = list(set(nlargest(topk, scores.values())))
@@ -276,39 +938,29 @@ class Finder:
         Returns:
             dict: Filtered string TCL dictionary
         """
-        finalDict = {}
-        # Filter out bytes data
-        bytesPattern = re.compile(r"^0x[a-fA-F0-9_]+")  # 0x0000...
-        bytePattern = re.compile(r"^[a-fA-F0-9_]{4}")  # i.e., FFFF
-        addressPattern = re.compile(
-            r"[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)"
-        )
-        ipv6Pattern = re.compile(
-            r"(([0-9a-fA-F]{1,4}:){7,7}[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,7}:|([0-9a-fA-F]{1,4}:){1,6}:[0-9a-fA-F]{1,4}|([0-9a-fA-F]{1,4}:){1,5}(:[0-9a-fA-F]{1,4}){1,2}|([0-9a-fA-F]{1,4}:){1,4}(:[0-9a-fA-F]{1,4}){1,3}|([0-9a-fA-F]{1,4}:){1,3}(:[0-9a-fA-F]{1,4}){1,4}|([0-9a-fA-F]{1,4}:){1,2}(:[0-9a-fA-F]{1,4}){1,5}|[0-9a-fA-F]{1,4}:((:[0-9a-fA-F]{1,4}){1,6})|:((:[0-9a-fA-F]{1,4}){1,7}|:)|fe80:(:[0-9a-fA-F]{0,4}){0,4}%[0-9a-zA-Z]{1,}|::(ffff(:0{1,4}){0,1}:){0,1}((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])|([0-9a-fA-F]{1,4}:){1,4}:((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9]))"
-        )
-        ipv4Pattern = re.compile(
-            r"((25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])\.){3,3}(25[0-5]|(2[0-4]|1{0,1}[0-9]){0,1}[0-9])"
-        )
-        portPattern = re.compile(r"[a-zA-Z]*#\(N[a-zA-Z0-9 /]+\)")
-        numberPattern = re.compile(r"[a-zA-Z]*#\([a-zA-Z0-9 /]+\)")
-        for tcl, tclString in data.items():
-            if tclString in ["none", None]:
-                continue
-            elif tcl in ["TestType", "CommandSequence", "TestActivity"] or "_" in tcl:
-                continue
-            elif bytesPattern.match(tclString):
-                continue
-            elif bytePattern.match(tclString):
-                continue
-            elif addressPattern.match(tclString):
-                continue
-            elif portPattern.match(tclString):
-                continue
-            elif numberPattern.match(tclString):
-                continue
-            elif ipv4Pattern.match(tclString):
-                continue
-            elif ipv6Pattern.match(tclString):
-                continue
-            finalDict[tcl] = tclString
-        return finalDict
+        return {
+            tcl: value
+            for tcl, value in data.items()
+            if self.isComparableString(tcl, value)
+        }
+
+    @staticmethod
+    def isComparableString(tcl: str, value) -> bool:
+        """Checks if string TCL variable is compared, as stringFilter() does.
+        It depends only on name and value of TCL variable.
+
+        Args:
+            tcl (str): Name of TCL variable
+            value (str): Value of TCL variable
+
+        Returns:
+            bool: False if value is filtered out
+        """
+        if value in ["none", None]:
+            return False
+        if tcl in ["TestType", "CommandSequence", "TestActivity"] or "_" in tcl:
+            return False
+        for pattern in STRING_PATTERNS:
+            if pattern.match(value):
+                return False
+        return True
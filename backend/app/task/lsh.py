@@ -0,0 +1,292 @@
+import logging
+import zlib
+
+import numpy as np
+
+from .snapshot import Snapshot, writeSnapshot
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class LSH:
+    def __init__(
+        self,
+        db,
+        modelPath: str = None,
+        numPerm: int = 64,
+        bands: int = 32,
+        numCandidates: int = 200,
+        seed: int = 0,
+    ) -> None:
+        self.db = db
+        self.modelPath = modelPath
+        self.numPerm = numPerm
+        self.bands = bands
+        self.rows = numPerm // bands
+        self.numCandidates = numCandidates
+
+        # Universal hash functions (a * x + b) mod p for each permutation
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=numPerm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=numPerm, dtype=np.uint64)
+
+        # Index of each test case
+        self.testSessionIds = {}
+        self.signatures = {}
+        self.buckets = {}
+        self.invalid = set()
+        self.version = -1
+
+    def isReady(self) -> bool:
+        """Checks if index is built or loaded.
+
+        Returns:
+            bool: True if index is ready for query.
+        """
+        return bool(self.signatures)
+
+    def build(self) -> bool:
+        """Builds MinHash signatures of True TCL variables for every test case
+        inside TestCase table, and hashes bands of signatures into buckets.
+        Test sessions that are not able to download are indexed too and
+        excluded from candidates, so they become candidates again when
+        their status changes.
+
+        Returns:
+            bool: True if index is built.
+        """
+        logging.info("Building LSH index")
+        version = self.db.version
+        testCaseData = self.db.getEveryTestCaseData(downloadAvailOnly=False)
+        if not testCaseData:
+            logging.error("Failed to read test case data. Aborting build")
+            return False
+        validIds = set(self.db.TESTSESSION.getValidTestSessionIds())
+
+        items = {}
+        for testSessionId, testCase, tcData in testCaseData:
+            items.setdefault(testCase, []).append((testSessionId, tcData.getTrueTcls()))
+
+        self.testSessionIds = {}
+        self.signatures = {}
+        for testCase, rows in items.items():
+            self.testSessionIds[testCase] = np.array(
+                [testSessionId for testSessionId, _ in rows], dtype=np.int64
+            )
+            self.signatures[testCase] = np.vstack(
+                [self.signature(trueTcls) for _, trueTcls in rows]
+            )
+        self.index()
+        self.invalid = {
+            testSessionId
+            for testSessionId, _, _ in testCaseData
+            if testSessionId not in validIds
+        }
+        self.version = version
+        logging.info(
+            "Built LSH index | %d test cases, %d items",
+            len(self.signatures),
+            len(testCaseData),
+        )
+        return True
+
+    def save(self, modelPath: str = None) -> bool:
+        """Saves signatures to modelPath. Buckets are rebuilt lazily after load.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if saved.
+        """
+        modelPath = modelPath or self.modelPath
+        if not self.isReady() or modelPath is None:
+            logging.error("No index or path to save")
+            return False
+        logging.debug("Saving LSH index at %s", modelPath)
+        testCases = list(self.signatures.keys())
+        arrays = {
+            "testCases": np.array(testCases, dtype=str),
+            "invalid": np.array(sorted(self.invalid), dtype=np.int64),
+        }
+        for idx, testCase in enumerate(testCases):
+            arrays[f"ids_{idx}"] = self.testSessionIds[testCase]
+            arrays[f"signatures_{idx}"] = self.signatures[testCase]
+        return writeSnapshot(modelPath, arrays, {"version": self.version})
+
+    def load(self, modelPath: str = None) -> bool:
+        """Loads signatures from modelPath. Signatures are memory-mapped from
+        snapshot, and buckets of each test case are built on its first query.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if loaded.
+        """
+        modelPath = modelPath or self.modelPath
+        if modelPath is None:
+            logging.info("No path to LSH index")
+            return False
+        logging.debug("Loading LSH index from %s", modelPath)
+        model = Snapshot(modelPath)
+        if not model.open():
+            return False
+        testSessionIds, signatures = {}, {}
+        for idx, testCase in enumerate(model["testCases"].tolist()):
+            testSessionIds[testCase] = model[f"ids_{idx}"]
+            signatures[testCase] = model[f"signatures_{idx}"]
+        invalid = set(model["invalid"].tolist())
+        version = int(model.meta["version"])
+        if any(item.shape[1] != self.numPerm for item in signatures.values()):
+            logging.error("LSH index has different number of permutations")
+            return False
+        self.testSessionIds = testSessionIds
+        self.signatures = signatures
+        self.invalid = invalid
+        self.version = version
+        self.buckets = {}
+        logging.info("Loaded LSH index with %d test cases", len(self.signatures))
+        return True
+
+    def index(self, testCase: str = None) -> None:
+        """Hashes each band of signatures into buckets.
+
+        Args:
+            testCase (str, optional): Test case to index. Defaults to every test case.
+        """
+        if testCase is None:
+            self.buckets = {}
+        testCases = [testCase] if testCase is not None else self.signatures.keys()
+        for testCase in testCases:
+            buckets = {}
+            for row, signature in enumerate(self.signatures[testCase]):
+                for key in self.bandKeys(signature):
+                    buckets.setdefault(key, []).append(row)
+            self.buckets[testCase] = buckets
+
+    def apply(self, change: dict) -> None:
+        """Applies change of database incrementally. Signatures of new test
+        sessions are added to buckets, and test sessions that are not able to
+        download are excluded from candidates.
+
+        Args:
+            change (dict): Change from database including version, table,
+            testSessionId, action, value
+        """
+        if not self.isReady() or change["version"] <= self.version:
+            return
+        testSessionId = change["testSessionId"]
+        if change["table"] == "TestSession":
+            if change["value"]:
+                self.invalid.discard(testSessionId)
+            else:
+                self.invalid.add(testSessionId)
+        elif change["table"] == "TestCase":
+            tclData = self.db.TESTCASE.getTestCaseByTestSessionId(testSessionId)
+            for testCase in set(self.signatures.keys()).union(tclData.keys()):
+                testSessionIds = self.testSessionIds.get(
+                    testCase, np.empty(0, dtype=np.int64)
+                )
+                signatures = self.signatures.get(
+                    testCase, np.empty((0, self.numPerm), dtype=np.uint32)
+                )
+                isReplaced = bool((testSessionIds == testSessionId).any())
+                if isReplaced:
+                    keep = testSessionIds != testSessionId
+                    testSessionIds = testSessionIds[keep]
+                    signatures = signatures[keep]
+                if testCase in tclData:
+                    boolean = tclData[testCase]["boolean"]
+                    signature = self.signature(
+                        [tcl for tcl, value in boolean.items() if value]
+                    )
+                    row = len(testSessionIds)
+                    testSessionIds = np.append(testSessionIds, testSessionId)
+                    signatures = np.vstack([signatures, signature])
+                elif not isReplaced:
+                    continue
+                self.testSessionIds[testCase] = testSessionIds
+                self.signatures[testCase] = signatures
+                if isReplaced or testCase not in self.buckets:
+                    self.buckets.pop(testCase, None)
+                else:
+                    buckets = self.buckets[testCase]
+                    for key in self.bandKeys(signature):
+                        buckets.setdefault(key, []).append(row)
+        self.version = change["version"]
+
+    def signature(self, tcls: list) -> np.ndarray:
+        """Calculates MinHash signature of TCL variables.
+
+        Args:
+            tcls (list): list of TCL variables
+
+        Returns:
+            np.ndarray: MinHash signature. Every value is p for empty set.
+        """
+        if not tcls:
+            return np.full(self.numPerm, MERSENNE_PRIME, dtype=np.uint32)
+        hashes = np.array([zlib.crc32(tcl.encode()) for tcl in tcls], dtype=np.uint64)
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def bandKeys(self, signature: np.ndarray) -> list:
+        """Splits signature into bands and returns bucket keys.
+
+        Args:
+            signature (np.ndarray): MinHash signature
+
+        Returns:
+            list: list of (band, bytes of band) keys
+        """
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def getCandidates(self, tclData: dict) -> set:
+        """Gets shortlist of test sessions that share buckets with given test suite.
+        Test sessions are ranked by estimated Jaccard similarity of True TCL
+        variables, accumulated over test cases.
+
+        Args:
+            tclData (dict): TCL data of test suite, keyed by test case
+
+        Returns:
+            set: Test session IDs of shortlist. None if there are no candidates.
+        """
+        if not self.isReady():
+            return None
+        similarity = {}
+        for testCase, tcData in tclData.items():
+            if testCase not in self.signatures:
+                continue
+            trueTcls = [tcl for tcl, value in tcData["boolean"].items() if value]
+            if not trueTcls:
+                continue
+            signature = self.signature(trueTcls)
+            if testCase not in self.buckets:
+                self.index(testCase)
+            buckets = self.buckets[testCase]
+            rows = set()
+            for key in self.bandKeys(signature):
+                rows.update(buckets.get(key, []))
+            if not rows:
+                continue
+            rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            jaccard = (self.signatures[testCase][rows] == signature).mean(axis=1)
+            for testSessionId, value in zip(
+                self.testSessionIds[testCase][rows].tolist(), jaccard.tolist()
+            ):
+                if testSessionId in self.invalid:
+                    continue
+                similarity[testSessionId] = similarity.get(testSessionId, 0) + value
+
+        if not similarity:
+            logging.debug("No candidates found in LSH index")
+            return None
+        candidates = sorted(similarity, key=similarity.get, reverse=True)
+        candidates = set(candidates[: self.numCandidates])
+        logging.debug("Found %d candidates in LSH index", len(candidates))
+        return candidates
@@ -1,20 +1,48 @@
 import asyncio
+import contextlib
 import logging
 import os
 from platform import system
-from zipfile import ZipFile
+from xml.parsers.expat import ExpatError
+from zipfile import BadZipFile, ZipFile
 
 import aiofiles
 import xmltodict
 
+from ..metrics import metrics
+from .tcl import mergeTestCase, splitTcls
+from .vocab import TclData
+
+SESSIONS_XML = "Sessions.xml"
+
+# Readers of STE file. "native" reads Sessions.xml out of STE archive
+# in-process, and falls back to SuiteReader for STE it can't read. SuiteReader
+# stays default until native reader is shown to give same result on real STE
+# (tests/test_steParity.py)
+READERS = ("native", "suiteReader")
+
 
 class Parser:
-    def __init__(self, basePath: str = None, suiteReaderPath: str = None) -> None:
+    def __init__(
+        self,
+        basePath: str = None,
+        suiteReaderPath: str = None,
+        reader: str = "suiteReader",
+        profiler=None,
+    ) -> None:
         # Path
         self.basePath = basePath
         self.suiteReaderPath = suiteReaderPath
         self.__check__()
 
+        # Profiler of parsing, which profiles only synchronous part of it
+        self.profiler = profiler
+
+        if reader not in READERS:
+            logging.warning("Unknown STE reader %s. Using SuiteReader", reader)
+            reader = "suiteReader"
+        self.reader = reader
+
     def __check__(self) -> None:
         """Checks if suite reader is valid. If valid, save suiteReaderPath
         as absolute path.
@@ -59,7 +87,7 @@ class Parser:
             return {}, {}, {}
         if isinstance(tcTcls["nv"], dict):
             tcTcls["nv"] = [tcTcls["nv"]]
-        return self.__parseDict__(tcTcls["nv"])
+        return splitTcls((pair["@n"], pair["@v"]) for pair in tcTcls["nv"])
 
     def parseTestServerGroup(self, tsGroupData) -> list:
         """Parse test server group data from parsed STE.
@@ -76,15 +104,7 @@ class Parser:
             tsGroupData = [tsGroupData]
         for testCase in tsGroupData:
             logging.debug("Working with TestCase %s", testCase["@root_name"])
-            boolean = {}
-            numeric = {}
-            string = {}
-
-            _b, _n, _s = self.parseTcl(testCase["p2s"])
-            boolean.update(_b)
-            numeric.update(_n)
-            string.update(_s)
-
+            boolean, numeric, string = self.parseTcl(testCase["p2s"])
             tsData.append([testCase["@root_name"], boolean, numeric, string])
         return tsData
 
@@ -103,7 +123,7 @@ class Parser:
             xmlData (dict): XML data of input STE
 
         Returns:
-            dict: Parsed item of input STE
+            dict: Parsed item of input STE. TCL data of each test case is TclData.
         """
         # Create DataFrame
         steData = {}
@@ -123,25 +143,92 @@ class Parser:
         for tsItem in scenario:
             tsData = self.parseTestServerGroup(tsItem["scripts"]["ssecoast_script"])
             for tc, boolean, numeric, string in tsData:
-                if tc not in steData["tclData"]:
-                    steData["tclData"][tc] = {
-                        "boolean": boolean,
-                        "numeric": numeric,
-                        "string": string,
-                    }
-                else:
-                    # Merge boolean values of same testcase
-                    # newValue = origValue OR newValue
-                    for tcl, value in boolean.items():
-                        if tcl not in steData["tclData"][tc]["boolean"]:
-                            steData["tclData"][tc]["boolean"][tcl] = value
-                        else:
-                            origValue = steData["tclData"][tc]["boolean"][tcl]
-                            newValue = origValue or value
-                            steData["tclData"][tc]["boolean"][tcl] = newValue
+                mergeTestCase(
+                    steData["tclData"],
+                    tc,
+                    {"boolean": boolean, "numeric": numeric, "string": string},
+                )
+
+        # Keep TCL data compact while it waits for /Result
+        steData["tclData"] = {
+            tc: TclData.fromDict(tcData) for tc, tcData in steData["tclData"].items()
+        }
         return steData
 
     async def parseSte(self, steFile: str, tmpDir: str = "tmp") -> dict:
+        """Parses *.ste file. Native reader reads Sessions.xml straight out of
+        STE archive, without JVM and temporary folder. STE is parsed with
+        SuiteReader if native reader is disabled or can't read it.
+
+        Args:
+            steFile (str): Path to steFile
+            tmpDir (str, optional): Path to temporary folder of SuiteReader. Defaults to "tmp".
+
+        Returns:
+            dict: Parsed STE data
+        """
+        if self.reader == "native":
+            logging.info("Parsing STE at %s", steFile)
+            with metrics.timer("parser.native"):
+                steData = await asyncio.to_thread(self.parseSteNative, steFile)
+            if steData is not None:
+                return steData
+            logging.info("Falling back to SuiteReader for %s", steFile)
+        return await self.parseSteWithSuiteReader(steFile, tmpDir)
+
+    def parseSteNative(self, steFile: str) -> dict:
+        """Reads Sessions.xml of STE archive and parses it. Runs in worker
+        thread, and is profiled there as a whole.
+
+        Args:
+            steFile (str): Path to steFile
+
+        Returns:
+            dict: Parsed STE data. None if native reader can't read STE.
+        """
+        with self.profile():
+            xmlData = self.readSessionsXml(steFile)
+            if xmlData is None:
+                return None
+            logging.debug("Parsing xml data")
+            try:
+                with metrics.timer("parser.parseXml"):
+                    return self.parseXml(xmlData)
+            except (KeyError, TypeError):
+                logging.warning("%s of %s is not readable", SESSIONS_XML, steFile)
+                return None
+
+    def readSessionsXml(self, steFile: str) -> dict:
+        """Reads Sessions.xml of STE archive in-process. XML is streamed from
+        archive into XML parser without extracting it to disk.
+
+        Args:
+            steFile (str): Path to steFile
+
+        Returns:
+            dict: XML data of Sessions.xml. None if STE is not an archive
+            with Sessions.xml.
+        """
+        try:
+            with ZipFile(steFile) as steArchive:
+                members = [
+                    info
+                    for info in steArchive.infolist()
+                    if os.path.basename(info.filename).lower() == SESSIONS_XML.lower()
+                ]
+                if not members:
+                    logging.info("No %s inside %s", SESSIONS_XML, steFile)
+                    return None
+                # Prefer Sessions.xml closest to root of archive
+                member = min(members, key=lambda info: info.filename.count("/"))
+                with steArchive.open(member) as f:
+                    with metrics.timer("parser.xmltodict"):
+                        return xmltodict.parse(f)
+        except (BadZipFile, ExpatError, NotImplementedError, OSError, RuntimeError):
+            logging.info("Native reader can't read %s", steFile)
+            return None
+
+    async def parseSteWithSuiteReader(self, steFile: str, tmpDir: str = "tmp") -> dict:
         """Core part of parsing *.ste file. It creates a temporary folder
         named as "ste_{name}", and will run SuiteReader.jar as subprocess.
         It's non-blocking. After subprocess is over, it will parse XML file.
@@ -165,43 +252,60 @@ class Parser:
         steName = os.path.split(steFile)[-1][:-4]
         parsedPath = os.path.join(self.basePath, tmpDir, f"ste_{steName}")
         os.mkdir(parsedPath)
-        os.chdir(parsedPath)
         logging.debug("Parsing working directory : %s", parsedPath)
 
         # run SuiteReader for this ste file
         logging.debug("Running SuiteReader")
         cmd = f'echo -ne | java -jar {self.suiteReaderPath} "{steFile}"'
-        process = await asyncio.create_subprocess_shell(
-            cmd, stderr=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
-        )
-        await process.wait()
-        stdout, stderr = await process.communicate()
-        logging.info(f"SuiteReader exited with {process.returncode}]")
+        with metrics.timer("parser.suiteReader"):
+            # SuiteReader writes into its working directory. Process-wide
+            # working directory is kept, so STE files can be parsed concurrently
+            process = await asyncio.create_subprocess_shell(
+                cmd,
+                stderr=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=parsedPath,
+            )
+            await process.wait()
+            stdout, stderr = await process.communicate()
+        logging.info("SuiteReader exited with %s", process.returncode)
         if stdout:
-            logging.debug(f"[SuiteReader]\n{stdout.decode()}")
+            logging.debug("[SuiteReader]\n%s", stdout.decode())
         if stderr:
-            logging.error(f"[SuiteReader]\n{stderr.decode()}")
+            logging.error("[SuiteReader]\n%s", stderr.decode())
 
         logging.debug("Reading 'Sessions.xml' at %s", parsedPath)
         sessionFilePath = os.path.join(parsedPath, "Sessions.xml")
-        async with aiofiles.open(sessionFilePath, "r") as f:
-            xml = await f.read()
-        xmlData = xmltodict.parse(xml)
-
-        logging.debug("Parsing xml data")
-        steData = self.parseXml(xmlData)
+        with metrics.timer("parser.readXml"):
+            async with aiofiles.open(sessionFilePath, "r") as f:
+                xml = await f.read()
+        with self.profile():
+            with metrics.timer("parser.xmltodict"):
+                xmlData = xmltodict.parse(xml)
 
-        # change dir to the temp dir
-        os.chdir(self.basePath)
-        logging.debug("Current working directory : %s", self.basePath)
+            logging.debug("Parsing xml data")
+            with metrics.timer("parser.parseXml"):
+                steData = self.parseXml(xmlData)
 
         logging.debug("Deleting temporary file")
-        isDeleted = await self.__deleteDir__(parsedPath)
+        with metrics.timer("parser.deleteDir"):
+            isDeleted = await self.__deleteDir__(parsedPath)
         if not isDeleted:
             logging.warning("Path %s is not deleted", parsedPath)
 
         return steData
 
+    def profile(self):
+        """Profiles block with profiler, if parser has one. Block must not
+        await, since profiler would record event loop instead of parsing.
+
+        Returns:
+            contextlib.AbstractContextManager: Context of profiler
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.profile()
+
     async def __deleteDir__(self, path: str) -> bool:
         """Deletes folder at given path.
 
@@ -222,70 +326,12 @@ class Parser:
         )
         stdout, stderr = await proc.communicate()
         if stdout:
-            logging.debug(f"{stdout.decode()}")
+            logging.debug("%s", stdout.decode())
         if stderr:
-            logging.error(f"{stderr.decode()}")
+            logging.error("%s", stderr.decode())
 
         if proc.returncode != 0:
             logging.debug("Deleting %s Failed", path)
             return False
         logging.debug("Deteting %s Success", path)
         return True
-
-    def __parseDict__(self, data: dict, parent: str = None) -> tuple:
-        """Utility to parse dictionary. Separates TCL variables
-        into boolean, numeric, and string type. If parent is given,
-        it will parse tcl name as parent_tclName.
-
-        Args:
-            data (dict): TCL data to parse
-            parent (dict, optional): If parent name is given, it will
-            parse tcl name as parent_tclName. Defaults to None.
-
-        Returns:
-            tuple: tuple of dictionarys for boolean, numeric, string type TCL variables.
-        """
-        boolean = {}
-        numerical = {}
-        string = {}
-        for pair in data:
-            k = pair["@n"]
-            v = pair["@v"]
-            if parent is not None:
-                k = "_".join([parent, k])
-            v = self.__typeEncoder__(v)
-            if isinstance(v, bool):
-                boolean[k] = v
-            elif isinstance(v, int) or isinstance(v, float):
-                numerical[k] = v
-            else:
-                string[k] = v if v != "" else None
-        return boolean, numerical, string
-
-    def __typeEncoder__(self, value):
-        """Encodes string data to native python values.
-
-        Args:
-            value (str): string value
-
-        Returns:
-            _type_ : Encoded value for correct type.
-        """
-        if value in ["true", "Enabled"]:
-            return True
-        if value in ["false", "Disabled"]:
-            return False
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, str):
-            try:
-                value = int(value)
-                return value
-            except:
-                pass
-            try:
-                value = float(value)
-                return value
-            except:
-                pass
-        return value
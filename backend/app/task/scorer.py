@@ -0,0 +1,386 @@
+import logging
+import threading
+
+import numpy as np
+
+from .snapshot import Snapshot, writeSnapshot
+
+
+class Scorer:
+    """
+    Scores agreement of boolean TCL variables between input and test sessions.
+    Each scorer gives weight to every TCL variable of input, and score of a
+    test session is dot product of its agreement vector(target == input) and
+    the weights.
+    """
+
+    name = None
+    # dtype of weights given by getWeights()
+    dtype = None
+
+    def isReady(self) -> bool:
+        return True
+
+    def getWeights(self, testCase: str, tcls: list, inputValues: np.ndarray):
+        """Gets weight of agreement on each TCL variable of input.
+
+        Args:
+            testCase (str): Name of test case
+            tcls (list): TCL variables of input
+            inputValues (np.ndarray): Boolean values of TCL variables in input
+
+        Returns:
+            np.ndarray: Weight of each TCL variable
+        """
+        raise NotImplementedError
+
+    def score(self, agreement: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Scores test sessions.
+
+        Args:
+            agreement (np.ndarray): (test sessions x TCL variables) matrix, True
+            where test session agrees with input
+            weights (np.ndarray): Weight of each TCL variable given by getWeights()
+
+        Returns:
+            np.ndarray: Score of each test session
+        """
+        return agreement.astype(weights.dtype) @ weights
+
+
+class CountScorer(Scorer):
+    """
+    Counts TCL variables where test session agrees with input.
+    """
+
+    name = "count"
+    dtype = np.int64
+
+    def getWeights(self, testCase: str, tcls: list, inputValues: np.ndarray):
+        return np.ones(len(tcls), dtype=self.dtype)
+
+
+class IdfScorer(Scorer):
+    """
+    Weights agreement on TCL variable by inverse document frequency of input
+    value among test sessions of the test case, so agreeing on a value that
+    every test session shares counts less than agreeing on a rare one.
+    Frequency of each value is counted from TestCase table, and updated with
+    changes of database. Sharded search merges frequency of every shard with
+    getFrequency() and mergeFrequency(), so shards weight with global counts.
+    """
+
+    name = "idf"
+    dtype = np.float64
+
+    def __init__(self, db, modelPath: str = None) -> None:
+        self.db = db
+        self.modelPath = modelPath
+
+        # Counts of each test case
+        self.testSessionIds = {}
+        self.columns = {}
+        self.counts = {}
+        self.weights = {}
+        # Number of test sessions of merged frequency, which has no IDs
+        self.totals = {}
+        self.version = -1
+        self.lock = threading.Lock()
+
+    def isReady(self) -> bool:
+        """Checks if frequencies are counted or loaded.
+
+        Returns:
+            bool: True if scorer is ready.
+        """
+        return bool(self.counts)
+
+    def build(self) -> bool:
+        """Counts True and False values of boolean TCL variables of every
+        test case inside TestCase table.
+
+        Returns:
+            bool: True if counted.
+        """
+        logging.info("Counting frequency of TCL variables")
+        version = self.db.version
+        testCaseData = self.db.getEveryTestCaseData(downloadAvailOnly=False)
+        if not testCaseData:
+            logging.error("Failed to read test case data. Aborting build")
+            return False
+
+        items = {}
+        for testSessionId, testCase, tcData in testCaseData:
+            items.setdefault(testCase, []).append((testSessionId, tcData["boolean"]))
+
+        with self.lock:
+            self.testSessionIds, self.columns, self.counts = {}, {}, {}
+            for testCase, rows in items.items():
+                self.count(testCase, rows)
+            self.weights = {}
+            self.version = version
+        logging.info(
+            "Counted frequency of TCL variables | %d test cases, %d items",
+            len(self.counts),
+            len(testCaseData),
+        )
+        return True
+
+    def save(self, modelPath: str = None) -> bool:
+        """Saves counts to modelPath.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if saved.
+        """
+        modelPath = modelPath or self.modelPath
+        if not self.isReady() or modelPath is None:
+            logging.error("No frequency or path to save")
+            return False
+        logging.debug("Saving frequency of TCL variables at %s", modelPath)
+        with self.lock:
+            testCases = list(self.counts.keys())
+            arrays = {"testCases": np.array(testCases, dtype=str)}
+            for idx, testCase in enumerate(testCases):
+                arrays[f"ids_{idx}"] = np.array(
+                    sorted(self.testSessionIds[testCase]), dtype=np.int64
+                )
+                arrays[f"tcls_{idx}"] = np.array(
+                    list(self.columns[testCase]), dtype=str
+                )
+                arrays[f"counts_{idx}"] = self.counts[testCase]
+            version = self.version
+        return writeSnapshot(modelPath, arrays, {"version": version})
+
+    def load(self, modelPath: str = None) -> bool:
+        """Loads counts from modelPath.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if loaded.
+        """
+        modelPath = modelPath or self.modelPath
+        if modelPath is None:
+            logging.info("No path to frequency of TCL variables")
+            return False
+        logging.debug("Loading frequency of TCL variables from %s", modelPath)
+        model = Snapshot(modelPath)
+        if not model.open():
+            return False
+        testSessionIds, columns, counts = {}, {}, {}
+        for idx, testCase in enumerate(model["testCases"].tolist()):
+            testSessionIds[testCase] = set(model[f"ids_{idx}"].tolist())
+            columns[testCase] = {
+                tcl: col for col, tcl in enumerate(model[f"tcls_{idx}"].tolist())
+            }
+            counts[testCase] = np.array(model[f"counts_{idx}"], dtype=np.int64)
+        with self.lock:
+            self.testSessionIds = testSessionIds
+            self.columns = columns
+            self.counts = counts
+            self.weights = {}
+            self.version = int(model.meta["version"])
+        logging.info(
+            "Loaded frequency of TCL variables with %d test cases", len(self.counts)
+        )
+        return True
+
+    def count(self, testCase: str, rows: list, sign: int = 1) -> None:
+        """Counts True and False values of boolean TCL variables in test case.
+
+        Args:
+            testCase (str): Name of test case
+            rows (list): list of tuple(testSessionId, boolean TCL data)
+            sign (int, optional): 1 to add rows to counts, -1 to take them
+            back. Defaults to 1.
+        """
+        testSessionIds = self.testSessionIds.get(testCase, set())
+        columns = dict(self.columns.get(testCase, {}))
+        counts = [list(item) for item in self.counts.get(testCase, [])]
+        for testSessionId, boolean in rows:
+            if sign > 0:
+                testSessionIds.add(testSessionId)
+            else:
+                testSessionIds.discard(testSessionId)
+            for tcl, value in boolean.items():
+                if not isinstance(value, bool):
+                    continue
+                col = columns.setdefault(tcl, len(columns))
+                if col == len(counts):
+                    counts.append([0, 0])
+                counts[col][0 if value else 1] += sign
+        self.testSessionIds[testCase] = testSessionIds
+        self.columns[testCase] = columns
+        self.counts[testCase] = np.array(counts, dtype=np.int64).reshape(-1, 2)
+        self.weights.pop(testCase, None)
+
+    def apply(self, change: dict) -> None:
+        """Applies change of database incrementally. Values of new test
+        sessions are added to counts, and values of replaced test sessions,
+        given by change as previous, are taken back before new values are
+        added. Replaced test sessions without previous data, i.e. changes
+        replayed from change log, count their test cases again.
+
+        Args:
+            change (dict): Change from database including version, table,
+            testSessionId, action, value and previous
+        """
+        if not self.isReady() or change["version"] <= self.version:
+            return
+        if change["table"] == "TestCase":
+            testSessionId = change["testSessionId"]
+            tclData = self.db.TESTCASE.getTestCaseByTestSessionId(testSessionId)
+            previous = change.get("previous", None)
+            with self.lock:
+                if previous is not None:
+                    for testCase, tcData in previous.items():
+                        if testSessionId in self.testSessionIds.get(testCase, ()):
+                            self.count(
+                                testCase, [(testSessionId, tcData["boolean"])], -1
+                            )
+                replaced = [
+                    testCase
+                    for testCase, testSessionIds in self.testSessionIds.items()
+                    if testSessionId in testSessionIds
+                ]
+                for testCase, tcData in tclData.items():
+                    if testCase not in replaced:
+                        self.count(testCase, [(testSessionId, tcData["boolean"])])
+                for testCase in replaced:
+                    self.recount(testCase)
+        self.version = change["version"]
+
+    def recount(self, testCase: str) -> None:
+        """Counts test case again from TestCase table.
+
+        Args:
+            testCase (str): Name of test case
+        """
+        logging.debug("Counting frequency of TCL variables in %s again", testCase)
+        for counts in (self.testSessionIds, self.columns, self.counts, self.weights):
+            counts.pop(testCase, None)
+        rows = self.db.getTestCaseData(testCase, downloadAvailOnly=False)
+        if rows:
+            self.count(
+                testCase,
+                [(testSessionId, tcData["boolean"]) for testSessionId, tcData in rows],
+            )
+
+    def getFrequency(self, testCases: list) -> dict:
+        """Gets counts of given test cases to be merged with other shards.
+
+        Args:
+            testCases (list): Names of test cases
+
+        Returns:
+            dict: {testCase : {total, tcls, counts}} of counted test cases,
+            where counts are [True, False] counts of each TCL variable in tcls
+        """
+        with self.lock:
+            return {
+                testCase: {
+                    "total": self.getTotal(testCase),
+                    "tcls": list(self.columns[testCase]),
+                    "counts": self.counts[testCase].tolist(),
+                }
+                for testCase in testCases
+                if testCase in self.counts
+            }
+
+    @staticmethod
+    def mergeFrequency(frequencies: list) -> dict:
+        """Sums counts of test cases over shards.
+
+        Args:
+            frequencies (list): list of frequency given by getFrequency()
+
+        Returns:
+            dict: Merged frequency in same format as getFrequency()
+        """
+        merged = {}
+        for frequency in frequencies:
+            for testCase, item in frequency.items():
+                total, counts = merged.setdefault(testCase, [0, {}])
+                merged[testCase][0] = total + item["total"]
+                for tcl, (trueCount, falseCount) in zip(item["tcls"], item["counts"]):
+                    count = counts.setdefault(tcl, [0, 0])
+                    count[0] += trueCount
+                    count[1] += falseCount
+        return {
+            testCase: {
+                "total": total,
+                "tcls": list(counts.keys()),
+                "counts": list(counts.values()),
+            }
+            for testCase, (total, counts) in merged.items()
+        }
+
+    @classmethod
+    def fromFrequency(cls, frequency: dict):
+        """Creates scorer weighting with merged frequency of every shard.
+        It is not connected to database and doesn't apply changes.
+
+        Args:
+            frequency (dict): Frequency given by mergeFrequency()
+
+        Returns:
+            IdfScorer: Scorer with counts of frequency
+        """
+        scorer = cls(None)
+        for testCase, item in frequency.items():
+            scorer.totals[testCase] = item["total"]
+            scorer.columns[testCase] = {
+                tcl: col for col, tcl in enumerate(item["tcls"])
+            }
+            scorer.counts[testCase] = np.array(item["counts"], dtype=np.int64).reshape(
+                -1, 2
+            )
+        return scorer
+
+    def getTotal(self, testCase: str) -> int:
+        """Gets number of test sessions of counted test case.
+
+        Args:
+            testCase (str): Name of test case
+
+        Returns:
+            int: Number of test sessions
+        """
+        if testCase in self.totals:
+            return self.totals[testCase]
+        return len(self.testSessionIds[testCase])
+
+    def getWeights(self, testCase: str, tcls: list, inputValues: np.ndarray):
+        """Gets IDF weight of input value of each TCL variable,
+        log((N + 1) / (n + 1)) + 1 where N is number of test sessions of
+        test case and n is number of test sessions with same value.
+        Test cases that are not counted get weight of 1.
+
+        Args:
+            testCase (str): Name of test case
+            tcls (list): TCL variables of input
+            inputValues (np.ndarray): Boolean values of TCL variables in input
+
+        Returns:
+            np.ndarray: Weight of each TCL variable
+        """
+        with self.lock:
+            if testCase not in self.counts:
+                return np.ones(len(tcls), dtype=self.dtype)
+            weights = self.weights.get(testCase, None)
+            total = self.getTotal(testCase)
+            if weights is None:
+                weights = np.log((total + 1) / (self.counts[testCase] + 1)) + 1
+                self.weights[testCase] = weights
+            columns = self.columns[testCase]
+
+        cols = np.array([columns.get(tcl, -1) for tcl in tcls], dtype=np.int64)
+        sides = np.where(np.asarray(inputValues, dtype=bool), 0, 1)
+        result = np.full(len(tcls), np.log(total + 1) + 1, dtype=self.dtype)
+        found = cols != -1
+        result[found] = weights[cols[found], sides[found]]
+        return result
@@ -0,0 +1,833 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .snapshot import Snapshot, writeSnapshot
+from .vocab import vocabulary
+
+# Values of string matrix other than IDs of string table
+MISSING = -1  # TCL variable doesn't exist in test case
+NONE_VALUE = -2  # TCL variable exists without value
+UNKNOWN = -3  # Value of input which doesn't exist in string table
+
+# Snapshots of other format are rebuilt on load
+SNAPSHOT_FORMAT = 3
+
+
+def hashString(value: str) -> int:
+    """64-bit hash of string. Stable across processes, unlike hash()."""
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def hashStrings(values: list) -> np.ndarray:
+    return np.fromiter(
+        (hashString(value) for value in values), dtype=np.uint64, count=len(values)
+    )
+
+
+def parsePredicates(where: str) -> list:
+    """Parses predicates of TCL variables joined with AND, i.e.
+    "VolteEn=true AND TestActivity=Attach". Values are encoded like TCL values
+    of STE: true / false are boolean, numbers are numeric, null is None and
+    others are string. Quoted values are always string.
+
+    Args:
+        where (str): Predicates
+
+    Returns:
+        list: list of tuple(TCL variable, value). None if predicates are invalid.
+    """
+    predicates = []
+    for clause in re.split(r"\s+AND\s+", where.strip(), flags=re.IGNORECASE):
+        match = re.fullmatch(r"\s*([^=\s]+)\s*==?\s*(.*?)\s*", clause)
+        if match is None:
+            return None
+        tcl, value = match.groups()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            predicates.append((tcl, value[1:-1]))
+            continue
+        if value.lower() in ("true", "false"):
+            predicates.append((tcl, value.lower() == "true"))
+            continue
+        if value.lower() in ("null", "none", ""):
+            predicates.append((tcl, None))
+            continue
+        for encode in (int, float):
+            try:
+                value = encode(value)
+                break
+            except ValueError:
+                pass
+        predicates.append((tcl, value))
+    return predicates
+
+
+def matchPredicates(tcData, predicates: list) -> bool:
+    """Checks if TCL data of test case satisfies every predicate. Values are
+    compared as they are encoded in snapshot, so it matches same rows as
+    inverted index.
+
+    Args:
+        tcData (TclData): TCL data of test case
+        predicates (list): list of tuple(TCL variable, value)
+
+    Returns:
+        bool: True if every predicate is satisfied
+    """
+    for tcl, value in predicates:
+        if isinstance(value, bool):
+            data = tcData["boolean"]
+            if tcl not in data or bool(data[tcl]) != value:
+                return False
+        elif isinstance(value, (int, float)):
+            target = tcData["numeric"].get(tcl, None)
+            if not isinstance(target, (int, float)) or float(target) != float(value):
+                return False
+        else:
+            data = tcData["string"]
+            if tcl not in data:
+                return False
+            target = data[tcl]
+            if isinstance(value, str):
+                if not isinstance(target, str) or target != value:
+                    return False
+            elif isinstance(target, str):
+                return False
+    return True
+
+
+def postingKeys(cols: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Keys of (column, string table ID) pairs in postings of string values."""
+    return cols.astype(np.int64) * (1 << 32) + (values.astype(np.int64) - NONE_VALUE)
+
+
+class StringTable:
+    """
+    Interned strings of search snapshot. ID of string is its index in sorted
+    64-bit hashes, so strings are looked up with vectorized binary search
+    without building dictionary in each worker. Strings are kept as UTF-8 blob
+    to convert IDs back to strings.
+    """
+
+    __slots__ = ("hashes", "data", "offsets")
+
+    def __init__(
+        self, hashes: np.ndarray, data: np.ndarray, offsets: np.ndarray
+    ) -> None:
+        self.hashes = hashes
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def fromStrings(cls, strings) -> "StringTable":
+        strings = list(set(strings))
+        hashes = hashStrings(strings)
+        order = np.argsort(hashes, kind="stable")
+        hashes = hashes[order]
+        if np.any(hashes[1:] == hashes[:-1]):
+            logging.warning("Hash collision in string table")
+        encoded = [strings[idx].encode() for idx in order.tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(item) for item in encoded])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(hashes, data, offsets)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot: Snapshot, name: str) -> "StringTable":
+        return cls(
+            snapshot[f"{name}.hashes"],
+            snapshot[f"{name}.data"],
+            snapshot[f"{name}.offsets"],
+        )
+
+    def toArrays(self, name: str) -> dict:
+        return {
+            f"{name}.hashes": self.hashes,
+            f"{name}.data": self.data,
+            f"{name}.offsets": self.offsets,
+        }
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def lookup(self, strings: list) -> np.ndarray:
+        """Gets IDs of strings.
+
+        Args:
+            strings (list): list of strings
+
+        Returns:
+            np.ndarray: IDs of strings. UNKNOWN for strings not in table.
+        """
+        if not strings or not len(self.hashes):
+            return np.full(len(strings), UNKNOWN, dtype=np.int64)
+        hashes = hashStrings(strings)
+        ids = np.searchsorted(self.hashes, hashes)
+        found = self.hashes[np.minimum(ids, len(self.hashes) - 1)] == hashes
+        return np.where(found, ids, UNKNOWN)
+
+    def get(self, idx: int) -> str:
+        return self.data[self.offsets[idx] : self.offsets[idx + 1]].tobytes().decode()
+
+
+class Partition:
+    """
+    Search data of a test case. Each row is a test case of test session.
+    boolean is -1(False) / 0(missing) / 1(True) matrix of boolean TCL variables,
+    numeric is float matrix of numeric TCL variables with NaN for missing,
+    string is matrix of string table IDs of string TCL variables.
+    Columns are sorted TCL IDs.
+    Inverted index of (TCL variable, value) to rows is kept with matrices.
+    trueBits / falseBits are packed bitmaps of rows for each boolean column,
+    and postings list rows of each (string column, value) pair in ascending
+    order, which also partitions rows by exact-match keys like TestActivity.
+    """
+
+    __slots__ = (
+        "rows",
+        "booleanCols",
+        "boolean",
+        "numericCols",
+        "numeric",
+        "stringCols",
+        "string",
+        "trueBits",
+        "falseBits",
+        "postingKeys",
+        "postingOffsets",
+        "postingRows",
+    )
+
+    def __init__(self, snapshot: Snapshot, idx: int) -> None:
+        self.rows = snapshot[f"p{idx}.rows"]
+        self.booleanCols = snapshot[f"p{idx}.booleanCols"]
+        self.boolean = snapshot[f"p{idx}.boolean"]
+        self.numericCols = snapshot[f"p{idx}.numericCols"]
+        self.numeric = snapshot[f"p{idx}.numeric"]
+        self.stringCols = snapshot[f"p{idx}.stringCols"]
+        self.string = snapshot[f"p{idx}.string"]
+        self.trueBits = snapshot[f"p{idx}.trueBits"]
+        self.falseBits = snapshot[f"p{idx}.falseBits"]
+        self.postingKeys = snapshot[f"p{idx}.postingKeys"]
+        self.postingOffsets = snapshot[f"p{idx}.postingOffsets"]
+        self.postingRows = snapshot[f"p{idx}.postingRows"]
+
+    def getBooleanBits(self, col: int, value: bool) -> np.ndarray:
+        """Gets packed bitmap of rows where boolean column has value."""
+        return self.trueBits[col] if value else self.falseBits[col]
+
+    def getStringRows(self, col: int, valueId: int) -> np.ndarray:
+        """Gets rows where string column has value, in ascending order."""
+        if valueId == UNKNOWN:
+            return self.postingRows[:0]
+        key = postingKeys(np.array([col]), np.array([valueId]))[0]
+        idx = int(np.searchsorted(self.postingKeys, key))
+        if idx < len(self.postingKeys) and self.postingKeys[idx] == key:
+            start, end = self.postingOffsets[idx], self.postingOffsets[idx + 1]
+            return self.postingRows[start:end]
+        return self.postingRows[:0]
+
+    def getStringBits(self, col: int, valueId: int) -> np.ndarray:
+        """Gets packed bitmap of rows where string column has value."""
+        bits = np.zeros(len(self.rows), dtype=bool)
+        bits[self.getStringRows(col, valueId)] = True
+        return np.packbits(bits)
+
+    def getNumericBits(self, col: int, value: float) -> np.ndarray:
+        """Gets packed bitmap of rows where numeric column has value."""
+        return np.packbits(self.numeric[:, col] == value)
+
+    @staticmethod
+    def columns(cols: np.ndarray, tclIds: np.ndarray) -> np.ndarray:
+        """Finds columns of TCL IDs.
+
+        Returns:
+            np.ndarray: Index of columns. -1 for TCL variables not in test case.
+        """
+        if not len(cols):
+            return np.full(len(tclIds), -1, dtype=np.int64)
+        idx = np.searchsorted(cols, tclIds)
+        found = cols[np.minimum(idx, len(cols) - 1)] == tclIds
+        return np.where(found, idx, -1)
+
+
+class SearchSnapshot:
+    """
+    Loaded search snapshot. Arrays are shared with every worker through
+    memory-mapped file. Only validity of test sessions is copied, since it is
+    updated in memory as database changes.
+    TCL variables of inputs are looked up through vocabulary of process, and
+    string table ID of each vocabulary ID is mapped once.
+    Test sessions changed after snapshot was built are kept in overlay as
+    TclData, and their rows in snapshot are hidden, so search merges both
+    until snapshot is rebuilt.
+    """
+
+    def __init__(self, snapshot: Snapshot) -> None:
+        self.snapshot = snapshot
+        self.version = int(snapshot.meta["version"])
+        self.testCases = {
+            testCase: idx for idx, testCase in enumerate(snapshot.meta["testCases"])
+        }
+        self.sessionIds = snapshot["sessionIds"]
+        self.valid = snapshot["valid"].astype(bool)
+        self.tcls = StringTable.fromSnapshot(snapshot, "tcls")
+        self.values = StringTable.fromSnapshot(snapshot, "values")
+        self.tclIds = np.empty(0, dtype=np.int64)
+        self.partitions = {}
+        self.lock = threading.Lock()
+
+        # Rows of test sessions which are outdated by overlay
+        self.replaced = np.zeros(len(self.sessionIds), dtype=bool)
+        # {testCase : {testSessionId : TclData}} of changed test sessions
+        self.overlay = {}
+        # Validity of test sessions not in snapshot
+        self.overlayValid = {}
+        self.changed = set()
+
+    def getPartition(self, testCase: str) -> Partition:
+        """Gets search data of test case.
+
+        Args:
+            testCase (str): Name of test case
+
+        Returns:
+            Partition: Search data. None if no test session has such test case.
+        """
+        partition = self.partitions.get(testCase, None)
+        if partition is None:
+            idx = self.testCases.get(testCase, None)
+            if idx is None:
+                return None
+            partition = self.partitions.setdefault(
+                testCase, Partition(self.snapshot, idx)
+            )
+        return partition
+
+    def getSessionIndex(self, testSessionIds) -> np.ndarray:
+        """Finds index of test sessions in snapshot.
+
+        Returns:
+            np.ndarray: Index of test sessions. -1 for test sessions not in snapshot.
+        """
+        testSessionIds = np.asarray(testSessionIds, dtype=np.int64)
+        if not len(self.sessionIds):
+            return np.full(len(testSessionIds), -1, dtype=np.int64)
+        idx = np.searchsorted(self.sessionIds, testSessionIds)
+        found = self.sessionIds[np.minimum(idx, len(self.sessionIds) - 1)]
+        return np.where(found == testSessionIds, idx, -1)
+
+    def getSessionMask(self, candidates: set = None) -> np.ndarray:
+        """Masks test sessions that are able to download and inside candidates.
+
+        Args:
+            candidates (set, optional): Test session IDs. Defaults to every test session.
+
+        Returns:
+            np.ndarray: Boolean mask over test sessions of snapshot
+        """
+        valid = self.valid & ~self.replaced
+        if candidates is None:
+            return valid
+        idx = self.getSessionIndex(list(candidates))
+        mask = np.zeros(len(self.sessionIds), dtype=bool)
+        mask[idx[idx != -1]] = True
+        return mask & valid
+
+    def isValid(self, testSessionId: int) -> bool:
+        """Checks if test session is able to download."""
+        idx = self.getSessionIndex([testSessionId])[0]
+        if idx != -1:
+            return bool(self.valid[idx])
+        return self.overlayValid.get(testSessionId, False)
+
+    def setValid(self, testSessionId: int, valid: bool) -> None:
+        """Updates validity of test session in place."""
+        idx = self.getSessionIndex([testSessionId])[0]
+        if idx != -1:
+            self.valid[idx] = valid
+        else:
+            self.overlayValid[testSessionId] = valid
+
+    def hasValidity(self, testSessionId: int) -> bool:
+        """Checks if validity of test session is known to snapshot."""
+        return (
+            testSessionId in self.overlayValid
+            or self.getSessionIndex([testSessionId])[0] != -1
+        )
+
+    def putOverlay(self, testSessionId: int, tclData: dict) -> None:
+        """Keeps test cases of changed test session in overlay and hides its
+        rows in snapshot. Overlay is copied on write, so searches running at
+        the same time read either old or new overlay.
+
+        Args:
+            testSessionId (int): ID of test session
+            tclData (dict): {testCase : TclData} of test session in database
+        """
+        idx = self.getSessionIndex([testSessionId])[0]
+        if idx != -1:
+            self.replaced[idx] = True
+        overlay = {
+            testCase: {
+                rowId: tcData
+                for rowId, tcData in rows.items()
+                if rowId != testSessionId
+            }
+            for testCase, rows in self.overlay.items()
+        }
+        for testCase, tcData in tclData.items():
+            overlay.setdefault(testCase, {})[testSessionId] = tcData
+        self.overlay = overlay
+        self.changed.add(testSessionId)
+
+    def getOverlayRows(
+        self, testCase: str, candidates: set = None, validOnly: bool = True
+    ) -> list:
+        """Gets test case of test sessions in overlay.
+
+        Args:
+            testCase (str): Name of test case
+            candidates (set, optional): Test session IDs. Defaults to every test session.
+            validOnly (bool, optional): Only test sessions able to download. Defaults to True.
+
+        Returns:
+            list: list of tuple(testSessionId, TclData) in order of change
+        """
+        rows = self.overlay.get(testCase, None)
+        if not rows:
+            return []
+        return [
+            (testSessionId, tcData)
+            for testSessionId, tcData in rows.items()
+            if (candidates is None or testSessionId in candidates)
+            and (not validOnly or self.isValid(testSessionId))
+        ]
+
+    def lookupTcls(self, tcls: list) -> np.ndarray:
+        """Gets string table IDs of TCL variables by their vocabulary IDs.
+
+        Args:
+            tcls (list): list of TCL variables
+
+        Returns:
+            np.ndarray: IDs of TCL variables. UNKNOWN for TCL variables not in table.
+        """
+        ids = vocabulary.getIds(tcls)
+        tclIds = self.tclIds
+        if len(ids) and ids.max() >= len(tclIds):
+            with self.lock:
+                tclIds = self.tclIds
+                size = len(vocabulary)
+                if size > len(tclIds):
+                    tclIds = np.concatenate(
+                        [tclIds, self.tcls.lookup(vocabulary.names[len(tclIds) : size])]
+                    )
+                    self.tclIds = tclIds
+        return tclIds[ids]
+
+    def lookupValues(self, values: list) -> np.ndarray:
+        """Gets string table IDs of string TCL values. None is NONE_VALUE."""
+        ids = np.full(len(values), NONE_VALUE, dtype=np.int64)
+        isString = [isinstance(value, str) for value in values]
+        if any(isString):
+            ids[np.flatnonzero(isString)] = self.values.lookup(
+                [value for value in values if isinstance(value, str)]
+            )
+        return ids
+
+    def query(
+        self, testCase: str, predicates: list, validOnly: bool = True
+    ) -> np.ndarray:
+        """Finds test sessions whose test case satisfies every predicate,
+        by intersecting bitmaps of inverted index. Test sessions in overlay
+        are checked one by one.
+
+        Args:
+            testCase (str): Name of test case
+            predicates (list): list of tuple(TCL variable, value). Type of value
+            selects boolean, numeric or string TCL variable.
+            validOnly (bool, optional): Only test sessions able to download. Defaults to True.
+
+        Returns:
+            np.ndarray: Sorted IDs of matching test sessions
+        """
+        overlayIds = np.array(
+            [
+                testSessionId
+                for testSessionId, tcData in self.getOverlayRows(
+                    testCase, validOnly=validOnly
+                )
+                if matchPredicates(tcData, predicates)
+            ],
+            dtype=np.int64,
+        )
+        testSessionIds = self.queryPartition(testCase, predicates, validOnly)
+        return np.sort(np.concatenate([testSessionIds, overlayIds]))
+
+    def queryPartition(
+        self, testCase: str, predicates: list, validOnly: bool = True
+    ) -> np.ndarray:
+        """Finds test sessions in snapshot whose test case satisfies every
+        predicate. Rows outdated by overlay are skipped.
+
+        Returns:
+            np.ndarray: IDs of matching test sessions
+        """
+        partition = self.getPartition(testCase)
+        if partition is None:
+            return np.empty(0, dtype=np.int64)
+
+        bits = np.packbits(np.ones(len(partition.rows), dtype=bool))
+        for tcl, value in predicates:
+            tclIds = self.tcls.lookup([tcl])
+            if isinstance(value, bool):
+                col = partition.columns(partition.booleanCols, tclIds)[0]
+                if col == -1:
+                    return np.empty(0, dtype=np.int64)
+                bits = bits & partition.getBooleanBits(col, value)
+            elif isinstance(value, (int, float)):
+                col = partition.columns(partition.numericCols, tclIds)[0]
+                if col == -1:
+                    return np.empty(0, dtype=np.int64)
+                bits = bits & partition.getNumericBits(col, float(value))
+            else:
+                col = partition.columns(partition.stringCols, tclIds)[0]
+                valueId = self.lookupValues([value])[0]
+                if col == -1 or valueId == UNKNOWN:
+                    return np.empty(0, dtype=np.int64)
+                bits = bits & partition.getStringBits(col, valueId)
+
+        rows = np.flatnonzero(np.unpackbits(bits, count=len(partition.rows)))
+        sessions = partition.rows[rows]
+        sessions = sessions[~self.replaced[sessions]]
+        if validOnly:
+            sessions = sessions[self.valid[sessions]]
+        return self.sessionIds[sessions]
+
+
+class SearchIndex:
+    """
+    Read-only search data of TestCase table, exported as memory-mapped
+    snapshot. Every uvicorn worker maps the same file, so decoded TCL data is
+    held once in page cache instead of once per worker, and workers don't
+    touch SQLite on search.
+    Snapshot is rewritten atomically after database update, and workers swap
+    to new snapshot on next search without restart.
+    Changes of database are applied to overlay of loaded snapshot, so search
+    never waits for rebuild. Snapshot is rebuilt in background when overlay
+    has more than maxOverlay test sessions, and old snapshot is served until
+    new one is loaded.
+    """
+
+    def __init__(
+        self,
+        db,
+        snapshotPath: str = None,
+        refreshInterval: float = 1.0,
+        maxOverlay: int = 1000,
+    ) -> None:
+        self.db = db
+        self.snapshotPath = snapshotPath
+        self.refreshInterval = refreshInterval
+        self.maxOverlay = maxOverlay
+        self.current = None
+        self.fileId = None
+        self.lastChecked = 0.0
+        self.version = -1
+        self.lock = threading.RLock()
+        self.rebuilding = None
+
+    def isReady(self) -> bool:
+        """Checks if snapshot is loaded.
+
+        Returns:
+            bool: True if snapshot can be used for search.
+        """
+        return self.current is not None
+
+    def build(self) -> bool:
+        """Exports every item of TestCase table to snapshot file and loads it.
+
+        Returns:
+            bool: True if built.
+        """
+        logging.info("Building search index snapshot")
+        if self.snapshotPath is None:
+            logging.error("No path to save search index snapshot")
+            return False
+        version = self.db.version
+        testCaseData = self.db.getEveryTestCaseData(downloadAvailOnly=False)
+        if not testCaseData:
+            logging.error("Failed to read test case data. Aborting build")
+            return False
+        validIds = set(self.db.TESTSESSION.getValidTestSessionIds())
+
+        rowsByTestCase = {}
+        ids, values = [], set()
+        for testSessionId, testCase, tcData in testCaseData:
+            rowsByTestCase.setdefault(testCase, []).append((testSessionId, tcData))
+            ids += [tcData.booleanIds, tcData.numericIds, tcData.stringIds]
+            values.update(
+                value for value in tcData.stringValues if isinstance(value, str)
+            )
+
+        # TCL variables are read as vocabulary IDs and mapped to string table IDs
+        ids = np.unique(np.concatenate(ids))
+        tcls = vocabulary.getNames(ids)
+        tclTable = StringTable.fromStrings(tcls)
+        tclIds = np.full(len(vocabulary), MISSING, dtype=np.int64)
+        tclIds[ids] = tclTable.lookup(tcls)
+        valueTable = StringTable.fromStrings(values)
+        values = list(values)
+        valueIds = dict(zip(values, valueTable.lookup(values).tolist()))
+        sessionIds = np.unique(
+            np.array([item[0] for item in testCaseData], dtype=np.int64)
+        )
+        sessionIndex = {
+            testSessionId: idx for idx, testSessionId in enumerate(sessionIds.tolist())
+        }
+
+        arrays = {
+            "sessionIds": sessionIds,
+            "valid": np.array(
+                [testSessionId in validIds for testSessionId in sessionIds.tolist()],
+                dtype=np.uint8,
+            ),
+        }
+        arrays.update(tclTable.toArrays("tcls"))
+        arrays.update(valueTable.toArrays("values"))
+        testCases = sorted(rowsByTestCase)
+        for idx, testCase in enumerate(testCases):
+            arrays.update(
+                self.buildPartition(
+                    idx, rowsByTestCase[testCase], sessionIndex, tclIds, valueIds
+                )
+            )
+
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "created": time.time(),
+            "testCases": testCases,
+        }
+        if not writeSnapshot(self.snapshotPath, arrays, meta):
+            return False
+        logging.info(
+            "Built search index snapshot | %d test sessions, %d test cases, %d TCL variables",
+            len(sessionIds),
+            len(testCases),
+            len(tclTable),
+        )
+        return self.load()
+
+    def buildPartition(
+        self,
+        idx: int,
+        rows: list,
+        sessionIndex: dict,
+        tclIds: dict,
+        valueIds: dict,
+    ) -> dict:
+        """Builds matrices of a test case.
+
+        Args:
+            idx (int): Index of test case in snapshot
+            rows (list): list of tuple(testSessionId, TclData) in table order
+            sessionIndex (dict): {testSessionId : index in snapshot}
+            tclIds (np.ndarray): String table ID of each vocabulary ID
+            valueIds (dict): {string value : ID}
+
+        Returns:
+            dict: Arrays of partition
+        """
+
+        def buildMatrix(items, fill, dtype, encode):
+            # items are (vocabulary IDs, values) of each row
+            rowTclIds = [tclIds[ids] for ids, _ in items]
+            allTclIds = np.concatenate(rowTclIds)
+            cols = np.unique(allTclIds).astype(np.int32)
+            rowIdx = np.repeat(np.arange(len(items)), [len(ids) for ids in rowTclIds])
+            colIdx = np.searchsorted(cols, allTclIds)
+            matrix = np.full((len(items), len(cols)), fill, dtype=dtype)
+            matrix[rowIdx, colIdx] = [
+                encode(value) for _, values in items for value in values
+            ]
+            return cols, matrix
+
+        booleanCols, boolean = buildMatrix(
+            [(tcData.booleanIds, tcData.getBooleanValues()) for _, tcData in rows],
+            0,
+            np.int8,
+            lambda value: 1 if value else -1,
+        )
+        numericCols, numeric = buildMatrix(
+            [(tcData.numericIds, tcData.numericValues) for _, tcData in rows],
+            np.nan,
+            np.float64,
+            lambda value: float(value) if isinstance(value, (int, float)) else np.nan,
+        )
+        stringCols, string = buildMatrix(
+            [(tcData.stringIds, tcData.stringValues) for _, tcData in rows],
+            MISSING,
+            np.int32,
+            lambda value: valueIds[value] if isinstance(value, str) else NONE_VALUE,
+        )
+
+        # Inverted index of string values
+        postingRows, postingCols = np.nonzero(string != MISSING)
+        keys = postingKeys(postingCols, string[postingRows, postingCols])
+        order = np.argsort(keys, kind="stable")
+        keys, starts = np.unique(keys[order], return_index=True)
+        return {
+            f"p{idx}.rows": np.array(
+                [sessionIndex[row[0]] for row in rows], dtype=np.int32
+            ),
+            f"p{idx}.booleanCols": booleanCols,
+            f"p{idx}.boolean": boolean,
+            f"p{idx}.numericCols": numericCols,
+            f"p{idx}.numeric": numeric,
+            f"p{idx}.stringCols": stringCols,
+            f"p{idx}.string": string,
+            f"p{idx}.trueBits": np.packbits(boolean.T == 1, axis=1),
+            f"p{idx}.falseBits": np.packbits(boolean.T == -1, axis=1),
+            f"p{idx}.postingKeys": keys,
+            f"p{idx}.postingOffsets": np.append(starts, len(order)).astype(np.int64),
+            f"p{idx}.postingRows": postingRows[order].astype(np.int32),
+        }
+
+    def load(self) -> bool:
+        """Maps snapshot file and swaps it with current one. Changes of
+        database made after snapshot was built are applied to new snapshot
+        before search sees it.
+
+        Returns:
+            bool: True if loaded.
+        """
+        if self.snapshotPath is None:
+            logging.info("No path to search index snapshot")
+            return False
+        snapshot = Snapshot(self.snapshotPath)
+        if not snapshot.open():
+            return False
+        if snapshot.meta.get("format", None) != SNAPSHOT_FORMAT:
+            logging.info("Search index snapshot is in old format")
+            return False
+        try:
+            stat = os.stat(self.snapshotPath)
+        except OSError:
+            logging.error("Failed to read search index snapshot")
+            return False
+        current = SearchSnapshot(snapshot)
+        with self.lock:
+            # Listener waits for lock, so no change is lost while swapping
+            version = current.version
+            for change in self.db.getChanges(current.version):
+                self.applyTo(current, change)
+                version = change["version"]
+            self.current = current
+            self.fileId = (stat.st_ino, stat.st_mtime_ns)
+            self.version = version
+        logging.info(
+            "Loaded search index snapshot | version %d, %d test sessions, %d in overlay",
+            current.version,
+            len(current.sessionIds),
+            len(current.changed),
+        )
+        return True
+
+    def refresh(self) -> None:
+        """Swaps to new snapshot if other worker has rewritten snapshot file.
+        File is checked at most once per refreshInterval.
+        """
+        now = time.monotonic()
+        if self.snapshotPath is None or now - self.lastChecked < self.refreshInterval:
+            return
+        self.lastChecked = now
+        try:
+            stat = os.stat(self.snapshotPath)
+        except OSError:
+            return
+        if (stat.st_ino, stat.st_mtime_ns) == self.fileId:
+            return
+        logging.info("Search index snapshot has changed. Reloading")
+        self.load()
+
+    def getSnapshot(self) -> SearchSnapshot:
+        """Gets current snapshot for search.
+
+        Returns:
+            SearchSnapshot: Current snapshot. None if it is not ready.
+        """
+        self.refresh()
+        if not self.isReady():
+            return None
+        return self.current
+
+    def rebuild(self) -> bool:
+        """Builds snapshot in background thread. Current snapshot and its
+        overlay serve search until new snapshot is loaded.
+
+        Returns:
+            bool: True if build has started.
+        """
+        if self.snapshotPath is None:
+            return False
+        with self.lock:
+            if self.rebuilding is not None and self.rebuilding.is_alive():
+                return False
+            logging.info("Rebuilding search index snapshot in background")
+            self.rebuilding = threading.Thread(
+                target=self.build, name="SearchIndexBuild", daemon=True
+            )
+            self.rebuilding.start()
+        return True
+
+    def apply(self, change: dict) -> None:
+        """Applies change of database to current snapshot. Snapshot is
+        rebuilt in background when overlay has more than maxOverlay test
+        sessions.
+
+        Args:
+            change (dict): Change from database including version, table,
+            testSessionId, action, value
+        """
+        with self.lock:
+            current = self.current
+            if current is None or change["version"] <= self.version:
+                return
+            self.applyTo(current, change)
+            self.version = change["version"]
+        if len(current.changed) > self.maxOverlay:
+            self.rebuild()
+
+    def applyTo(self, snapshot: SearchSnapshot, change: dict) -> None:
+        """Applies change of database to snapshot. Validity of test sessions is
+        updated in place, and test cases of changed test session are read
+        into overlay.
+
+        Args:
+            snapshot (SearchSnapshot): Snapshot to update
+            change (dict): Change from database
+        """
+        testSessionId = change["testSessionId"]
+        if change["table"] == "TestSession":
+            snapshot.setValid(testSessionId, bool(change["value"]))
+        elif change["table"] == "TestCase":
+            if not snapshot.hasValidity(testSessionId):
+                snapshot.setValid(
+                    testSessionId, self.db.TESTSESSION.isValid(testSessionId)
+                )
+            tclData = self.db.TESTCASE.getTestCaseByTestSessionId(testSessionId)
+            logging.debug(
+                "Applied %d test cases of test session %d to search index overlay",
+                len(tclData),
+                testSessionId,
+            )
+            snapshot.putOverlay(testSessionId, tclData)
@@ -0,0 +1,322 @@
+import logging
+import threading
+from heapq import nlargest
+
+import numpy as np
+
+from .snapshot import Snapshot, writeSnapshot
+
+
+class SimilarityGraph:
+    """
+    Top N most similar stored test sessions of every stored test session.
+    Each test session is searched as input with same scoring as Finder.find,
+    so neighbours are what /Result would give for its STE. Candidates are
+    pre-selected with search mode(LSH by default) and test sessions are
+    searched in batches with Finder.findBatch, so all pairs are never scored.
+    Changed test sessions are marked by apply() and searched again by refresh().
+    """
+
+    def __init__(
+        self,
+        db,
+        finder,
+        modelPath: str = None,
+        topn: int = 10,
+        mode: str = "lsh",
+        batchSize: int = 64,
+    ) -> None:
+        self.db = db
+        self.finder = finder
+        self.modelPath = modelPath
+        self.topn = topn
+        self.mode = mode
+        self.batchSize = batchSize
+
+        # Row of each test session in neighbour table
+        self.rows = {}
+        self.testSessionIds = np.empty(0, dtype=np.int64)
+        self.neighbors = np.empty((0, topn), dtype=np.int64)
+        self.scores = np.empty((0, topn), dtype=np.float64)
+        self.dirty = set()
+        self.version = -1
+        self.lock = threading.Lock()
+
+    def isReady(self) -> bool:
+        """Checks if neighbour table is built or loaded.
+
+        Returns:
+            bool: True if graph is ready.
+        """
+        return self.version != -1
+
+    def build(self) -> bool:
+        """Searches neighbours of every valid test session.
+
+        Returns:
+            bool: True if built.
+        """
+        logging.info("Building similarity graph")
+        version = self.db.version
+        testCaseData = self.db.getEveryTestCaseData()
+        if not testCaseData:
+            logging.error("Failed to read test case data. Aborting build")
+            return False
+        inputStes = {}
+        for testSessionId, testCase, tcData in testCaseData:
+            inputSte = inputStes.setdefault(
+                testSessionId,
+                {"id": testSessionId, "name": str(testSessionId), "tclData": {}},
+            )
+            inputSte["tclData"][testCase] = tcData
+        neighbors = self.search(list(inputStes.values()))
+        with self.lock:
+            self.rows = {}
+            self.testSessionIds = np.empty(0, dtype=np.int64)
+            self.neighbors = np.empty((0, self.topn), dtype=np.int64)
+            self.scores = np.empty((0, self.topn), dtype=np.float64)
+            self.update(neighbors)
+            self.dirty = set()
+            self.version = version
+        logging.info(
+            "Built similarity graph | %d test sessions, top %d",
+            len(self.rows),
+            self.topn,
+        )
+        return True
+
+    def save(self, modelPath: str = None) -> bool:
+        """Saves neighbour table to modelPath.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if saved.
+        """
+        modelPath = modelPath or self.modelPath
+        if not self.isReady() or modelPath is None:
+            logging.error("No similarity graph or path to save")
+            return False
+        logging.debug("Saving similarity graph at %s", modelPath)
+        with self.lock:
+            arrays = {
+                "testSessionIds": self.testSessionIds,
+                "neighbors": self.neighbors,
+                "scores": self.scores,
+                "dirty": np.array(sorted(self.dirty), dtype=np.int64),
+            }
+            meta = {"version": self.version, "topn": self.topn, "mode": self.mode}
+        return writeSnapshot(modelPath, arrays, meta)
+
+    def load(self, modelPath: str = None) -> bool:
+        """Loads neighbour table from modelPath.
+
+        Args:
+            modelPath (str, optional): Path to model file. Defaults to self.modelPath.
+
+        Returns:
+            bool: True if loaded.
+        """
+        modelPath = modelPath or self.modelPath
+        if modelPath is None:
+            logging.info("No path to similarity graph")
+            return False
+        logging.debug("Loading similarity graph from %s", modelPath)
+        model = Snapshot(modelPath)
+        if not model.open():
+            return False
+        if model.meta.get("topn") != self.topn or model.meta.get("mode") != self.mode:
+            logging.info("Similarity graph was built with other settings")
+            return False
+        testSessionIds = np.array(model["testSessionIds"], dtype=np.int64)
+        with self.lock:
+            self.testSessionIds = testSessionIds
+            self.neighbors = np.array(model["neighbors"], dtype=np.int64)
+            self.scores = np.array(model["scores"], dtype=np.float64)
+            self.rows = {
+                testSessionId: row
+                for row, testSessionId in enumerate(testSessionIds.tolist())
+            }
+            self.dirty = set(model["dirty"].tolist())
+            self.version = int(model.meta["version"])
+        logging.info("Loaded similarity graph with %d test sessions", len(self.rows))
+        return True
+
+    def apply(self, change: dict) -> None:
+        """Marks test sessions whose neighbours may be changed by change of
+        database. Changed test session and test sessions that have it as
+        neighbour are searched again by refresh().
+
+        Args:
+            change (dict): Change from database including version, table,
+            testSessionId, action, value
+        """
+        if not self.isReady() or change["version"] <= self.version:
+            return
+        testSessionId = change["testSessionId"]
+        with self.lock:
+            self.dirty.add(testSessionId)
+            rows = np.nonzero((self.neighbors == testSessionId).any(axis=1))[0]
+            self.dirty.update(self.testSessionIds[rows].tolist())
+            self.version = change["version"]
+
+    def refresh(self) -> int:
+        """Searches neighbours of marked test sessions again. Neighbours of
+        them are searched too, so a new test session joins neighbours of
+        test sessions similar to it.
+
+        Returns:
+            int: Number of test sessions searched
+        """
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        if not dirty or not self.isReady():
+            return 0
+        logging.info("Refreshing similarity graph of %d test sessions", len(dirty))
+        validIds = set(self.db.TESTSESSION.getValidTestSessionIds())
+        neighbors = self.search(self.getInputs(sorted(dirty & validIds)))
+        related = {
+            neighborId for items in neighbors.values() for neighborId, _ in items
+        }
+        neighbors.update(
+            self.search(self.getInputs(sorted((related - dirty) & validIds)))
+        )
+        with self.lock:
+            self.remove(dirty - validIds)
+            self.update(neighbors)
+        return len(neighbors)
+
+    def getInputs(self, testSessionIds: list) -> list:
+        """Reads stored test sessions as input of search.
+
+        Args:
+            testSessionIds (list): IDs of test sessions
+
+        Returns:
+            list: Detail of test sessions with id, name and tclData
+        """
+        inputStes = []
+        for testSessionId in testSessionIds:
+            inputSte = self.db.getTestSessionDetail(testSessionId)
+            if inputSte:
+                inputStes.append(inputSte)
+        return inputStes
+
+    def search(self, inputStes: list) -> dict:
+        """Searches top N neighbours of stored test sessions in batches.
+
+        Args:
+            inputStes (list): Test sessions with id, name and tclData
+
+        Returns:
+            dict: {testSessionId : list of (neighborId, score) in descending score}
+        """
+        neighbors = {}
+        for start in range(0, len(inputStes), self.batchSize):
+            batch = inputStes[start : start + self.batchSize]
+            scoresList = self.finder.findBatch(batch, mode=self.mode)
+            for inputSte, scores in zip(batch, scoresList):
+                neighbors[inputSte["id"]] = self.getTopn(inputSte["id"], scores)
+            logging.debug(
+                "Searched neighbours of %d / %d test sessions",
+                start + len(batch),
+                len(inputStes),
+            )
+        return neighbors
+
+    def getTopn(self, testSessionId: int, scores: dict) -> list:
+        """Selects top N test sessions other than itself. Same scores are
+        ordered by ID.
+
+        Args:
+            testSessionId (int): ID of test session searched
+            scores (dict): Scores from Finder.find
+
+        Returns:
+            list: list of (neighborId, score) in descending score
+        """
+        totals = (
+            (
+                score["boolean"] + score["string"] + score.get("numeric", 0),
+                -neighborId,
+            )
+            for neighborId, score in scores.items()
+            if neighborId != testSessionId
+        )
+        return [
+            (-negativeId, score) for score, negativeId in nlargest(self.topn, totals)
+        ]
+
+    def update(self, neighbors: dict) -> None:
+        """Writes neighbours into neighbour table. Missing neighbours are -1."""
+        newIds = [
+            testSessionId
+            for testSessionId in neighbors
+            if testSessionId not in self.rows
+        ]
+        if newIds:
+            count = len(newIds)
+            self.rows.update(
+                {
+                    testSessionId: len(self.testSessionIds) + idx
+                    for idx, testSessionId in enumerate(newIds)
+                }
+            )
+            self.testSessionIds = np.append(
+                self.testSessionIds, np.array(newIds, dtype=np.int64)
+            )
+            self.neighbors = np.vstack(
+                [self.neighbors, np.full((count, self.topn), -1, dtype=np.int64)]
+            )
+            self.scores = np.vstack(
+                [self.scores, np.zeros((count, self.topn), dtype=np.float64)]
+            )
+        for testSessionId, items in neighbors.items():
+            row = self.rows[testSessionId]
+            self.neighbors[row] = -1
+            self.scores[row] = 0
+            for col, (neighborId, score) in enumerate(items):
+                self.neighbors[row, col] = neighborId
+                self.scores[row, col] = score
+
+    def remove(self, testSessionIds: set) -> None:
+        """Removes test sessions that are not able to download."""
+        keep = ~np.isin(self.testSessionIds, list(testSessionIds))
+        if keep.all():
+            return
+        self.testSessionIds = self.testSessionIds[keep]
+        self.neighbors = self.neighbors[keep]
+        self.scores = self.scores[keep]
+        self.rows = {
+            testSessionId: row
+            for row, testSessionId in enumerate(self.testSessionIds.tolist())
+        }
+
+    def getNeighbors(self, testSessionId: int, limit: int = None) -> list:
+        """Gets most similar test sessions of stored test session.
+
+        Args:
+            testSessionId (int): ID of test session
+            limit (int, optional): Maximum number of neighbours. Defaults to top N.
+
+        Returns:
+            list: list of (neighborId, score) in descending score. None if
+            test session is not in graph.
+        """
+        with self.lock:
+            row = self.rows.get(testSessionId)
+            if row is None:
+                return None
+            neighbors = self.neighbors[row].tolist()
+            scores = self.scores[row].tolist()
+        items = [
+            (neighborId, score)
+            for neighborId, score in zip(neighbors, scores)
+            if neighborId != -1
+        ]
+        return items[:limit] if limit is not None else items
+
+    def isStale(self, testSessionId: int) -> bool:
+        """Checks if neighbours of test session wait for refresh()."""
+        return testSessionId in self.dirty
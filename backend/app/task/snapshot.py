@@ -0,0 +1,135 @@
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"CIFSNAP1"
+ALIGNMENT = 64
+
+
+def align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def writeSnapshot(snapshotPath: str, arrays: dict, meta: dict = None) -> bool:
+    """Writes numpy arrays into snapshot file which can be memory-mapped.
+    File is header(magic, length of JSON, JSON of dtype, shape and offset
+    of each array) followed by raw bytes of arrays aligned to 64 bytes.
+    File is written to temporary path and replaced atomically, so readers
+    never see partially written snapshot.
+
+    Args:
+        snapshotPath (str): Path to snapshot file
+        arrays (dict): {name : np.ndarray}. Object arrays are not supported.
+        meta (dict, optional): JSON serializable metadata. Defaults to None.
+
+    Returns:
+        bool: True if written.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    if any(array.dtype.hasobject for array in arrays.values()):
+        logging.error("Object arrays can't be written to snapshot")
+        return False
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = align(offset + array.nbytes)
+    header = json.dumps({"arrays": layout, "meta": meta or {}}).encode()
+    dataOffset = align(len(MAGIC) + 8 + len(header))
+
+    tmpPath = f"{snapshotPath}.tmp"
+    try:
+        with open(tmpPath, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(dataOffset + layout[name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(dataOffset + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, snapshotPath)
+    except OSError:
+        logging.error("Failed to write snapshot at %s", snapshotPath)
+        return False
+    logging.debug("Wrote snapshot at %s (%d bytes)", snapshotPath, dataOffset + offset)
+    return True
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped snapshot file written by writeSnapshot().
+    Arrays are views over the mapped file, so opening snapshot costs
+    nothing but reading the header. Pages are loaded by OS when touched.
+    """
+
+    def __init__(self, snapshotPath: str) -> None:
+        self.snapshotPath = snapshotPath
+        self.meta = {}
+        self.layout = {}
+        self.buffer = None
+        self.dataOffset = 0
+
+    def open(self) -> bool:
+        """Maps snapshot file into memory and reads header.
+
+        Returns:
+            bool: True if opened.
+        """
+        if not os.path.isfile(self.snapshotPath):
+            logging.info("No snapshot at %s", self.snapshotPath)
+            return False
+        try:
+            with open(self.snapshotPath, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            logging.error("Failed to map snapshot at %s", self.snapshotPath)
+            return False
+        if buffer[: len(MAGIC)] != MAGIC:
+            logging.error("%s is not a snapshot file", self.snapshotPath)
+            buffer.close()
+            return False
+        (headerLength,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+        headerOffset = len(MAGIC) + 8
+        header = json.loads(bytes(buffer[headerOffset : headerOffset + headerLength]))
+        self.layout = header["arrays"]
+        self.meta = header["meta"]
+        self.dataOffset = align(headerOffset + headerLength)
+        self.buffer = buffer
+        return True
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.layout
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Gets read-only array backed by mapped file.
+
+        Args:
+            name (str): Name of array
+
+        Returns:
+            np.ndarray: Array
+        """
+        layout = self.layout[name]
+        dtype = np.dtype(layout["dtype"])
+        shape = tuple(layout["shape"])
+        count = int(np.prod(shape, dtype=np.int64))
+        if count == 0:
+            return np.empty(shape, dtype=dtype)
+        array = np.frombuffer(
+            self.buffer,
+            dtype=dtype,
+            count=count,
+            offset=self.dataOffset + layout["offset"],
+        )
+        return array.reshape(shape)
@@ -0,0 +1,137 @@
+import re
+
+# Kinds of TCL variables, index of (boolean, numeric, string)
+BOOLEAN = 0
+NUMERIC = 1
+STRING = 2
+
+TRUE_LITERALS = ("true", "Enabled")
+FALSE_LITERALS = ("false", "Disabled")
+
+# Same syntax as int() and float() accept, so literals are classified without
+# trying conversions
+DIGITS = r"\d+(?:_\d+)*"
+INT_PATTERN = re.compile(rf"\s*[+-]?{DIGITS}\s*")
+FLOAT_PATTERN = re.compile(
+    rf"\s*[+-]?(?:(?:{DIGITS}\.(?:{DIGITS})?|\.{DIGITS}|{DIGITS})(?:[eE][+-]?{DIGITS})?"
+    r"|inf(?:inity)?|nan)\s*",
+    re.IGNORECASE,
+)
+
+# TCL values repeat a lot over test sessions(true, false, small numbers,
+# profile names), so literals are classified once
+MAX_CACHED_LITERALS = 1 << 16
+literalCache = {}
+
+
+def classifyLiteral(value: str) -> tuple:
+    """Classifies string value of TCL variable and converts it to native
+    python value. "true"/"Enabled" and "false"/"Disabled" are boolean,
+    integer and float literals are numeric, and others are string.
+
+    Args:
+        value (str): Value of TCL variable
+
+    Returns:
+        tuple: (kind, value). Empty string is string None.
+    """
+    if value in TRUE_LITERALS:
+        return BOOLEAN, True
+    if value in FALSE_LITERALS:
+        return BOOLEAN, False
+    if INT_PATTERN.fullmatch(value):
+        return NUMERIC, int(value)
+    if FLOAT_PATTERN.fullmatch(value):
+        return NUMERIC, float(value)
+    return STRING, value if value != "" else None
+
+
+def classifyValue(value) -> tuple:
+    """Classifies value of TCL variable with cache of string literals.
+
+    Args:
+        value (Any): Value of TCL variable from Sessions.xml or TAS
+
+    Returns:
+        tuple: (kind, value). kind is None for values that aren't TCL
+        variables(i.e. null).
+    """
+    if type(value) is str:
+        item = literalCache.get(value)
+        if item is None:
+            if len(literalCache) >= MAX_CACHED_LITERALS:
+                literalCache.clear()
+            item = literalCache[value] = classifyLiteral(value)
+        return item
+    if isinstance(value, bool):
+        return BOOLEAN, value
+    if isinstance(value, (int, float)):
+        return NUMERIC, value
+    if isinstance(value, str):
+        return classifyLiteral(value)
+    return None, value
+
+
+def splitTcls(pairs) -> tuple:
+    """Separates TCL variables into boolean, numeric, and string type.
+
+    Args:
+        pairs (iterable): (name, value) of TCL variables
+
+    Returns:
+        tuple: tuple of dictionarys for boolean, numeric, string type TCL variables.
+    """
+    tcData = ({}, {}, {})
+    cache = literalCache
+    for name, value in pairs:
+        item = cache.get(value) if type(value) is str else None
+        if item is None:
+            item = classifyValue(value)
+        kind, value = item
+        if kind is not None:
+            tcData[kind][name] = value
+    return tcData
+
+
+def flattenParameters(data: dict, parent: str = None):
+    """Flattens nested parameters of test case from TAS. Nested TCL variable
+    is named parent_tclName, same as Sessions.xml.
+
+    Args:
+        data (dict): Parameters of test case
+        parent (str, optional): Name of parent TCL variable. Defaults to None.
+
+    Yields:
+        tuple: (name, value) of each TCL variable
+    """
+    for name, value in data.items():
+        if parent is not None:
+            name = f"{parent}_{name}"
+        if isinstance(value, dict):
+            yield from flattenParameters(value, name)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    yield from flattenParameters(item, name)
+        else:
+            yield name, value
+
+
+def mergeTestCase(tclData: dict, testCase: str, tcData: dict) -> None:
+    """Adds TCL data of test case to TCL data of test suite. If same test case
+    already exists, boolean TCL variables are merged with OR, so TCL variable
+    is True if any of them is True. For numeric / string TCL variables, data
+    of FIRST test case is kept.
+
+    Args:
+        tclData (dict): {testCase : {boolean, numeric, string}} to add to
+        testCase (str): Name of test case
+        tcData (dict): boolean, numeric, string TCL variables of test case
+    """
+    current = tclData.get(testCase)
+    if current is None:
+        tclData[testCase] = tcData
+        return
+    boolean = current["boolean"]
+    for tcl, value in tcData["boolean"].items():
+        boolean[tcl] = boolean.get(tcl, False) or value
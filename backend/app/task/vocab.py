@@ -0,0 +1,168 @@
+import sys
+import threading
+
+import numpy as np
+
+
+class Vocabulary:
+    """
+    Process-wide interning table of TCL variable names. Every name is kept
+    once and has an ID, so parsed inputs, decoded test sessions and analysis
+    results share the same name objects instead of holding their own copies.
+    """
+
+    def __init__(self) -> None:
+        self.ids = {}
+        self.names = []
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def getId(self, name: str) -> int:
+        """Gets ID of TCL variable. Adds it to vocabulary if it is new.
+
+        Args:
+            name (str): Name of TCL variable
+
+        Returns:
+            int: ID of TCL variable
+        """
+        idx = self.ids.get(name, None)
+        if idx is None:
+            with self.lock:
+                idx = self.ids.get(name, None)
+                if idx is None:
+                    idx = len(self.names)
+                    self.names.append(sys.intern(name))
+                    self.ids[self.names[idx]] = idx
+        return idx
+
+    def getIds(self, names) -> np.ndarray:
+        return np.fromiter(
+            (self.getId(name) for name in names), dtype=np.int32, count=len(names)
+        )
+
+    def getName(self, idx: int) -> str:
+        return self.names[idx]
+
+    def getNames(self, ids: np.ndarray) -> list:
+        names = self.names
+        return [names[idx] for idx in ids.tolist()]
+
+    def intern(self, name: str) -> str:
+        """Gets shared object of TCL variable name.
+
+        Args:
+            name (str): Name of TCL variable
+
+        Returns:
+            str: Name object kept in vocabulary
+        """
+        return self.names[self.getId(name)]
+
+
+# Vocabulary of this process
+vocabulary = Vocabulary()
+
+
+def indexOf(ids: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Finds position of each query ID in ids, which are unique but unsorted.
+
+    Args:
+        ids (np.ndarray): Vocabulary IDs, i.e. TclData.booleanIds
+        query (np.ndarray): Vocabulary IDs to find
+
+    Returns:
+        np.ndarray: Position in ids. -1 for IDs not in ids.
+    """
+    query = np.asarray(query, dtype=np.int32)
+    if not len(ids):
+        return np.full(len(query), -1, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    pos = np.minimum(np.searchsorted(ids, query, sorter=order), len(ids) - 1)
+    found = ids[order[pos]] == query
+    return np.where(found, order[pos], -1)
+
+
+def internValue(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class TclData:
+    """
+    Compact TCL data of a test case. TCL variables are vocabulary IDs,
+    boolean values are packed into bits, and numeric / string values are kept
+    in tuples with repeated strings interned.
+    It can be read like the dictionary it replaces(tcData["boolean"]), but
+    dictionaries are built only when they are read, i.e. at API boundary.
+    Hot paths read IDs and values as arrays instead.
+    """
+
+    __slots__ = (
+        "booleanIds",
+        "booleanValues",
+        "numericIds",
+        "numericValues",
+        "stringIds",
+        "stringValues",
+    )
+
+    KEYS = ("boolean", "numeric", "string")
+
+    def __init__(self, boolean: dict, numeric: dict, string: dict) -> None:
+        self.booleanIds = vocabulary.getIds(list(boolean.keys()))
+        self.booleanValues = np.packbits(
+            np.fromiter(boolean.values(), dtype=bool, count=len(boolean))
+        )
+        self.numericIds = vocabulary.getIds(list(numeric.keys()))
+        self.numericValues = tuple(numeric.values())
+        self.stringIds = vocabulary.getIds(list(string.keys()))
+        self.stringValues = tuple(internValue(value) for value in string.values())
+
+    @classmethod
+    def fromDict(cls, tcData: dict) -> "TclData":
+        """Creates compact TCL data from dictionary of boolean, numeric, string."""
+        return cls(tcData["boolean"], tcData["numeric"], tcData["string"])
+
+    def getBooleanValues(self) -> np.ndarray:
+        """Gets boolean values aligned with booleanIds."""
+        return np.unpackbits(self.booleanValues, count=len(self.booleanIds)).astype(
+            bool
+        )
+
+    def getTrueTcls(self) -> list:
+        """Gets boolean TCL variables which are True, in order."""
+        return vocabulary.getNames(self.booleanIds[self.getBooleanValues()])
+
+    def getBoolean(self) -> dict:
+        return dict(
+            zip(
+                vocabulary.getNames(self.booleanIds),
+                self.getBooleanValues().tolist(),
+            )
+        )
+
+    def getNumeric(self) -> dict:
+        return dict(zip(vocabulary.getNames(self.numericIds), self.numericValues))
+
+    def getString(self) -> dict:
+        return dict(zip(vocabulary.getNames(self.stringIds), self.stringValues))
+
+    def __getitem__(self, key: str) -> dict:
+        if key == "boolean":
+            return self.getBoolean()
+        if key == "numeric":
+            return self.getNumeric()
+        if key == "string":
+            return self.getString()
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.KEYS
+
+    def keys(self) -> tuple:
+        return self.KEYS
+
+    def toDict(self) -> dict:
+        return {key: self[key] for key in self.KEYS}
@@ -1,17 +1,29 @@
+import atexit
 import json
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from uuid import UUID
 
 import aiofiles
 import numpy as np
 from fastapi import UploadFile
 
+from .metrics import getTraceId
+from .task.vocab import TclData
+
 CHUNK_SIZE = 1024 * 1024
+LOG_LEVELS = {
+    0: logging.ERROR,
+    1: logging.WARNING,
+    2: logging.INFO,
+    3: logging.DEBUG,
+}
 
 
 class Encoder(json.JSONEncoder):
     """
-    Encodes numpy types to native python types.
+    Encodes numpy types and compact TCL data to native python types.
     """
 
     def default(self, obj):
@@ -25,34 +37,64 @@ class Encoder(json.JSONEncoder):
             return obj.tolist()
         if isinstance(obj, UUID):
             return obj.hex
+        if isinstance(obj, TclData):
+            return obj.toDict()
         return super(Encoder, self).default(obj)
 
 
-def setLogger(verbose=0):
+class TraceIdFilter(logging.Filter):
+    """
+    Adds trace ID of current request to log records.
+    """
+
+    def filter(self, record):
+        record.traceId = getTraceId()
+        return True
+
+
+def setLogger(verbose=0, queued: bool = False):
     """Set logging format and level.
     verbose = 0 : Error. Default.
     verbose = 1 : Warning.
     verbose = 2 : Info.
     verbose = 3 : Debug
+    Level name(i.e. "INFO") is also accepted, so level can be read from
+    environment variable or config.
+    When queued is True, log records are put into a queue and written by
+    a background thread, so logging I/O never blocks request threads.
+    If logger is already set, only level is changed.
 
     Args:
-        verbose (int, optional): Logging level. Defaults to 0.
+        verbose (int or str, optional): Logging level. Defaults to 0.
+        queued (bool, optional): Write logs in background thread. Defaults to False.
     """
-    FORMAT = (
-        "%(asctime)s | %(filename)15s | %(funcName)20s | %(levelname)10s | %(message)s"
-    )
-    LEVEL = logging.ERROR
-    if verbose == 1:
-        LEVEL = logging.WARNING
-    elif verbose == 2:
-        LEVEL = logging.INFO
-    elif verbose == 3:
-        LEVEL = logging.DEBUG
-    logging.basicConfig(
-        format=FORMAT,
-        level=LEVEL,
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    FORMAT = "%(asctime)s | %(traceId)s | %(filename)15s | %(funcName)20s | %(levelname)10s | %(message)s"
+    if isinstance(verbose, str):
+        verbose = int(verbose) if verbose.isdigit() else verbose.upper()
+    LEVEL = LOG_LEVELS.get(verbose, logging.getLevelName(verbose))
+    if not isinstance(LEVEL, int):
+        LEVEL = logging.ERROR
+
+    root = logging.getLogger()
+    root.setLevel(LEVEL)
+    if root.handlers:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(FORMAT, datefmt="%Y-%m-%d %H:%M:%S"))
+    if not queued:
+        handler.addFilter(TraceIdFilter())
+        root.addHandler(handler)
+        return
+
+    # Trace ID is added in request thread, before record is queued
+    logQueue = queue.SimpleQueue()
+    queueHandler = QueueHandler(logQueue)
+    queueHandler.addFilter(TraceIdFilter())
+    listener = QueueListener(logQueue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    root.addHandler(queueHandler)
 
 
 async def writeFile(file: UploadFile, filePath: str) -> bool:
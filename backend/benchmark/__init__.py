@@ -0,0 +1,2 @@
+from .generator import Generator
+from .runner import BenchmarkFixture, Corpus, run
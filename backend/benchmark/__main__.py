@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from app.utils import setLogger
+
+from .generator import Generator
+from .report import (
+    compareReports,
+    formatComparison,
+    formatResults,
+    loadReport,
+    saveReport,
+)
+from .runner import Corpus, run
+from .suites import SUITES
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Benchmarks hot paths of CI Finder with synthetic corpus",
+    )
+    argParser.add_argument(
+        "--sessions", type=int, default=200, help="Number of test sessions"
+    )
+    argParser.add_argument(
+        "--testcases", type=int, default=8, help="Number of test cases"
+    )
+    argParser.add_argument(
+        "--tcls", type=int, default=2000, help="Number of TCL variables"
+    )
+    argParser.add_argument(
+        "--xml", type=int, default=5, help="Number of Sessions.xml inputs"
+    )
+    argParser.add_argument(
+        "--rounds", type=int, default=10, help="Rounds of each suite"
+    )
+    argParser.add_argument("--seed", type=int, default=0, help="Seed of generator")
+    argParser.add_argument(
+        "-k", dest="keyword", default=None, help="Run suites including keyword"
+    )
+    argParser.add_argument(
+        "--workdir",
+        default=None,
+        help="Directory of corpus. Defaults to temporary directory",
+    )
+    argParser.add_argument("--output", default=None, help="Save report as JSON")
+    argParser.add_argument(
+        "--baseline", default=None, help="Compare with baseline report"
+    )
+    argParser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative change marked as regression",
+    )
+    args = argParser.parse_args()
+
+    setLogger(0)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    workDir = args.workdir or tempfile.mkdtemp(prefix="cifinder_bench_")
+    generator = Generator(
+        numTestSessions=args.sessions,
+        numTestCases=args.testcases,
+        numTcls=args.tcls,
+        seed=args.seed,
+    )
+    corpus = Corpus(workDir, generator, numXml=args.xml)
+    results = run(corpus, SUITES, rounds=args.rounds, keyword=args.keyword)
+    print(formatResults(results))
+
+    if output:
+        saveReport(results, output, vars(args))
+    if baseline:
+        rows = compareReports(results, loadReport(baseline), args.threshold)
+        print()
+        print(formatComparison(rows))
+        if any(row[-1] == "regression" for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import datetime
+import json
+import os
+import random
+import sqlite3
+
+import xmltodict
+from database.dbBase import getTasUrl
+from database.dbTas import DbTAS
+from database.dbTestCase import DbTestCase
+from database.dbTestSession import DbTestSession
+
+TCL_PREFIXES = (
+    "S1 S5 S11 Sgi Gx Gy Rx Mme Sgw Pgw Enb Ue Volte Ims Diameter Gtp Nas Rrc Pdn "
+    "Bearer Apn Dra"
+).split()
+TCL_SUFFIXES = (
+    "En IpsecEn Mode Count Rate Addr Port Timeout Type Name Interval Version "
+    "Retries Profile Key"
+).split()
+TEST_CASES = [
+    "MME Nodal",
+    "MME Node",
+    "SGW Nodal",
+    "SGW Node",
+    "PGW Nodal",
+    "PGW Node",
+    "eNodeB Nodal",
+    "IMS Node",
+    "Diameter Node",
+    "DRA Nodal",
+    "UE Nodal",
+    "Sequencer",
+]
+TEST_ACTIVITIES = ["Init", "Capacity", "Sequencer", "Inter-MME", "Handover"]
+
+
+class Generator:
+    """
+    Generates realistic synthetic TAS/STE corpus. Test sessions are derived from
+    a few templates with random mutations, so similar test sessions exist.
+    """
+
+    def __init__(
+        self,
+        numTestSessions: int = 200,
+        numTestCases: int = 8,
+        numTcls: int = 2000,
+        numTemplates: int = 8,
+        seed: int = 0,
+    ) -> None:
+        self.numTestSessions = numTestSessions
+        self.numTestCases = min(numTestCases, len(TEST_CASES))
+        self.numTcls = numTcls
+        self.numTemplates = numTemplates
+        self.rng = random.Random(seed)
+
+        self.testCases = TEST_CASES[: self.numTestCases]
+        self.vocabulary = self.makeVocabulary()
+        self.templates = [self.makeTemplate() for _ in range(numTemplates)]
+
+    def makeVocabulary(self) -> dict:
+        """Creates TCL variable names and their types for each test case.
+
+        Returns:
+            dict: {testCase : {tcl : type}}
+        """
+        tclsPerTestCase = max(self.numTcls // self.numTestCases, 1)
+        vocabulary = {}
+        for testCase in self.testCases:
+            tcls = {"TestActivity": "activity"}
+            while len(tcls) < tclsPerTestCase:
+                tcl = (
+                    self.rng.choice(TCL_PREFIXES)
+                    + self.rng.choice(TCL_PREFIXES)
+                    + self.rng.choice(TCL_SUFFIXES)
+                )
+                if tcl.endswith("En"):
+                    tcls[tcl] = "boolean"
+                elif tcl.endswith(("Count", "Rate", "Port", "Timeout", "Retries")):
+                    tcls[tcl] = "numeric"
+                elif tcl.endswith("Interval") and len(tcls) % 3 == 0:
+                    tcls[tcl] = "nested"
+                else:
+                    tcls[tcl] = self.rng.choice(["boolean", "numeric", "string"])
+            vocabulary[testCase] = tcls
+        return vocabulary
+
+    def makeValue(self, tclType: str):
+        """Creates raw value of TCL variable as TAS returns.
+
+        Args:
+            tclType (str): Type of TCL variable
+
+        Returns:
+            _type_: str for plain TCL variables, dict for nested TCL variables
+        """
+        rng = self.rng
+        if tclType == "activity":
+            return rng.choice(TEST_ACTIVITIES)
+        if tclType == "boolean":
+            return rng.choice(["true", "false", "true", "false", "Enabled", "Disabled"])
+        if tclType == "numeric":
+            return str(rng.randint(0, 100)) if rng.random() < 0.8 else "1.5"
+        if tclType == "nested":
+            return {
+                "Enabled": rng.choice(["true", "false"]),
+                "Value": str(rng.randint(1, 10)),
+            }
+        return rng.choice(
+            [
+                f"{rng.randint(1, 254)}.0.0.{rng.randint(1, 254)}",
+                f"0x{rng.randint(0, 65535):04X}",
+                f"Profile{rng.randint(1, 5)}",
+                rng.choice(["IPv4", "IPv6", "Auto", "Manual", ""]),
+                f"Ue#(N{rng.randint(1, 9)}000)",
+            ]
+        )
+
+    def makeTemplate(self) -> dict:
+        """Creates template of test session.
+
+        Returns:
+            dict: {testCase : parameters}
+        """
+        template = {}
+        numTestCases = min(self.rng.randint(2, 5), len(self.testCases))
+        for testCase in self.rng.sample(self.testCases, numTestCases):
+            tcls = self.vocabulary[testCase]
+            names = ["TestActivity"] + self.rng.sample(
+                sorted(tcls), int(len(tcls) * self.rng.uniform(0.3, 0.6))
+            )
+            template[testCase] = {tcl: self.makeValue(tcls[tcl]) for tcl in names}
+        return template
+
+    def makeTestSession(self, idx: int) -> dict:
+        """Creates test session by mutating a template.
+
+        Args:
+            idx (int): Index of test session
+
+        Returns:
+            dict: Test session including name, keywords, description and tsGroups
+        """
+        rng = self.rng
+        template = rng.choice(self.templates)
+        testCases = []
+        for testCase, parameters in template.items():
+            if len(testCases) > 0 and rng.random() < 0.15:
+                continue
+            tcls = self.vocabulary[testCase]
+            mutated = {}
+            for tcl, value in parameters.items():
+                if rng.random() < 0.05:
+                    continue
+                mutated[tcl] = (
+                    self.makeValue(tcls[tcl]) if rng.random() < 0.1 else value
+                )
+            testCases.append({"type": testCase, "parameters": mutated})
+            if rng.random() < 0.1:
+                # Same test case inside another test server group
+                testCases.append({"type": testCase, "parameters": dict(mutated)})
+
+        numGroups = rng.randint(1, 3)
+        tsGroups = [
+            {"testCases": testCases[group::numGroups]} for group in range(numGroups)
+        ]
+        tsGroups = [tsGroup for tsGroup in tsGroups if tsGroup["testCases"]]
+        return {
+            "name": f"CI_{idx:05d}_{rng.choice(TCL_PREFIXES)}",
+            "keywords": " ".join(rng.sample(TCL_PREFIXES, 3)),
+            "description": f"Synthetic CI test session {idx}",
+            "tsGroups": tsGroups,
+        }
+
+    def makeTestSessions(self) -> list:
+        """Creates every test session.
+
+        Returns:
+            list: list of test sessions
+        """
+        return [self.makeTestSession(idx) for idx in range(self.numTestSessions)]
+
+    def makeTestSessionList(self, testSessions: list, url: str) -> dict:
+        """Creates payload of /api/libraries/{id}/testSessions
+
+        Args:
+            testSessions (list): list of test sessions
+            url (str): URL of test sessions API
+
+        Returns:
+            dict: Payload including list of test session name, keywords,
+            description and url
+        """
+        return {
+            "testSessions": [
+                {
+                    "name": testSession["name"],
+                    "keywords": testSession["keywords"],
+                    "description": testSession["description"],
+                    "url": f"{url}/{testSession['name']}",
+                }
+                for testSession in testSessions
+            ]
+        }
+
+    def makeTestSessionPayload(self, testSession: dict) -> dict:
+        """Creates payload of /api/libraries/{id}/testSessions/{name}, which
+        is consumed by DbTestCase.parseTestSuiteData.
+
+        Args:
+            testSession (dict): Test session
+
+        Returns:
+            dict: Payload including tsGroups
+        """
+        return {"name": testSession["name"], "tsGroups": testSession["tsGroups"]}
+
+    @staticmethod
+    def makeSessionsXml(testSession: dict) -> str:
+        """Creates Sessions.xml of test session, as SuiteReader extracts from STE.
+        Nested TCL variables are flattened as parent_child.
+
+        Args:
+            testSession (dict): Test session
+
+        Returns:
+            str: XML document
+        """
+
+        def flatten(parameters, parent=None):
+            nv = []
+            for k, v in parameters.items():
+                k = k if parent is None else "_".join([parent, k])
+                if isinstance(v, dict):
+                    nv.extend(flatten(v, k))
+                else:
+                    nv.append({"@n": k, "@v": v})
+            return nv
+
+        scenario = []
+        for tsGroup in testSession["tsGroups"]:
+            scripts = [
+                {
+                    "@root_name": testCase["type"],
+                    "p2s": {"nv": flatten(testCase["parameters"])},
+                }
+                for testCase in tsGroup["testCases"]
+            ]
+            scenario.append({"scripts": {"ssecoast_script": scripts}})
+        xmlData = {
+            "sessions": {
+                "master_session": {
+                    "repository_item": {
+                        "@name": testSession["name"],
+                        "d": testSession["description"],
+                        "ks": {
+                            "k": [
+                                {"@value": keyword}
+                                for keyword in testSession["keywords"].split(" ")
+                            ]
+                        },
+                    },
+                    "ts_sessions": {"scenario": scenario},
+                }
+            }
+        }
+        return xmltodict.unparse(xmlData, pretty=True)
+
+    def makeDatabase(self, dbPath: str, testSessions: list) -> str:
+        """Creates Finder.db with given test sessions. Test case rows are
+        created with DbTestCase.parseTestSuiteData, same as ingestion from TAS.
+
+        Args:
+            dbPath (str): Path to database directory
+            testSessions (list): list of test sessions
+
+        Returns:
+            str: Path to Finder.db
+        """
+        os.makedirs(dbPath, exist_ok=True)
+        dbFile = os.path.join(dbPath, "Finder.db")
+        if os.path.exists(dbFile):
+            os.remove(dbFile)
+        connection = sqlite3.connect(dbFile)
+        DbTAS(connection, {})
+        testCaseTable = DbTestCase(connection, {})
+        DbTestSession(connection, {})
+
+        today = datetime.date.today()
+        with connection:
+            connection.execute(
+                "INSERT INTO TAS ('address', 'library', 'libraryId', 'status', 'source', 'last_update') VALUES (?, ?, ?, ?, ?, ?);",
+                ("127.0.0.1", "CIPhase2Assemble", 1, 1, "stable", today),
+            )
+            for testSessionId, testSession in enumerate(testSessions, start=1):
+                connection.execute(
+                    "INSERT INTO TestSession ('id', 'tasId', 'name', 'keywords', 'description', 'status', 'last_update') VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    (
+                        testSessionId,
+                        1,
+                        testSession["name"],
+                        str(testSession["keywords"].split(" ")),
+                        testSession["description"],
+                        1,
+                        today,
+                    ),
+                )
+                connection.executemany(
+                    "INSERT INTO TestCase ('testSessionId', 'testcase', 'boolean', 'numeric', 'string') VALUES (?, ?, ?, ?, ?);",
+                    testCaseTable.parseTestSuiteData(
+                        testSessionId, testSession["tsGroups"]
+                    ),
+                )
+        connection.close()
+        return dbFile
+
+    def makeCorpus(self, workDir: str, numXml: int = 5) -> dict:
+        """Creates working directory of backend with Finder.db, Sessions.xml
+        files and TAS REST payloads.
+
+        Args:
+            workDir (str): Path to working directory
+            numXml (int, optional): Number of Sessions.xml files. Defaults to 5.
+
+        Returns:
+            dict: Paths of database, xml files and payloads, and test sessions
+        """
+        testSessions = self.makeTestSessions()
+        dbFile = self.makeDatabase(os.path.join(workDir, "database"), testSessions)
+
+        xmlDir = os.path.join(workDir, "xml")
+        os.makedirs(xmlDir, exist_ok=True)
+        xmlFiles = []
+        for testSession in self.rng.sample(
+            testSessions, min(numXml, len(testSessions))
+        ):
+            xmlFile = os.path.join(xmlDir, f"{testSession['name']}.xml")
+            with open(xmlFile, "w") as f:
+                f.write(self.makeSessionsXml(testSession))
+            xmlFiles.append(xmlFile)
+
+        payloadFile = os.path.join(workDir, "payloads.json")
+        url = getTasUrl("127.0.0.1", "/libraries/1/testSessions")
+        with open(payloadFile, "w") as f:
+            json.dump(
+                {
+                    "list": self.makeTestSessionList(testSessions, url),
+                    "testSessions": [
+                        self.makeTestSessionPayload(testSession)
+                        for testSession in testSessions
+                    ],
+                },
+                f,
+            )
+        return {
+            "dbFile": dbFile,
+            "xmlFiles": xmlFiles,
+            "payloadFile": payloadFile,
+            "testSessions": testSessions,
+        }
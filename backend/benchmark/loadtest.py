@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from app.utils import setLogger
+
+from .generator import Generator
+from .shards import BACKEND_PATH, makeSte, startServer, waitReady
+
+OPERATIONS = ("input", "result", "download")
+REJECTED = (429, 503)
+
+
+def parseMix(mix: str) -> dict:
+    """Parses weights of operations, i.e. "input=1,result=4,download=1".
+
+    Returns:
+        dict: {operation : weight}. Empty if mix is invalid.
+    """
+    weights = {}
+    for item in mix.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in OPERATIONS or not weight:
+            return {}
+        weights[operation] = float(weight)
+    return weights
+
+
+def startStubTas(payloadFile: str, port: int, args) -> subprocess.Popen:
+    """Starts stub TAS serving payloads of corpus as local process.
+
+    Returns:
+        subprocess.Popen: Process of stub TAS
+    """
+    command = [sys.executable, "-m", "benchmark.stubTas", payloadFile]
+    command += ["--port", str(port), "--latency", str(args.tas_latency)]
+    command += ["--jitter", str(args.tas_jitter)]
+    command += ["--failure-rate", str(args.tas_failure_rate), "--seed", str(args.seed)]
+    env = dict(os.environ, PYTHONPATH=BACKEND_PATH)
+    return subprocess.Popen(command, cwd=BACKEND_PATH, env=env)
+
+
+class Driver:
+    """
+    Sends mixed /Input, /Result and /Download requests to backend from many
+    clients at once, and records status and latency of every request.
+    """
+
+    def __init__(
+        self, url: str, steFiles: list, names: list, weights: dict, seed: int = 0
+    ) -> None:
+        self.url = url
+        self.steFiles = steFiles
+        self.names = names
+        self.operations = list(weights)
+        self.weights = list(weights.values())
+        self.seed = seed
+        self.uids = []
+
+    def prepare(self) -> bool:
+        """Uploads every STE once, so /Result has parsed inputs to search.
+
+        Returns:
+            bool: True if every STE is uploaded
+        """
+        for steFile in self.steFiles:
+            r = requests.post(
+                f"{self.url}/Input", files={"file": ("input.ste", steFile)}
+            )
+            if r.status_code != 200:
+                return False
+            self.uids.append(json.loads(r.json())["key"])
+        return True
+
+    def send(self, session: requests.Session, operation: str, rng) -> int:
+        """Sends one request of operation.
+
+        Returns:
+            int: Status code. 0 if failed to connect.
+        """
+        try:
+            if operation == "input":
+                steFile = rng.choice(self.steFiles)
+                r = session.post(
+                    f"{self.url}/Input", files={"file": ("input.ste", steFile)}
+                )
+            elif operation == "result":
+                findConfig = {"topk": rng.randint(1, 10)}
+                r = session.post(
+                    f"{self.url}/Result/{rng.choice(self.uids)}", json=findConfig
+                )
+            else:
+                params = {
+                    "address": "127.0.0.1",
+                    "libraryId": 1,
+                    "name": rng.choice(self.names),
+                    "deleteSte": False,
+                }
+                r = session.post(f"{self.url}/Download", params=params)
+        except requests.exceptions.RequestException:
+            return 0
+        return r.status_code
+
+    def work(self, idx: int, deadline: float) -> list:
+        """Sends requests until deadline, one at a time.
+
+        Returns:
+            list: list of (operation, status code, elapsed seconds)
+        """
+        rng = random.Random(self.seed + idx)
+        records = []
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                operation = rng.choices(self.operations, self.weights)[0]
+                start = time.perf_counter()
+                statusCode = self.send(session, operation, rng)
+                records.append((operation, statusCode, time.perf_counter() - start))
+        return records
+
+    def run(self, duration: float, concurrency: int) -> list:
+        """Runs concurrency clients for duration seconds.
+
+        Returns:
+            list: list of (operation, status code, elapsed seconds)
+        """
+        deadline = time.monotonic() + duration
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.work, idx, deadline) for idx in range(concurrency)
+            ]
+            return [record for future in futures for record in future.result()]
+
+
+def summarize(records: list, duration: float) -> dict:
+    """Summarizes requests of each operation.
+
+    Args:
+        records (list): list of (operation, status code, elapsed seconds)
+        duration (float): Seconds of load test
+
+    Returns:
+        dict: {operation : count, ok, rejected, failed, throughput and
+        p50, p95, p99, max in seconds}. "total" includes every operation.
+    """
+    groups = {}
+    for operation, statusCode, elapsed in records:
+        for name in (operation, "total"):
+            groups.setdefault(name, []).append((statusCode, elapsed))
+    summary = {}
+    for name in [operation for operation in OPERATIONS if operation in groups] + [
+        "total"
+    ]:
+        items = groups.get(name)
+        if not items:
+            continue
+        ordered = sorted(elapsed for _, elapsed in items)
+        ok = sum(statusCode == 200 for statusCode, _ in items)
+        rejected = sum(statusCode in REJECTED for statusCode, _ in items)
+        summary[name] = {
+            "count": len(items),
+            "ok": ok,
+            "rejected": rejected,
+            "failed": len(items) - ok - rejected,
+            "throughput": len(items) / duration,
+            "p50": ordered[int(len(ordered) * 0.50)],
+            "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+            "p99": ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)],
+            "max": ordered[-1],
+        }
+    return summary
+
+
+def formatSummary(summary: dict) -> str:
+    """Formats summary as text table. Times are in milliseconds.
+
+    Returns:
+        str: Text table
+    """
+    lines = [
+        f"{'operation':<10}{'count':>8}{'ok':>8}{'rejected':>10}{'failed':>8}"
+        f"{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    ]
+    for name, stats in summary.items():
+        lines.append(
+            f"{name:<10}{stats['count']:>8}{stats['ok']:>8}{stats['rejected']:>10}"
+            f"{stats['failed']:>8}{stats['throughput']:>9.1f}"
+            f"{stats['p50'] * 1e3:>9.1f}{stats['p95'] * 1e3:>9.1f}"
+            f"{stats['p99'] * 1e3:>9.1f}{stats['max'] * 1e3:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(
+        prog="python -m benchmark.loadtest",
+        description="Load tests backend with mixed /Input, /Result and /Download "
+        "against local stub TAS serving synthetic corpus",
+    )
+    argParser.add_argument(
+        "--sessions", type=int, default=200, help="Number of test sessions"
+    )
+    argParser.add_argument("--xml", type=int, default=5, help="Number of STE inputs")
+    argParser.add_argument(
+        "--duration", type=float, default=30, help="Seconds of load test"
+    )
+    argParser.add_argument(
+        "--concurrency", type=int, default=8, help="Number of clients at once"
+    )
+    argParser.add_argument(
+        "--mix",
+        default="input=1,result=4,download=1",
+        help="Weights of operations",
+    )
+    argParser.add_argument(
+        "--tas-latency", type=float, default=0.01, help="Seconds stub TAS waits"
+    )
+    argParser.add_argument(
+        "--tas-jitter", type=float, default=0.0, help="Random extra seconds of TAS"
+    )
+    argParser.add_argument(
+        "--tas-failure-rate",
+        type=float,
+        default=0.0,
+        help="Ratio of TAS requests failing with 503",
+    )
+    argParser.add_argument(
+        "--crawl",
+        action="store_true",
+        help="Start with empty database crawled from stub TAS",
+    )
+    argParser.add_argument("--port", type=int, default=8000, help="Port of backend")
+    argParser.add_argument("--seed", type=int, default=0, help="Seed of workload")
+    argParser.add_argument(
+        "--workdir", default=None, help="Defaults to temporary directory"
+    )
+    argParser.add_argument("--output", default=None, help="Save summary as JSON")
+    args = argParser.parse_args()
+
+    weights = parseMix(args.mix)
+    if not weights:
+        print(f"Invalid mix {args.mix}. Operations are {', '.join(OPERATIONS)}")
+        return 1
+
+    setLogger(0)
+    workDir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="cifinder_"))
+    paths = Generator(numTestSessions=args.sessions, seed=args.seed).makeCorpus(
+        workDir, numXml=args.xml
+    )
+    if args.crawl:
+        os.remove(paths["dbFile"])
+    steFiles = []
+    for xmlFile in paths["xmlFiles"]:
+        with open(xmlFile, "r") as f:
+            steFiles.append(makeSte(f.read()))
+    names = [testSession["name"] for testSession in paths["testSessions"]]
+
+    tasPort = args.port + 1
+    tasUrl = f"http://127.0.0.1:{tasPort}"
+    url = f"http://127.0.0.1:{args.port}"
+    processes = [startStubTas(paths["payloadFile"], tasPort, args)]
+    try:
+        if not waitReady(tasUrl, path="/stub/stats"):
+            print(f"Stub TAS at {tasUrl} is not ready")
+            return 1
+        start = time.perf_counter()
+        processes.append(
+            startServer(
+                "main",
+                workDir,
+                args.port,
+                {
+                    "CIFINDER_TAS_ADDRESS": "127.0.0.1",
+                    "CIFINDER_TAS_PORT": str(tasPort),
+                },
+            )
+        )
+        if not waitReady(url):
+            print(f"{url} is not ready")
+            return 1
+        print(
+            f"Backend at {url} ready in {time.perf_counter() - start:.1f}s, "
+            f"stub TAS at {tasUrl}, corpus at {workDir}"
+        )
+
+        driver = Driver(url, steFiles, names, weights, seed=args.seed)
+        if not driver.prepare():
+            print("Failed to upload STE")
+            return 1
+        print(
+            f"Running {args.concurrency} clients for {args.duration:.0f}s, "
+            f"mix {args.mix}"
+        )
+        start = time.perf_counter()
+        records = driver.run(args.duration, args.concurrency)
+        summary = summarize(records, time.perf_counter() - start)
+        print(formatSummary(summary))
+
+        tasStats = requests.get(f"{tasUrl}/stub/stats").json()
+        print(f"Stub TAS requests {tasStats['requests']}")
+        if tasStats["failures"]:
+            print(f"Stub TAS failures {tasStats['failures']}")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(
+                    {"config": vars(args), "summary": summary, "tas": tasStats},
+                    f,
+                    indent=2,
+                )
+        return 0
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
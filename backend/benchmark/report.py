@@ -0,0 +1,110 @@
+import datetime
+import json
+import platform
+
+import numpy as np
+
+
+def saveReport(results: dict, path: str, config: dict) -> None:
+    """Saves benchmark results as JSON.
+
+    Args:
+        results (dict): Results of benchmark suites
+        path (str): Path to report file
+        config (dict): Configuration of corpus and runner
+    """
+    report = {
+        "date": datetime.datetime.now().isoformat(),
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "config": config,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def loadReport(path: str) -> dict:
+    """Loads benchmark report.
+
+    Args:
+        path (str): Path to report file
+
+    Returns:
+        dict: Benchmark report
+    """
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def compareReports(results: dict, baseline: dict, threshold: float = 0.1) -> list:
+    """Compares median latency of each suite with baseline report.
+
+    Args:
+        results (dict): Results of benchmark suites
+        baseline (dict): Baseline report
+        threshold (float, optional): Relative change to be marked as regression
+        or improvement. Defaults to 0.1.
+
+    Returns:
+        list: list of (name, baseline median, current median, change, status)
+    """
+    rows = []
+    baselineResults = baseline.get("results", {})
+    for name, result in results.items():
+        current = result["stats"]["median"]
+        if name not in baselineResults:
+            rows.append((name, None, current, None, "new"))
+            continue
+        previous = baselineResults[name]["stats"]["median"]
+        change = (current - previous) / previous if previous > 0 else 0.0
+        status = "ok"
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        rows.append((name, previous, current, change, status))
+    return rows
+
+
+def formatResults(results: dict) -> str:
+    """Formats results as text table. Times are in milliseconds.
+
+    Args:
+        results (dict): Results of benchmark suites
+
+    Returns:
+        str: Text table
+    """
+    lines = [
+        f"{'name':<28}{'min':>10}{'median':>10}{'mean':>10}{'p95':>10}{'ops':>10}  extra"
+    ]
+    for name, result in results.items():
+        stats = result["stats"]
+        extra = ", ".join(f"{k}={v}" for k, v in result["extra_info"].items())
+        lines.append(
+            f"{name:<28}{stats['min'] * 1e3:>10.3f}{stats['median'] * 1e3:>10.3f}"
+            f"{stats['mean'] * 1e3:>10.3f}{stats['p95'] * 1e3:>10.3f}"
+            f"{stats['ops']:>10.1f}  {extra}"
+        )
+    return "\n".join(lines)
+
+
+def formatComparison(rows: list) -> str:
+    """Formats comparison with baseline as text table. Times are in milliseconds.
+
+    Args:
+        rows (list): Result of compareReports
+
+    Returns:
+        str: Text table
+    """
+    lines = [f"{'name':<28}{'baseline':>10}{'current':>10}{'change':>10}  status"]
+    for name, previous, current, change, status in rows:
+        previous = f"{previous * 1e3:>10.3f}" if previous is not None else f"{'-':>10}"
+        change = f"{change * 100:>+9.1f}%" if change is not None else f"{'-':>10}"
+        lines.append(f"{name:<28}{previous}{current * 1e3:>10.3f}{change}  {status}")
+    return "\n".join(lines)
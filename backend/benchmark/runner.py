@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import xmltodict
+from app import Parser
+from database import Database
+
+from .generator import Generator
+
+SUITE_READER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "res", "SuiteReader.jar"
+)
+
+
+class BenchmarkFixture:
+    """
+    Times a function over several rounds. Mimics `benchmark` fixture of
+    pytest-benchmark, so suites can be written in the same style.
+    """
+
+    def __init__(self, name: str, rounds: int = 10, warmup: int = 1) -> None:
+        self.name = name
+        self.rounds = rounds
+        self.warmup = warmup
+        self.stats = {}
+        self.extra_info = {}
+
+    def __call__(self, func, *args, **kwargs):
+        return self.pedantic(func, args=args, kwargs=kwargs)
+
+    def pedantic(
+        self,
+        func,
+        args: tuple = (),
+        kwargs: dict = None,
+        setup=None,
+        rounds: int = None,
+        warmup_rounds: int = None,
+    ):
+        """Runs func for rounds after warmup rounds. setup is called before
+        each round and is not timed.
+
+        Returns:
+            _type_: Result of the last round
+        """
+        kwargs = kwargs or {}
+        rounds = rounds or self.rounds
+        warmup = self.warmup if warmup_rounds is None else warmup_rounds
+        for _ in range(warmup):
+            if setup is not None:
+                setup()
+            func(*args, **kwargs)
+
+        times = []
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            times.append(time.perf_counter() - start)
+        self.stats = self.summarize(times)
+        return result
+
+    def summarize(self, times: list) -> dict:
+        """Summarizes elapsed times of rounds.
+
+        Args:
+            times (list): Elapsed seconds of each round
+
+        Returns:
+            dict: min, max, mean, stddev, median, p95 in seconds, rounds and ops
+        """
+        ordered = sorted(times)
+        mean = statistics.fmean(times)
+        return {
+            "min": ordered[0],
+            "max": ordered[-1],
+            "mean": mean,
+            "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "median": statistics.median(times),
+            "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+            "rounds": len(times),
+            "ops": 1 / mean if mean > 0 else 0.0,
+        }
+
+
+class Corpus:
+    """
+    Synthetic working directory of backend and modules built upon it.
+    """
+
+    def __init__(self, workDir: str, generator: Generator, numXml: int = 5) -> None:
+        self.workDir = os.path.abspath(workDir)
+        self.generator = generator
+        logging.info("Generating synthetic corpus at %s", self.workDir)
+        paths = generator.makeCorpus(self.workDir, numXml=numXml)
+
+        resPath = os.path.join(self.workDir, "res")
+        os.makedirs(resPath, exist_ok=True)
+        self.suiteReaderPath = os.path.join(resPath, "SuiteReader.jar")
+        if not os.path.exists(self.suiteReaderPath):
+            os.symlink(os.path.abspath(SUITE_READER_PATH), self.suiteReaderPath)
+
+        self.db = Database(os.path.join(self.workDir, "database"))
+        # Synthetic STE has Sessions.xml only, so it is read in-process
+        self.parser = Parser(
+            basePath=self.workDir, suiteReaderPath=self.suiteReaderPath, reader="native"
+        )
+        self.xmls = []
+        for xmlFile in paths["xmlFiles"]:
+            with open(xmlFile, "r") as f:
+                self.xmls.append(f.read())
+        self.inputStes = [
+            self.parser.parseXml(xmltodict.parse(xml)) for xml in self.xmls
+        ]
+        with open(paths["payloadFile"], "r") as f:
+            self.payloads = json.load(f)
+
+        testCases = Counter(
+            testCase for inputSte in self.inputStes for testCase in inputSte["tclData"]
+        )
+        self.testCase = testCases.most_common(1)[0][0]
+        self.app = None
+
+    def loadApp(self):
+        """Imports backend application(main.py) inside working directory
+        and initializes it without running server.
+
+        Returns:
+            module: main module of backend
+        """
+        if self.app is None:
+            os.chdir(self.workDir)
+            if "" not in sys.path and os.getcwd() not in sys.path:
+                sys.path.insert(0, os.getcwd())
+            os.environ.setdefault("CIFINDER_STE_READER", "native")
+            import main
+
+            main.initialize()
+            self.app = main
+        return self.app
+
+
+def run(corpus: Corpus, suites: list, rounds: int = 10, keyword: str = None) -> dict:
+    """Runs benchmark suites.
+
+    Args:
+        corpus (Corpus): Synthetic corpus
+        suites (list): list of suite functions
+        rounds (int, optional): Number of rounds for each suite. Defaults to 10.
+        keyword (str, optional): Run suites whose name includes keyword. Defaults to None.
+
+    Returns:
+        dict: {name : {"stats": stats, "extra_info": extra_info}}
+    """
+    results = {}
+    for suite in suites:
+        name = suite.__name__
+        if keyword is not None and keyword not in name:
+            continue
+        logging.info("Running %s", name)
+        benchmark = BenchmarkFixture(name, rounds=rounds)
+        suite(benchmark, corpus)
+        results[name] = {"stats": benchmark.stats, "extra_info": benchmark.extra_info}
+    return results
@@ -0,0 +1,201 @@
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import requests
+from app.utils import setLogger
+from database import splitDatabase
+
+from .generator import Generator
+from .runner import SUITE_READER_PATH
+
+BACKEND_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def startServer(module: str, workDir: str, port: int, env: dict = None):
+    """Starts backend server(main) or coordinator as local process.
+
+    Returns:
+        subprocess.Popen: Process of server
+    """
+    resPath = os.path.join(workDir, "res")
+    os.makedirs(resPath, exist_ok=True)
+    suiteReaderPath = os.path.join(resPath, "SuiteReader.jar")
+    if not os.path.exists(suiteReaderPath):
+        os.symlink(os.path.abspath(SUITE_READER_PATH), suiteReaderPath)
+    env = dict(os.environ, PYTHONPATH=BACKEND_PATH, **(env or {}))
+    env.setdefault("CIFINDER_LOG_LEVEL", "ERROR")
+    # Synthetic STE has Sessions.xml only, so it is read in-process
+    env.setdefault("CIFINDER_STE_READER", "native")
+    command = [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port)]
+    command += ["--log-level", "warning"]
+    return subprocess.Popen(command, cwd=workDir, env=env, stdout=subprocess.DEVNULL)
+
+
+def waitReady(url: str, timeout: float = 300, path: str = "/ready") -> bool:
+    """Waits until /ready(or path) of server returns 200.
+
+    Returns:
+        bool: True if ready before timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}{path}", timeout=5).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def search(url: str, steFile: bytes, findConfig: dict) -> tuple:
+    """Uploads STE to /Input and searches with /Result.
+
+    Returns:
+        tuple: Result of /Result and elapsed seconds of /Result
+    """
+    r = requests.post(f"{url}/Input", files={"file": ("input.ste", steFile)})
+    r.raise_for_status()
+    uid = json.loads(r.json())["key"]
+    start = time.perf_counter()
+    r = requests.post(f"{url}/Result/{uid}", json=findConfig)
+    elapsed = time.perf_counter() - start
+    r.raise_for_status()
+    return json.loads(r.json()), elapsed
+
+
+def makeSte(xml: str) -> bytes:
+    """Packs Sessions.xml as STE archive.
+
+    Returns:
+        bytes: STE file
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as steFile:
+        steFile.writestr("Sessions.xml", xml)
+    return buffer.getvalue()
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(
+        prog="python -m benchmark.shards",
+        description="Runs coordinator and shards as local processes, and checks "
+        "sharded search gives same result as single backend",
+    )
+    argParser.add_argument("--shards", type=int, default=2, help="Number of shards")
+    argParser.add_argument(
+        "--by",
+        choices=["library", "session"],
+        default="session",
+        help="Split test sessions by TAS library or one by one",
+    )
+    argParser.add_argument(
+        "--db", default=None, help="Finder.db to split. Defaults to synthetic corpus"
+    )
+    argParser.add_argument(
+        "--sessions", type=int, default=200, help="Number of synthetic test sessions"
+    )
+    argParser.add_argument("--xml", type=int, default=5, help="Number of inputs")
+    argParser.add_argument("--topk", type=int, default=5, help="Top K of search")
+    argParser.add_argument("--port", type=int, default=8000, help="Port of coordinator")
+    argParser.add_argument(
+        "--workdir", default=None, help="Defaults to temporary directory"
+    )
+    argParser.add_argument(
+        "--serve", action="store_true", help="Keep servers running after check"
+    )
+    args = argParser.parse_args()
+
+    setLogger(0)
+    workDir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="cifinder_"))
+    singlePath = os.path.join(workDir, "single")
+    xmls = []
+    if args.db is None:
+        paths = Generator(numTestSessions=args.sessions).makeCorpus(
+            singlePath, numXml=args.xml
+        )
+        dbFile = paths["dbFile"]
+        for xmlFile in paths["xmlFiles"]:
+            with open(xmlFile, "r") as f:
+                xmls.append(f.read())
+    else:
+        dbFile = os.path.abspath(args.db)
+
+    shardPaths = [os.path.join(workDir, f"shard{idx}") for idx in range(args.shards)]
+    counts = splitDatabase(
+        dbFile, [os.path.join(path, "database") for path in shardPaths], args.by
+    )
+    if not counts:
+        print("Failed to split database")
+        return 1
+    print(f"Split {sum(counts)} test sessions into shards {counts} at {workDir}")
+
+    shardUrls = [
+        f"http://127.0.0.1:{args.port + idx + 1}" for idx in range(args.shards)
+    ]
+    coordinatorUrl = f"http://127.0.0.1:{args.port}"
+    singleUrl = f"http://127.0.0.1:{args.port + args.shards + 1}"
+    processes = [
+        startServer("main", path, args.port + idx + 1)
+        for idx, path in enumerate(shardPaths)
+    ]
+    processes.append(
+        startServer(
+            "coordinator",
+            os.path.join(workDir, "coordinator"),
+            args.port,
+            {"CIFINDER_SHARDS": ",".join(shardUrls)},
+        )
+    )
+    if xmls:
+        processes.append(startServer("main", singlePath, args.port + args.shards + 1))
+
+    try:
+        for url in [coordinatorUrl] + ([singleUrl] if xmls else []):
+            if not waitReady(url):
+                print(f"{url} is not ready")
+                return 1
+        print(f"Coordinator at {coordinatorUrl}, shards at {', '.join(shardUrls)}")
+
+        isSame = True
+        for idx, xml in enumerate(xmls):
+            steFile = makeSte(xml)
+            for scorer in ["count", "idf"]:
+                findConfig = {"topk": args.topk, "scorer": scorer}
+                sharded, shardedTime = search(coordinatorUrl, steFile, findConfig)
+                single, singleTime = search(singleUrl, steFile, findConfig)
+                result = {item.pop("id"): item for item in sharded["info"]}
+                expected = {item.pop("id"): item for item in single["info"]}
+                for item in result.values():
+                    item.pop("shard")
+                same = result == expected and sharded["topScore"] == single["topScore"]
+                isSame = isSame and same
+                print(
+                    f"input {idx} {scorer}: {'SAME' if same else 'DIFFERENT'} "
+                    f"{len(result)} items, sharded {shardedTime * 1000:.1f}ms, "
+                    f"single {singleTime * 1000:.1f}ms"
+                )
+
+        if args.serve:
+            print("Serving. Press Ctrl+C to stop")
+            while all(process.poll() is None for process in processes):
+                time.sleep(1)
+        return 0 if isSame else 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+from app import Parser
+from app.utils import Encoder, setLogger
+
+from .runner import SUITE_READER_PATH
+
+
+def firstDifference(native, suiteReader, path: str = "") -> str:
+    """Finds path of first difference between two parsed STE data.
+
+    Returns:
+        str: Path and values of difference. None if same.
+    """
+    if isinstance(native, dict) and isinstance(suiteReader, dict):
+        for key in sorted(set(native) | set(suiteReader), key=str):
+            if key not in native or key not in suiteReader:
+                return f"{path}/{key}: only in {'SuiteReader' if key not in native else 'native'}"
+            difference = firstDifference(native[key], suiteReader[key], f"{path}/{key}")
+            if difference is not None:
+                return difference
+        return None
+    if isinstance(native, list) and isinstance(suiteReader, list):
+        if len(native) != len(suiteReader):
+            return f"{path}: length {len(native)} != {len(suiteReader)}"
+        for idx, (left, right) in enumerate(zip(native, suiteReader)):
+            difference = firstDifference(left, right, f"{path}/{idx}")
+            if difference is not None:
+                return difference
+        return None
+    if native != suiteReader or type(native) != type(suiteReader):
+        return f"{path}: {native!r} != {suiteReader!r}"
+    return None
+
+
+async def compare(parser: Parser, steFile: str, tmpDir: str) -> str:
+    """Parses STE with native reader and SuiteReader.
+
+    Returns:
+        str: Result of comparison
+    """
+    xmlData = parser.readSessionsXml(steFile)
+    if xmlData is None:
+        return "UNSUPPORTED native reader falls back to SuiteReader"
+    native = json.loads(json.dumps(parser.parseXml(xmlData), cls=Encoder))
+    suiteReader = await parser.parseSteWithSuiteReader(steFile, tmpDir)
+    suiteReader = json.loads(json.dumps(suiteReader, cls=Encoder))
+    difference = firstDifference(native, suiteReader)
+    if difference is not None:
+        return f"DIFFERENT {difference}"
+    return "SAME"
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(
+        prog="python -m benchmark.steParity",
+        description="Checks native STE reader gives same result as SuiteReader",
+    )
+    argParser.add_argument("steFiles", nargs="+", help="Paths to *.ste files")
+    argParser.add_argument(
+        "--suiteReader", default=SUITE_READER_PATH, help="Path to SuiteReader.jar"
+    )
+    args = argParser.parse_args()
+
+    setLogger(0)
+    workDir = tempfile.mkdtemp(prefix="cifinder_parity_")
+    parser = Parser(basePath=workDir, suiteReaderPath=args.suiteReader)
+    isSame = True
+    for steFile in args.steFiles:
+        result = asyncio.run(compare(parser, os.path.abspath(steFile), workDir))
+        isSame = isSame and not result.startswith("DIFFERENT")
+        print(f"{steFile}: {result}")
+    return 0 if isSame else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import random
+import sys
+import zipfile
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
+
+from .generator import Generator
+
+
+class StubTas:
+    """
+    Local stub of TAS REST API serving test sessions of synthetic corpus.
+    Every request waits latency(+ random jitter) and fails with 503 at
+    failureRate, so backend can be load tested without real TAS.
+    """
+
+    def __init__(
+        self,
+        payloadFile: str,
+        library: str = "CIPhase2Assemble",
+        libraryId: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failureRate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.library = library
+        self.libraryId = libraryId
+        self.latency = latency
+        self.jitter = jitter
+        self.failureRate = failureRate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.failures = Counter()
+
+        with open(payloadFile, "r") as f:
+            payloads = json.load(f)
+        # Test session list has name, keywords, description and payload has tsGroups
+        self.testSessions = {
+            item["name"]: dict(item, **payload)
+            for item, payload in zip(
+                payloads["list"]["testSessions"], payloads["testSessions"]
+            )
+        }
+        self.steFiles = {}
+
+    def getPayload(self, name: str) -> tuple:
+        """Makes payload of /api/libraries/{id}/testSessions/{name} with ETag.
+
+        Args:
+            name (str): Name of test session
+
+        Returns:
+            tuple: Payload and ETag. ({}, None) if test session doesn't exist.
+        """
+        testSession = self.testSessions.get(name)
+        if testSession is None:
+            return {}, None
+        payload = {"name": name, "tsGroups": testSession["tsGroups"]}
+        etag = hashlib.md5(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        return payload, f'"{etag}"'
+
+    def getSteFile(self, name: str) -> bytes:
+        """Makes STE file of test session, as /api/testSuites?action=export
+        does. STE files are made once and reused.
+
+        Args:
+            name (str): Name of test session
+
+        Returns:
+            bytes: STE file. None if test session doesn't exist.
+        """
+        if name not in self.steFiles:
+            testSession = self.testSessions.get(name)
+            if testSession is None:
+                return None
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as steFile:
+                steFile.writestr("Sessions.xml", Generator.makeSessionsXml(testSession))
+            self.steFiles[name] = buffer.getvalue()
+        return self.steFiles[name]
+
+    def createApp(self) -> FastAPI:
+        """Creates FastAPI app of stub TAS.
+
+        Returns:
+            FastAPI: App with /api routes of TAS and /stub/stats
+        """
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def emulateTas(request: Request, callNext):
+            path = request.url.path
+            if not path.startswith("/api"):
+                return await callNext(request)
+            if "/testSessions/" in path:
+                path = path.split("/testSessions/")[0] + "/testSessions/{name}"
+            key = f"{request.method} {path}"
+            self.requests[key] += 1
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.rng.random() < self.failureRate:
+                self.failures[key] += 1
+                return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return await callNext(request)
+
+        @app.get("/api")
+        def getApi():
+            return {"name": "stub TAS", "testSessions": len(self.testSessions)}
+
+        @app.get("/api/libraryIds")
+        def getLibraryIds():
+            return {self.library: self.libraryId}
+
+        @app.get("/api/libraries/{libraryId}/testSessions")
+        def getTestSessions(libraryId: int, request: Request):
+            if libraryId != self.libraryId:
+                return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+            url = f"{str(request.base_url).rstrip('/')}/api/libraries/{libraryId}/testSessions"
+            return {
+                "testSessions": [
+                    {
+                        "name": name,
+                        "keywords": testSession["keywords"],
+                        "description": testSession["description"],
+                        "url": f"{url}/{name}",
+                    }
+                    for name, testSession in self.testSessions.items()
+                ]
+            }
+
+        @app.get("/api/libraries/{libraryId}/testSessions/{name}")
+        def getTestSession(libraryId: int, name: str, request: Request):
+            payload, etag = self.getPayload(name)
+            if libraryId != self.libraryId or etag is None:
+                return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+            if request.headers.get("If-None-Match") == etag:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+            return JSONResponse(payload, headers={"ETag": etag})
+
+        @app.post("/api/testSuites")
+        def exportTestSuite(action: str, library: int, name: str):
+            steFile = self.getSteFile(name)
+            if action != "export" or library != self.libraryId or steFile is None:
+                return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+            return Response(content=steFile, media_type="application/binary")
+
+        @app.get("/stub/stats")
+        def getStats():
+            return {"requests": self.requests, "failures": self.failures}
+
+        return app
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(
+        prog="python -m benchmark.stubTas",
+        description="Serves TAS REST API of synthetic corpus for load tests",
+    )
+    argParser.add_argument(
+        "payloads", help="payloads.json of corpus made by benchmark generator"
+    )
+    argParser.add_argument("--port", type=int, default=8080, help="Port of stub TAS")
+    argParser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds every request waits"
+    )
+    argParser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random extra seconds up to jitter"
+    )
+    argParser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="Ratio of requests failing"
+    )
+    argParser.add_argument("--seed", type=int, default=0, help="Seed of failures")
+    args = argParser.parse_args()
+
+    stubTas = StubTas(
+        args.payloads,
+        latency=args.latency,
+        jitter=args.jitter,
+        failureRate=args.failure_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(stubTas.createApp(), port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from uuid import uuid4
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import xmltodict
+
+SUITES = []
+
+
+def suite(func):
+    """Registers benchmark suite. Suite gets benchmark fixture and corpus."""
+    SUITES.append(func)
+    return func
+
+
+@suite
+def bench_parseXml(benchmark, corpus):
+    xmlData = xmltodict.parse(corpus.xmls[0])
+    benchmark(corpus.parser.parseXml, xmlData)
+
+
+@suite
+def bench_parseSessionsXml(benchmark, corpus):
+    def parse(xml):
+        return corpus.parser.parseXml(xmltodict.parse(xml))
+
+    benchmark(parse, corpus.xmls[0])
+
+
+@suite
+def bench_parseSteNative(benchmark, corpus):
+    """Reads Sessions.xml out of STE archive in-process and parses it"""
+    steFile = os.path.join(corpus.workDir, "native.ste")
+    with ZipFile(steFile, "w", ZIP_DEFLATED) as steArchive:
+        steArchive.writestr("Sessions.xml", corpus.xmls[0])
+    steData = benchmark(lambda: asyncio.run(corpus.parser.parseSte(steFile)))
+    benchmark.extra_info["testCases"] = len(steData["tclData"])
+
+
+@suite
+def bench_tclDataMemory(benchmark, corpus):
+    """Resident size of parsed inputs as TclData, compared with dictionaries"""
+    xmlData = [xmltodict.parse(xml) for xml in corpus.xmls]
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    steData = [corpus.parser.parseXml(data) for data in xmlData]
+    compact = tracemalloc.get_traced_memory()[0] - start
+    tclData = [
+        {testCase: tcData.toDict() for testCase, tcData in item["tclData"].items()}
+        for item in steData
+    ]
+    expanded = tracemalloc.get_traced_memory()[0] - start - compact
+    tracemalloc.stop()
+    benchmark.extra_info["compactBytes"] = compact
+    benchmark.extra_info["dictBytes"] = expanded
+
+    tcData = next(iter(steData[0]["tclData"].values()))
+    benchmark(tcData.toDict)
+
+
+@suite
+def bench_parseTestSuiteData(benchmark, corpus):
+    tsGroups = corpus.payloads["testSessions"][0]["tsGroups"]
+    benchmark(corpus.db.TESTCASE.parseTestSuiteData, 1, tsGroups)
+
+
+@suite
+def bench_parseTasPayloads(benchmark, corpus):
+    """Parses TCL data of every test session payload of TAS"""
+    payloads = corpus.payloads["testSessions"]
+    parse = corpus.db.TESTCASE.parseTestSuiteData
+    benchmark(
+        lambda: [
+            parse(idx, payload["tsGroups"]) for idx, payload in enumerate(payloads)
+        ]
+    )
+    benchmark.extra_info["testSessions"] = len(payloads)
+
+
+@suite
+def bench_parseXmlTrees(benchmark, corpus):
+    """Parses TCL data of every Sessions.xml tree"""
+    xmlData = [xmltodict.parse(xml) for xml in corpus.xmls]
+    benchmark(lambda: [corpus.parser.parseXml(data) for data in xmlData])
+    benchmark.extra_info["inputs"] = len(xmlData)
+
+
+@suite
+def bench_getTestCase(benchmark, corpus):
+    items = benchmark(corpus.db.TESTCASE.getTestCase, corpus.testCase)
+    benchmark.extra_info["items"] = len(items)
+
+
+@suite
+def bench_getTestCaseData(benchmark, corpus):
+    items = benchmark(corpus.db.getTestCaseData, corpus.testCase)
+    benchmark.extra_info["items"] = len(items)
+
+
+@suite
+def bench_find(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    scores = benchmark(finder.find, corpus.inputStes[0])
+    benchmark.extra_info["testSessions"] = len(scores)
+
+
+@suite
+def bench_findCluster(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    scores = benchmark(finder.find, corpus.inputStes[0], mode="cluster")
+    benchmark.extra_info["testSessions"] = len(scores)
+    benchmark.extra_info["recall@5"] = finder.evaluateRecall(
+        "cluster", topk=5, inputStes=corpus.inputStes
+    )
+
+
+@suite
+def bench_findLsh(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    scores = benchmark(finder.find, corpus.inputStes[0], mode="lsh")
+    benchmark.extra_info["testSessions"] = len(scores)
+    benchmark.extra_info["recall@5"] = finder.evaluateRecall(
+        "lsh", topk=5, inputStes=corpus.inputStes
+    )
+
+
+@suite
+def bench_findNumeric(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    numericConfig = {"mode": "relative", "tolerance": 0.0, "weight": 1.0}
+    scores = benchmark(finder.find, corpus.inputStes[0], numericConfig=numericConfig)
+    benchmark.extra_info["testSessions"] = len(scores)
+
+
+@suite
+def bench_findIdf(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    scores = benchmark(finder.find, corpus.inputStes[0], scorer="idf")
+    benchmark.extra_info["testSessions"] = len(scores)
+
+
+@suite
+def bench_findBatch(benchmark, corpus):
+    """Searches every input in one batch"""
+    finder = corpus.loadApp().finder
+    scoresList = benchmark(finder.findBatch, corpus.inputStes)
+    benchmark.extra_info["inputs"] = len(scoresList)
+
+
+@suite
+def bench_findEach(benchmark, corpus):
+    """Searches every input one by one, baseline of bench_findBatch"""
+    finder = corpus.loadApp().finder
+    benchmark(lambda: [finder.find(inputSte) for inputSte in corpus.inputStes])
+
+
+@suite
+def bench_query(benchmark, corpus):
+    """Reverse lookup of test sessions by TCL predicates of an input"""
+    main = corpus.loadApp()
+    snapshot = main.searchIndex.getSnapshot()
+    testCase, tcData = next(iter(corpus.inputStes[0]["tclData"].items()))
+    predicates = list(tcData["boolean"].items())[:3]
+    predicates += list(tcData["string"].items())[:1]
+    testSessionIds = benchmark(snapshot.query, testCase, predicates)
+    benchmark.extra_info["testSessions"] = len(testSessionIds)
+
+
+@suite
+def bench_textSearch(benchmark, corpus):
+    """Full-text search of test sessions by name, description and keywords"""
+    main = corpus.loadApp()
+    text = " ".join([corpus.inputStes[0]["name"]] + corpus.inputStes[0]["keywords"])
+    results = benchmark(main.db.searchTestSessions, text)
+    benchmark.extra_info["testSessions"] = len(results)
+
+
+@suite
+def bench_findText(benchmark, corpus):
+    """Search with text relevance of input name, description and keywords"""
+    finder = corpus.loadApp().finder
+    scores = benchmark(finder.find, corpus.inputStes[0], textConfig={"weight": 1.0})
+    benchmark.extra_info["testSessions"] = len(scores)
+
+
+@suite
+def bench_similar(benchmark, corpus):
+    """Lookup of precomputed neighbours of a stored test session"""
+    graph = corpus.loadApp().similarityGraph
+    testSessionId = next(iter(graph.rows))
+    neighbors = benchmark(graph.getNeighbors, testSessionId)
+    benchmark.extra_info["neighbors"] = len(neighbors)
+
+
+@suite
+def bench_similarBuild(benchmark, corpus):
+    """Searches neighbours of every stored test session"""
+    graph = corpus.loadApp().similarityGraph
+    benchmark.pedantic(graph.build, rounds=1)
+    benchmark.extra_info["testSessions"] = len(graph.rows)
+
+
+@suite
+def bench_getTopk(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    scores = finder.find(corpus.inputStes[0])
+    benchmark(finder.getTopk, scores, 5)
+
+
+@suite
+def bench_analyzeTclDifference(benchmark, corpus):
+    main = corpus.loadApp()
+    scores = main.finder.find(corpus.inputStes[0])
+    topkItems, _ = main.finder.getTopk(scores, 1)
+    target = main.db.getTestSessionDetail(next(iter(topkItems)))
+    benchmark(
+        main.finder.analyzeTclDifference,
+        corpus.inputStes[0]["tclData"],
+        target["tclData"],
+    )
+
+
+@suite
+def bench_detailsAsync(benchmark, corpus):
+    """Reads detail of top K of every input on database thread, as /Batch
+    does. Test sessions in top K of many inputs are read once"""
+    main = corpus.loadApp()
+    testSessionIds = []
+    for inputSte in corpus.inputStes:
+        topkItems, _ = main.finder.getTopk(main.finder.find(inputSte), 5)
+        testSessionIds.extend(topkItems)
+    details = benchmark(
+        lambda: asyncio.run(main.adb.getTestSessionDetails(testSessionIds))
+    )
+    benchmark.extra_info["requested"] = len(testSessionIds)
+    benchmark.extra_info["read"] = len(details)
+
+
+@contextmanager
+def loggingTo(level: int, queued: bool = False):
+    """Temporarily sends every log record of level to os.devnull."""
+    root = logging.getLogger()
+    previousLevel, previousHandlers = root.level, root.handlers
+    stream = open(os.devnull, "w")
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s | %(message)s"))
+    listener = None
+    if queued:
+        logQueue = SimpleQueue()
+        listener = QueueListener(logQueue, handler)
+        listener.start()
+        handler = QueueHandler(logQueue)
+    root.handlers = [handler]
+    root.setLevel(level)
+    try:
+        yield
+    finally:
+        if listener is not None:
+            listener.stop()
+        root.handlers = previousHandlers
+        root.setLevel(previousLevel)
+        stream.close()
+
+
+@suite
+def bench_findLoggingOff(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    with loggingTo(logging.ERROR):
+        benchmark(finder.find, corpus.inputStes[0])
+
+
+@suite
+def bench_findLoggingDebug(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    with loggingTo(logging.DEBUG):
+        benchmark(finder.find, corpus.inputStes[0])
+
+
+@suite
+def bench_findLoggingDebugQueued(benchmark, corpus):
+    finder = corpus.loadApp().finder
+    with loggingTo(logging.DEBUG, queued=True):
+        benchmark(finder.find, corpus.inputStes[0])
+
+
+def makeResultRequest(main, inputSte):
+    item = main.Item(steData=inputSte)
+    item.uid = uuid4()
+    main.ParsedSteData[item.uid] = item
+    findConfig = main.findConfigItem(topk=5, testCaseBoolean=[], testCaseString=[])
+    return item.uid, findConfig
+
+
+@suite
+def bench_result(benchmark, corpus):
+    main = corpus.loadApp()
+    uid, findConfig = makeResultRequest(main, corpus.inputStes[0])
+    response = benchmark.pedantic(
+        main.createResult, args=(uid, findConfig), setup=main.resultCache.clear
+    )
+    benchmark.extra_info["bytes"] = len(response)
+
+
+@suite
+def bench_resultCached(benchmark, corpus):
+    main = corpus.loadApp()
+    uid, findConfig = makeResultRequest(main, corpus.inputStes[0])
+    benchmark(main.createResult, uid, findConfig)
+
+
+@suite
+def bench_resultOverload(benchmark, corpus):
+    """Sends twice as many /Result as search lane admits at once. Admitted
+    searches should keep latency, and the rest is rejected right away"""
+    main = corpus.loadApp()
+    lane = main.admission["search"]
+    requests = []
+    for idx in range(2 * (lane.limit + lane.queueSize)):
+        uid, findConfig = makeResultRequest(
+            main, corpus.inputStes[idx % len(corpus.inputStes)]
+        )
+        findConfig.topk = idx + 1
+        requests.append((uid, findConfig))
+
+    async def send(uid, findConfig):
+        start = time.perf_counter()
+        try:
+            await main.result(uid, findConfig)
+        except main.HTTPException as e:
+            return e.status_code, time.perf_counter() - start
+        return 200, time.perf_counter() - start
+
+    async def burst():
+        return await asyncio.gather(*[send(*request) for request in requests])
+
+    results = benchmark.pedantic(
+        lambda: asyncio.run(burst()), setup=main.resultCache.clear, rounds=3
+    )
+    admitted = sorted(elapsed for status, elapsed in results if status == 200)
+    rejected = [elapsed for status, elapsed in results if status != 200]
+    benchmark.extra_info["admitted"] = len(admitted)
+    benchmark.extra_info["rejected"] = len(rejected)
+    if admitted:
+        benchmark.extra_info["admittedP99"] = admitted[int(len(admitted) * 0.99)]
+    if rejected:
+        benchmark.extra_info["rejectedMax"] = max(rejected)
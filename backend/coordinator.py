@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+from uuid import UUID, uuid4
+
+from app import Coordinator, Parser
+from app.metrics import metrics
+from app.utils import Encoder, setLogger, writeFile
+from fastapi import FastAPI, File, UploadFile, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+# Setup
+setLogger(
+    os.environ.get("CIFINDER_LOG_LEVEL", "INFO"),
+    queued=os.environ.get("CIFINDER_LOG_QUEUED", "1") == "1",
+)
+basePath = os.getcwd()
+
+## Shards are backend servers(uvicorn main:app) each with own Finder.db slice
+## CIFINDER_SHARDS="http://127.0.0.1:8001,http://127.0.0.1:8002"
+coordinator = Coordinator(
+    shards=os.environ.get("CIFINDER_SHARDS", "").split(","),
+    timeout=float(os.environ.get("CIFINDER_SHARD_TIMEOUT", 60)),
+)
+
+## Create parsing module. STE is parsed once here and sent to shards
+parser = Parser(
+    basePath=basePath,
+    suiteReaderPath=os.path.join(basePath, "res", "SuiteReader.jar"),
+    reader=os.environ.get("CIFINDER_STE_READER", "suiteReader"),
+)
+if not (os.path.isdir(os.path.join(basePath, "tmp"))):
+    os.mkdir(os.path.join(basePath, "tmp"))
+
+## Parsed STE data waiting for /Result. Oldest items are dropped first
+MAX_PARSED_STE = 1024
+ParsedSteData = OrderedDict()
+
+app = FastAPI()
+
+
+@app.post("/Input")
+async def parseInput(file: UploadFile = File(...)):
+    """Reads *.ste file from client and parse file. Same as /Input of backend.
+
+    Args:
+        file (UploadFile, optional): Uploaded *.ste file from client. Defaults to File(...).
+
+    Returns:
+        json_string: returns json string that includes parsed item with UUID4
+    """
+    logging.info("Got client data. Processing...")
+    uid = uuid4()
+    filePath = os.path.join(
+        basePath, "tmp", f"{uid.hex}_{os.path.basename(file.filename)}"
+    )
+    if not await writeFile(file, filePath):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="There was an error uploading the file",
+        )
+    try:
+        steData = await parser.parseSte(filePath)
+    finally:
+        if os.path.exists(filePath):
+            os.remove(filePath)
+    if not steData:
+        logging.error("Failed to parse uploaded file")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to parse given input",
+        )
+
+    ParsedSteData[uid] = steData
+    while len(ParsedSteData) > MAX_PARSED_STE:
+        ParsedSteData.popitem(last=False)
+
+    itemToSend = {"key": uid}
+    itemToSend.update(steData)
+    with metrics.timer("route.encode"):
+        return json.dumps(itemToSend, indent=4, cls=Encoder)
+
+
+@app.post("/Result/{uid}")
+async def result(uid: UUID, findConfig: dict):
+    """Finds similar CI B2B test suites to given uid over every shard.
+    findConfig is same as /Result of backend, and validated by shards.
+
+    Args:
+        uid (UUID): UUID for parsed data
+        findConfig (dict): Configuration about topk and TCL constraints on search
+
+    Returns:
+        json_string: returns json string that includes name, top score, and
+        similarity analysis with shard of each test session
+    """
+    if uid not in ParsedSteData:
+        logging.error("No data found with UUID %s", uid)
+        raise HTTPException(
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"No data found with UUID {uid}",
+        )
+    if "topk" not in findConfig:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY, detail="topk should be specified"
+        )
+
+    with metrics.timer("coordinator.find"):
+        metadata = await coordinator.find(ParsedSteData[uid], findConfig)
+    if not metadata:
+        raise HTTPException(
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to find similar CI Tests to given input",
+        )
+    with metrics.timer("route.encode"):
+        return json.dumps(metadata, indent=4, cls=Encoder)
+
+
+@app.get("/ready")
+async def getReadiness():
+    """Readiness probe. Coordinator is ready when every shard is ready.
+
+    Returns:
+        JSONResponse: 200 if ready, 503 if not
+    """
+    shards = await coordinator.getReadiness()
+    isReady = bool(shards) and all(shards.values())
+    return JSONResponse(
+        {"ready": isReady, "shards": shards},
+        status_code=(
+            status.HTTP_200_OK if isReady else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
+
+
+@app.get("/metrics")
+def getMetrics():
+    """Exports metrics in Prometheus text format.
+
+    Returns:
+        PlainTextResponse: Metrics of coordinator
+    """
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
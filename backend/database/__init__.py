@@ -1 +1,4 @@
+from .dbAsync import AsyncDatabase
+from .dbBase import getTasUrl
 from .dbMain import Database
+from .dbShard import splitDatabase
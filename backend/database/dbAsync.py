@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .dbMain import Database
+
+
+class AsyncDatabase:
+    """
+    Async access to Database for handlers running on event loop. Every call
+    runs on one dedicated thread, so awaiting a query never blocks event loop.
+    Connection is same as threadpool routes and background tasks use, and
+    statements are serialized by lock of connection(see dbBase.Connection).
+    Concurrent reads with same arguments are coalesced into one query, and
+    every caller gets its result.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self.inflight = {}
+        self.queries = 0
+        self.coalesced = 0
+
+    async def run(self, func, *args):
+        """Runs func on database thread.
+
+        Args:
+            func (callable): Function to run, i.e. method of Database
+
+        Returns:
+            Any: Result of func
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def read(self, name: str, *args):
+        """Runs read method of Database on database thread. If same read is
+        already running, waits for its result instead of querying again.
+        Result is shared by callers, so it must not be modified.
+
+        Args:
+            name (str): Name of method of Database, i.e. "getTestSessionDetail"
+
+        Returns:
+            Any: Result of method
+        """
+        key = (name, args)
+        future = self.inflight.get(key)
+        if future is None:
+            self.queries += 1
+            future = asyncio.ensure_future(self.run(getattr(self.db, name), *args))
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            logging.debug("Coalesced %s%s", name, args)
+            self.coalesced += 1
+        # Caller leaving must not cancel query other callers wait for
+        return await asyncio.shield(future)
+
+    # READ
+    async def getTestSessionDetail(self, testSessionId: int) -> dict:
+        """Reads test session information with related test case data.
+
+        Args:
+            testSessionId (int): ID for test session
+
+        Returns:
+            dict: Same as Database.getTestSessionDetail
+        """
+        return await self.read("getTestSessionDetail", testSessionId)
+
+    async def getTestSessionDetails(self, testSessionIds: list) -> dict:
+        """Reads detail of many test sessions. Reads are queued to database
+        thread at once, and each is coalesced with same read of other callers.
+
+        Args:
+            testSessionIds (list): IDs of test sessions
+
+        Returns:
+            dict: {testSessionId : detail of test session}
+        """
+        testSessionIds = list(dict.fromkeys(testSessionIds))
+        details = await asyncio.gather(
+            *[
+                self.getTestSessionDetail(testSessionId)
+                for testSessionId in testSessionIds
+            ]
+        )
+        return dict(zip(testSessionIds, details))
+
+    async def searchTestSessions(
+        self, text: str, limit: int = 20, validOnly: bool = True
+    ) -> list:
+        """Searches test sessions by words in name, description and keywords.
+
+        Returns:
+            list: Same as Database.searchTestSessions
+        """
+        return await self.read("searchTestSessions", text, limit, validOnly)
+
+    async def getTestCaseData(
+        self, testCase: str, downloadAvailOnly: bool = True
+    ) -> list:
+        """Reads every item in TestCase table that has given testcase.
+
+        Returns:
+            list: Same as Database.getTestCaseData
+        """
+        return await self.read("getTestCaseData", testCase, downloadAvailOnly)
+
+    async def getChanges(self, since: int) -> list:
+        """Reads changes after given version.
+
+        Returns:
+            list: Same as Database.getChanges
+        """
+        return await self.read("getChanges", since)
+
+    # Utility
+    def collect(self) -> list:
+        """Collects counts of queries for /metrics.
+
+        Returns:
+            list: list of (name, help, value)
+        """
+        return [
+            (
+                "db_async_queries",
+                "Number of queries run on database thread",
+                self.queries,
+            ),
+            (
+                "db_async_coalesced",
+                "Number of reads answered by same read already running",
+                self.coalesced,
+            ),
+            (
+                "db_async_inflight",
+                "Number of reads running on database thread",
+                len(self.inflight),
+            ),
+        ]
+
+    def close(self) -> None:
+        """Stops database thread after queued queries."""
+        self.executor.shutdown(wait=True)
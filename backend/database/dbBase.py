@@ -1,8 +1,41 @@
 import logging
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 
 import aiohttp
 import requests
+from app.metrics import metrics
+
+REQUEST_TIMEOUT = 30
+# Port of TAS REST API. Load tests point it to local stub TAS
+TAS_PORT = int(os.environ.get("CIFINDER_TAS_PORT", 8080))
+
+
+def getTasUrl(address: str, path: str) -> str:
+    """Makes URL of TAS REST API.
+
+    Args:
+        address (str): Address of TAS
+        path (str): Path under /api, i.e. "/libraryIds"
+
+    Returns:
+        str: URL of TAS REST API
+    """
+    return f"http://{address}:{TAS_PORT}/api{path}"
+
+
+class Connection(sqlite3.Connection):
+    """
+    SQLite connection shared by threads(threadpool of routes, database thread
+    of AsyncDatabase, background tasks). Statements of a transaction run
+    while holding lock, so other threads don't run or commit in the middle.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
 
 
 class DbBase:
@@ -10,9 +43,48 @@ class DbBase:
     Base Class for Database
     """
 
-    def __init__(self, connection: sqlite3.Connection, userInfo: dict) -> None:
+    def __init__(
+        self, connection: sqlite3.Connection, userInfo: dict, changeLog=None
+    ) -> None:
         self.connection = connection
         self.userInfo = userInfo
+        self.changeLog = changeLog
+        # Connection of single thread(i.e. benchmark generator) has no lock
+        self.lock = getattr(connection, "lock", None) or threading.RLock()
+
+    @contextmanager
+    def transaction(self):
+        """Runs statements as one transaction while holding lock of connection.
+        Commits on success and rolls back on error.
+
+        Yields:
+            sqlite3.Connection: Connection to run statements
+        """
+        with self.lock, self.connection:
+            yield self.connection
+
+    def logChange(
+        self,
+        tableName: str,
+        testSessionId: int,
+        action: str,
+        value: int = None,
+        previous: dict = None,
+    ) -> None:
+        """logChange
+        Appends change to change log, if change log is given
+
+        Args:
+            tableName (str): Name of changed table
+            testSessionId (int): ID of changed test session
+            action (str): Type of change
+            value (int, optional): New value of change. Defaults to None.
+            previous (dict, optional): Data before change, given to listeners
+            only. Defaults to None.
+        """
+        if self.changeLog is None:
+            return
+        self.changeLog.append(tableName, testSessionId, action, value, previous)
 
     def select(self, query: str) -> list:
         """select
@@ -26,10 +98,10 @@ class DbBase:
         """
         logging.debug("Executing SELECT query : %s", query)
         try:
-            with self.connection:
+            with self.transaction(), metrics.timer("db.select"):
                 item = self.connection.execute(query).fetchall()
         except sqlite3.Error:
-            logging.error(f"Error while select query.\nQuery : {query}")
+            logging.error("Error while select query.\nQuery : %s", query)
             return []
         logging.debug("Success")
         return item
@@ -48,13 +120,13 @@ class DbBase:
         """
         logging.debug("Executing INSERT query : %s", query)
         try:
-            with self.connection:
+            with self.transaction():
                 if many:
                     count = self.connection.executemany(query, item).rowcount
                 else:
                     count = self.connection.execute(query, item).rowcount
         except sqlite3.Error:
-            logging.error(f"Error while insert query.\nQuery : {query}")
+            logging.error("Error while insert query.\nQuery : %s", query)
             return -1
         logging.debug("Success")
         return count
@@ -71,10 +143,10 @@ class DbBase:
         """
         logging.debug("Executing query")
         try:
-            with self.connection:
+            with self.transaction():
                 count = self.connection.execute(query).rowcount
         except sqlite3.Error:
-            logging.error(f"Error while execute query.\nQuery : {query}")
+            logging.error("Error while execute query.\nQuery : %s", query)
             return -1
         logging.debug("Success")
         return count
@@ -94,10 +166,10 @@ class DbBase:
             f"SELECT name FROM sqlite_master WHERE type='table' and name='{tableName}';"
         )
         try:
-            with self.connection:
+            with self.transaction():
                 item = self.connection.execute(query).fetchone()
         except sqlite3.Error:
-            logging.error(f"Error while checking table exist.\nQuery : {query}")
+            logging.error("Error while checking table exist.\nQuery : %s", query)
             return -1
         if not item:
             logging.debug("Table %s doens't exist", tableName)
@@ -115,15 +187,15 @@ class DbBase:
             int: number of items in table 'tableName'
         """
         logging.debug("Fetching item count from table %s", tableName)
-        query = f"SELECT id FROM {tableName}"
+        query = f"SELECT COUNT(*) FROM {tableName}"
         try:
-            with self.connection:
-                item = self.connection.execute(query).fetchall()
+            with self.transaction():
+                (count,) = self.connection.execute(query).fetchone()
         except sqlite3.Error:
-            logging.error(f"Error while fetching item count.\nQuery : {query}")
+            logging.error("Error while fetching item count.\nQuery : %s", query)
             return -1
-        logging.debug("Success : %d", len(item))
-        return len(item)
+        logging.debug("Success : %d", count)
+        return count
 
     def syncSendGetRequest(self, url: str) -> tuple:
         """sendGetRequest
@@ -138,13 +210,60 @@ class DbBase:
         logging.debug("Sending HTTP GET request")
         auth = (self.userInfo["id"], self.userInfo["pw"])
         try:
-            r = requests.get(url, auth=auth)
+            r = requests.get(url, auth=auth, timeout=REQUEST_TIMEOUT)
             r.raise_for_status()
         except requests.exceptions.HTTPError:
             logging.error("HTTP Error : %s [URL: %s]", r.status_code, url)
             return False, {}
+        except requests.exceptions.RequestException:
+            logging.error("Failed to connect [URL: %s]", url)
+            return False, {}
         return True, r.json()
 
+    def syncSendConditionalGetRequest(
+        self, url: str, etag: str = None, lastModified: str = None
+    ) -> tuple:
+        """syncSendConditionalGetRequest
+        Sends conditional GET request to given URL with error handling.
+        ETag and Last-Modified of previous response are sent as If-None-Match
+        and If-Modified-Since, so server answers 304 without body when item
+        hasn't changed.
+
+        Args:
+            url (str): URL to get request
+            etag (str, optional): ETag of previous response. Defaults to None.
+            lastModified (str, optional): Last-Modified of previous response.
+            Defaults to None.
+
+        Returns:
+            tuple: Status, JSON item and validators(dict of etag, lastModified).
+            JSON item is None if item is not modified.
+        """
+        logging.debug("Sending conditional HTTP GET request")
+        auth = (self.userInfo["id"], self.userInfo["pw"])
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if lastModified:
+            headers["If-Modified-Since"] = lastModified
+        try:
+            r = requests.get(url, auth=auth, headers=headers, timeout=REQUEST_TIMEOUT)
+            if r.status_code == 304:
+                logging.debug("Not modified [URL: %s]", url)
+                return True, None, {"etag": etag, "lastModified": lastModified}
+            r.raise_for_status()
+        except requests.exceptions.HTTPError:
+            logging.error("HTTP Error : %s [URL: %s]", r.status_code, url)
+            return False, {}, {}
+        except requests.exceptions.RequestException:
+            logging.error("Failed to connect [URL: %s]", url)
+            return False, {}, {}
+        validators = {
+            "etag": r.headers.get("ETag", None),
+            "lastModified": r.headers.get("Last-Modified", None),
+        }
+        return True, r.json(), validators
+
     async def asyncSendGetRequest(self, url: str) -> tuple:
         """asyncSendGetRequest
         Send asynchronous GET request to given URL with error handling
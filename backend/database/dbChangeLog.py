@@ -0,0 +1,160 @@
+import datetime
+import logging
+import sqlite3
+import sys
+
+from .dbBase import DbBase
+
+
+class DbChangeLog(DbBase):
+    """
+    Append-only log of changes to TestSession and TestCase tables.
+    ID of the latest change is used as version of database, so search
+    indexes and caches can apply changes incrementally.
+    """
+
+    def __init__(self, connection, userInfo):
+        super().__init__(connection, userInfo)
+        self.version = -1
+        self.listeners = []
+        self.setup()
+
+    def setup(self) -> None:
+        """Initial setup for ChangeLog table. If table doesn't
+        exist, it will create a new table.
+        """
+        logging.info("Setting up ChangeLog table")
+        if not super().isTableExist("ChangeLog"):
+            if not self.create():
+                logging.error("Failed to create ChangeLog table. Aborting...")
+                sys.exit()
+        self.version = self.getVersion()
+        logging.info("Setup Finished | ChangeLog at version %d", self.version)
+
+    # CREATE
+    def create(self) -> bool:
+        """Creates ChangeLog table.
+
+        Returns:
+            bool: Result of create query
+        """
+        logging.debug("Creating ChangeLog table")
+        query = """CREATE TABLE ChangeLog (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tableName TEXT NOT NULL,
+                testSessionId INT NOT NULL,
+                action TEXT NOT NULL,
+                value INTEGER,
+                created TIMESTAMP NOT NULL
+            );"""
+        super().execute(query)
+        if not super().isTableExist("ChangeLog"):
+            logging.error("Failed to create ChangeLog table")
+            return False
+        logging.debug("Success")
+        return True
+
+    # READ
+    def getVersion(self) -> int:
+        """Fetches ID of the latest change.
+
+        Returns:
+            int: Version of database. 0 if there are no changes.
+        """
+        item = super().select("SELECT MAX(id) FROM ChangeLog;")
+        if not item:
+            logging.error("Failed to fetch version")
+            return -1
+        return item[0][0] or 0
+
+    def getChanges(self, since: int) -> list:
+        """Fetches changes after given version.
+
+        Args:
+            since (int): Version to start from (exclusive)
+
+        Returns:
+            list: list of changes in ascending order
+        """
+        logging.debug("Fetching changes since version %d", since)
+        query = f"SELECT id, tableName, testSessionId, action, value FROM ChangeLog WHERE id>{since} ORDER BY id;"
+        items = super().select(query)
+        changes = [
+            {
+                "version": version,
+                "table": tableName,
+                "testSessionId": testSessionId,
+                "action": action,
+                "value": value,
+            }
+            for version, tableName, testSessionId, action, value in items
+        ]
+        logging.debug("Fetched %d changes", len(changes))
+        return changes
+
+    # UPDATE (INSERT)
+    def append(
+        self,
+        tableName: str,
+        testSessionId: int,
+        action: str,
+        value: int = None,
+        previous: dict = None,
+    ) -> int:
+        """Appends change to ChangeLog table and notifies listeners.
+
+        Args:
+            tableName (str): Name of changed table
+            testSessionId (int): ID of changed test session
+            action (str): Type of change. {'insert', 'replace', 'status'}
+            value (int, optional): New value of change, i.e. status. Defaults to None.
+            previous (dict, optional): Test case data before replace, which is
+            given to listeners only and not logged. Defaults to None.
+
+        Returns:
+            int: Version of change. -1 if failed.
+        """
+        logging.debug("Logging %s on %s %d", action, tableName, testSessionId)
+        query = "INSERT INTO ChangeLog ('tableName', 'testSessionId', 'action', 'value', 'created') VALUES (?, ?, ?, ?, ?);"
+        item = (tableName, testSessionId, action, value, datetime.datetime.now())
+        try:
+            with self.transaction():
+                version = self.connection.execute(query, item).lastrowid
+        except sqlite3.Error:
+            logging.error("Failed to log change")
+            return -1
+        self.version = version
+
+        change = {
+            "version": version,
+            "table": tableName,
+            "testSessionId": testSessionId,
+            "action": action,
+            "value": value,
+        }
+        if previous is not None:
+            change["previous"] = previous
+        for listener in self.listeners:
+            try:
+                listener(change)
+            except Exception:
+                logging.exception("Listener failed to apply change %d", version)
+        return version
+
+    # Utility
+    def addListener(self, listener) -> None:
+        """Registers listener which is called with every new change.
+
+        Args:
+            listener (callable): Function that gets change(dict) as argument
+        """
+        self.listeners.append(listener)
+
+    def removeListener(self, listener) -> None:
+        """Unregisters listener.
+
+        Args:
+            listener (callable): Registered function
+        """
+        if listener in self.listeners:
+            self.listeners.remove(listener)
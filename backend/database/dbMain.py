@@ -4,51 +4,76 @@ import os
 import sqlite3
 import sys
 
+from .dbBase import Connection
+from .dbChangeLog import DbChangeLog
+from .dbShard import getShardOfSession, readShardInfo
 from .dbTas import DbTAS
 from .dbTestCase import DbTestCase
 from .dbTestSession import DbTestSession
 
+# TAS crawled when database is empty
+DEFAULT_TAS = {
+    "address": os.environ.get("CIFINDER_TAS_ADDRESS", "10.71.13.50"),
+    "library": os.environ.get("CIFINDER_TAS_LIBRARY", "CIPhase2Assemble"),
+}
+
 
 class Database:
-    def __init__(self, dbPath):
+    def __init__(self, dbPath, lazy: bool = False):
         userInfo = {"id": "sms", "pw": "a1b2c3d4"}
         dbPath = os.path.join(dbPath, "Finder.db")
-        self.connection = sqlite3.connect(dbPath, check_same_thread=False)
+        self.connection = sqlite3.connect(
+            dbPath, check_same_thread=False, factory=Connection
+        )
+        self.CHANGELOG = DbChangeLog(self.connection, userInfo)
         self.TAS = DbTAS(self.connection, userInfo)
-        self.TESTCASE = DbTestCase(self.connection, userInfo)
-        self.TESTSESSION = DbTestSession(self.connection, userInfo)
-        self.setup()
+        self.TESTCASE = DbTestCase(self.connection, userInfo, self.CHANGELOG)
+        self.TESTSESSION = DbTestSession(self.connection, userInfo, self.CHANGELOG)
+        self.shardInfo = readShardInfo(self.connection)
+        if not lazy:
+            self.setup()
         self.last_update = datetime.date.today()
         self.last_validated = datetime.date.today()
 
     def __del__(self):
         self.connection.close()
 
-    def setup(self) -> None:
-        """Initial setup of database. If there is no item at database, it will
-        fetch test session list from default TAS(CIPhase2Assemble) and add
-        every test session to database.
+    def isEmpty(self) -> bool:
+        """Checks if database needs initial crawl of default TAS.
+
+        Returns:
+            bool: True if any of TAS, TestSession, TestCase table is empty.
         """
-        logging.info("Setting up database module")
-        if (
+        return not (
             self.TAS.itemCount > 0
             and self.TESTCASE.itemCount > 0
             and self.TESTSESSION.itemCount > 0
-        ):
+        )
+
+    def setup(self) -> bool:
+        """Initial setup of database. If there is no item at database, it will
+        fetch test session list from default TAS(CIPhase2Assemble, or
+        CIFINDER_TAS_ADDRESS and CIFINDER_TAS_LIBRARY) and add
+        every test session to database.
+        Crawl takes long, so Database created with lazy=True leaves it to caller,
+        i.e. to background thread of server.
+
+        Returns:
+            bool: True if database has items. False if TAS is unreachable.
+        """
+        logging.info("Setting up database module")
+        if not self.isEmpty():
             logging.info("Set up finished")
-            return None
+            return True
 
         logging.info("Adding default TAS")
-        defaultTAS = {
-            "address": "10.71.13.50",
-            "library": "CIPhase2Assemble",
-        }
+        defaultTAS = dict(DEFAULT_TAS)
         testSessions = self.TAS.getTestSessionList(
             defaultTAS["address"], defaultTAS["library"]
         )
         if not testSessions:
-            logging.error("Failed to get test sessions in TAS. Aborting...")
-            sys.exit()
+            logging.error("Failed to get test sessions in TAS")
+            return False
 
         addedTestSession = 0
         for testSession in testSessions:
@@ -67,6 +92,40 @@ class Database:
             self.TESTSESSION.itemCount,
             self.TESTCASE.itemCount,
         )
+        return True
+
+    @property
+    def version(self) -> int:
+        """Version of database. Increases on every change of TestSession
+        and TestCase table.
+
+        Returns:
+            int: ID of the latest change in ChangeLog table
+        """
+        return self.CHANGELOG.version
+
+    def addListener(self, listener) -> None:
+        """Registers listener which is called with every change of TestSession
+        and TestCase table. Used by search indexes and caches to apply changes
+        incrementally.
+
+        Args:
+            listener (callable): Function that gets change(dict) as argument.
+            Change includes version, table, testSessionId, action, value.
+        """
+        self.CHANGELOG.addListener(listener)
+
+    def getChanges(self, since: int) -> list:
+        """Reads changes after given version. Used to catch up with changes
+        made while a search index was saved on disk.
+
+        Args:
+            since (int): Version to start from (exclusive)
+
+        Returns:
+            list: list of changes in ascending order
+        """
+        return self.CHANGELOG.getChanges(since)
 
     # CREATE
 
@@ -81,8 +140,7 @@ class Database:
             is able to download. Defaults to True.
 
         Returns:
-            list: list of dictionary(testSessionId[int], boolean[dict],
-            numeric[dict], string[dict])
+            list: list of tuple(testSessionId[int], TclData)
         """
         logging.info("Reading every test session with test case %s", testCase)
         logging.debug("Fetching test case data")
@@ -101,6 +159,33 @@ class Database:
         logging.info("Read %d items", len(testCaseData))
         return testCaseData
 
+    def getEveryTestCaseData(self, downloadAvailOnly: bool = True) -> list:
+        """Reads every item in TestCase table. Used for building search models
+        (i.e. clustering) over every test session.
+
+        Args:
+            downloadAvailOnly(bool): Choose only test cases where test session
+            is able to download. Defaults to True.
+
+        Returns:
+            list: list of tuple(testSessionId[int], testCase[str], TclData)
+        """
+        logging.info("Reading every test case data")
+        testCaseData = self.TESTCASE.getEveryItem()
+        if not testCaseData:
+            logging.error("Failed to read test case data")
+            return []
+
+        if downloadAvailOnly:
+            logging.debug("Filtering test sessions that are valid")
+            validTestSessions = set(self.TESTSESSION.getValidTestSessionIds())
+            testCaseData = [
+                data for data in testCaseData if data[0] in validTestSessions
+            ]
+
+        logging.info("Read %d items", len(testCaseData))
+        return testCaseData
+
     def getTestSessionDetail(self, testSessionId: int) -> dict:
         """Reads test session information with related test case data.
 
@@ -126,6 +211,25 @@ class Database:
         logging.info("Reading success")
         return testSessionData
 
+    def searchTestSessions(
+        self, text: str, limit: int = 20, validOnly: bool = True
+    ) -> list:
+        """Searches test sessions by words in name, description and keywords.
+
+        Args:
+            text (str): Free text to search
+            limit (int, optional): Maximum number of results. Defaults to 20.
+            validOnly (bool, optional): Only test sessions available on TAS. Defaults to True.
+
+        Returns:
+            list: Information about test sessions with relevance score, in
+            descending relevance. Empty list if nothing matches.
+        """
+        logging.info("Searching test sessions with %s", text)
+        results = self.TESTSESSION.searchInfo(text, limit, validOnly)
+        logging.info("Found %d test sessions", len(results))
+        return results
+
     # UPDATE
     def insertTestSession(self, tasInfo: dict, testSessionInfo: dict) -> bool:
         """Adds new test session data to database.
@@ -163,22 +267,25 @@ class Database:
             logging.error("Failed to add new test session data. Aborting...")
             return False
 
-        testCaseIds = self.TESTCASE.insert(testSessionId, testSessionInfo["url"])
-        if not testCaseIds:
+        result = self.syncTestCase(testSessionId, testSessionInfo["url"])
+        if result == "failed":
             logging.error("Failed to add new test case data. Aborting...")
             return False
 
         logging.info("Success")
         logging.info("TAS : %d", tasId)
         logging.info("Test Session : %d", testSessionId)
-        logging.info("Test Case : %s", str(testCaseIds))
+        logging.info("Test Case : %s", result)
         return True
 
     def updateTestSession(self) -> int:
-        """Updates new test sessions from TAS
+        """Synchronizes test sessions with TAS. New test sessions are added
+        with their test cases, and test cases of test sessions modified in TAS
+        are replaced. Unchanged test sessions are skipped, so daily update only
+        moves test sessions that changed.
 
         Returns:
-            int: Number of added items
+            int: Number of added or updated test sessions. -1 if failed.
         """
         logging.info("Updating test sessions")
         self.TAS.validate()
@@ -186,6 +293,9 @@ class Database:
         if not tasInfos:
             logging.error("Failed to get TAS items. Aborting update")
             return -1
+        counts = dict.fromkeys(
+            ("added", "updated", "unchanged", "skipped", "failed"), 0
+        )
         for tasId, tasInfo in tasInfos.items():
             testSessions = self.TAS.getTestSessionList(
                 tasInfo["address"], libraryId=tasInfo["libraryId"]
@@ -196,14 +306,107 @@ class Database:
                 continue
 
             tasInfo.update({"id": tasId})
-            addedTestSession = 0
             for testSession in testSessions:
-                testSessionId = self.TESTSESSION.insert(tasInfo, testSession)
-                if testSessionId != -1:
-                    addedTestSession += 1
-        logging.info("Updated %d items", addedTestSession)
+                counts[self.syncTestSession(tasInfo, testSession)] += 1
+        logging.info(
+            "Updated test sessions | added %d, updated %d, unchanged %d, skipped %d, failed %d",
+            counts["added"],
+            counts["updated"],
+            counts["unchanged"],
+            counts["skipped"],
+            counts["failed"],
+        )
         self.last_update = datetime.date.today()
-        return addedTestSession
+        return counts["added"] + counts["updated"]
+
+    def syncTestSession(self, tasInfo: dict, testSessionInfo: dict) -> str:
+        """Adds test session if it is new, and synchronizes its test cases
+        with TAS.
+
+        Args:
+            tasInfo (dict): Information about TAS. Should include
+            id, address, libraryId.
+            testSessionInfo (dict): Information about test session from
+            test session list of TAS. Should include name.
+
+        Returns:
+            str: Result of sync. One of added, updated, unchanged, skipped, failed.
+        """
+        name = testSessionInfo.get("name", None)
+        testSessionId = self.TESTSESSION.isExist(tasInfo["id"], name)
+        if testSessionId == -1:
+            if not self.isOwned(name):
+                logging.debug("Test session %s belongs to other shard", name)
+                return "skipped"
+            testSessionId = self.TESTSESSION.insert(tasInfo, testSessionInfo)
+            if testSessionId == -1:
+                logging.error("Failed to add test session %s", name)
+                return "failed"
+        url = testSessionInfo.get("url", None) or self.TESTSESSION.getUrl(tasInfo, name)
+        if url is None:
+            return "failed"
+        return self.syncTestCase(testSessionId, url)
+
+    def isOwned(self, name: str) -> bool:
+        """Checks if test session belongs to this database. Shards split one
+        test session by one own only test sessions whose name hashes to them.
+
+        Args:
+            name (str): Name of test session
+
+        Returns:
+            bool: True if database is not a shard split by test session, or
+            test session belongs to this shard.
+        """
+        if self.shardInfo.get("by", None) != "session":
+            return True
+        return (
+            getShardOfSession(name, self.shardInfo["shards"]) == self.shardInfo["shard"]
+        )
+
+    def syncTestCase(self, testSessionId: int, testSessionUrl: str) -> str:
+        """Fetches test session from TAS with conditional GET, using ETag and
+        Last-Modified of previous fetch. Test case data is ingested only when
+        TAS returns modified content whose hash differs from stored one, and
+        replaced atomically if test session already has test cases. Test
+        sessions without stored hash are compared with stored test cases.
+
+        Args:
+            testSessionId (int): ID of test session
+            testSessionUrl (str): URL of test session in TAS
+
+        Returns:
+            str: Result of sync. One of added, updated, unchanged, failed.
+        """
+        hasTestCase = bool(self.TESTCASE.isExist(testSessionId))
+        syncInfo = self.TESTSESSION.getSyncInfo(testSessionId) if hasTestCase else {}
+        status, data, validators = self.TESTCASE.fetch(testSessionUrl, syncInfo)
+        if not status:
+            logging.error("Unable to fetch test session %d from TAS", testSessionId)
+            return "failed"
+        if data is None:
+            logging.debug("Test session %d is not modified", testSessionId)
+            return "unchanged"
+
+        contentHash = self.TESTCASE.getContentHash(data)
+        storedHash = syncInfo.get("contentHash", None)
+        if hasTestCase and (
+            contentHash == storedHash
+            # Test sessions ingested before content hash was stored
+            or (storedHash is None and self.TESTCASE.isSame(testSessionId, data))
+        ):
+            logging.debug("Content of test session %d is same", testSessionId)
+            self.TESTSESSION.updateSyncInfo(testSessionId, validators, contentHash)
+            return "unchanged"
+
+        if hasTestCase:
+            testCaseIds = self.TESTCASE.replace(testSessionId, data)
+        else:
+            testCaseIds = self.TESTCASE.insert(testSessionId, testSessionUrl, data)
+        if not testCaseIds:
+            return "failed"
+        self.TESTSESSION.updateSyncInfo(testSessionId, validators, contentHash)
+        return "updated" if hasTestCase else "added"
 
     def updateDatabaseStatus(self) -> None:
         """Iterate through every items in TAS table and TestSession table.
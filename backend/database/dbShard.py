@@ -0,0 +1,193 @@
+import logging
+import os
+import sqlite3
+import zlib
+
+from .dbChangeLog import DbChangeLog
+from .dbTas import DbTAS
+from .dbTestCase import DbTestCase
+from .dbTestSession import DbTestSession
+
+SPLIT_KEYS = ("library", "session")
+
+
+def getShardOfSession(name: str, numShards: int) -> int:
+    """Gets shard that owns test session when test sessions are split one by
+    one. Shard depends only on name, so shards agree on owner of test
+    sessions added to TAS after split.
+
+    Args:
+        name (str): Name of test session
+        numShards (int): Number of shards
+
+    Returns:
+        int: Index of shard
+    """
+    return zlib.crc32(name.encode()) % numShards
+
+
+def assignShards(testSessions: list, numShards: int, by: str = "library") -> dict:
+    """Assigns test sessions to shards. With "library", every test session of a
+    TAS library goes to same shard and libraries are spread so shards get
+    similar number of test sessions. With "session", test sessions are spread
+    one by one by hash of name, which is useful when database has a single
+    library.
+
+    Args:
+        testSessions (list): list of tuple(testSessionId, tasId, name)
+        numShards (int): Number of shards
+        by (str, optional): "library" or "session". Defaults to "library".
+
+    Returns:
+        dict: {testSessionId : index of shard}
+    """
+    if by == "session":
+        return {
+            testSessionId: getShardOfSession(name, numShards)
+            for testSessionId, _, name in testSessions
+        }
+
+    libraries = {}
+    for testSessionId, tasId, _ in testSessions:
+        libraries.setdefault(tasId, []).append(testSessionId)
+    loads = [0] * numShards
+    assignment = {}
+    for tasId in sorted(libraries, key=lambda tasId: -len(libraries[tasId])):
+        shard = loads.index(min(loads))
+        loads[shard] += len(libraries[tasId])
+        assignment.update(dict.fromkeys(libraries[tasId], shard))
+    return assignment
+
+
+def splitDatabase(dbFile: str, shardPaths: list, by: str = "library") -> list:
+    """Splits Finder.db into a Finder.db of each shard. Test sessions keep
+    their IDs, so they stay unique over shards, and each shard gets TAS items
+    of its test sessions only. Each shard records which shard it is, so
+    update of database adds only test sessions it owns.
+
+    Args:
+        dbFile (str): Path to Finder.db to split
+        shardPaths (list): Paths to database directory of each shard
+        by (str, optional): "library" or "session". Defaults to "library".
+
+    Returns:
+        list: Number of test sessions in each shard. Empty list if failed.
+    """
+    if by not in SPLIT_KEYS or not shardPaths:
+        logging.error("Invalid split by %s into %d shards", by, len(shardPaths))
+        return []
+    source = sqlite3.connect(dbFile)
+    try:
+        testSessions = source.execute(
+            "SELECT id, tasId, name FROM TestSession;"
+        ).fetchall()
+    except sqlite3.Error:
+        logging.error("Failed to read test sessions from %s", dbFile)
+        return []
+    finally:
+        source.close()
+    assignment = assignShards(testSessions, len(shardPaths), by)
+
+    counts = []
+    for shard, shardPath in enumerate(shardPaths):
+        testSessionIds = [
+            testSessionId for testSessionId, idx in assignment.items() if idx == shard
+        ]
+        os.makedirs(shardPath, exist_ok=True)
+        shardFile = os.path.join(shardPath, "Finder.db")
+        if os.path.exists(shardFile):
+            os.remove(shardFile)
+        connection = sqlite3.connect(shardFile)
+        changeLog = DbChangeLog(connection, {})
+        DbTAS(connection, {})
+        DbTestSession(connection, {}, changeLog)
+        DbTestCase(connection, {}, changeLog)
+        try:
+            copyTestSessions(connection, dbFile, testSessionIds)
+            writeShardInfo(connection, shard, len(shardPaths), by)
+        except sqlite3.Error:
+            logging.error("Failed to write shard %d at %s", shard, shardFile)
+            return []
+        finally:
+            connection.close()
+        logging.info(
+            "Shard %d has %d test sessions at %s", shard, len(testSessionIds), shardFile
+        )
+        counts.append(len(testSessionIds))
+    return counts
+
+
+def copyTestSessions(connection: sqlite3.Connection, dbFile: str, ids: list) -> None:
+    """Copies test sessions with their test cases and TAS items from dbFile.
+    Columns that exist in both databases are copied.
+
+    Args:
+        connection (sqlite3.Connection): Connection to database of shard
+        dbFile (str): Path to Finder.db to copy from
+        ids (list): IDs of test sessions to copy
+    """
+    connection.execute("ATTACH DATABASE ? AS source;", (dbFile,))
+    connection.execute("CREATE TEMP TABLE ShardTestSession (id INTEGER PRIMARY KEY);")
+    connection.executemany(
+        "INSERT INTO ShardTestSession (id) VALUES (?);", [(_id,) for _id in ids]
+    )
+    conditions = {
+        "TestSession": "id IN (SELECT id FROM ShardTestSession)",
+        "TestCase": "testSessionId IN (SELECT id FROM ShardTestSession)",
+        "TAS": "id IN (SELECT tasId FROM main.TestSession)",
+    }
+    with connection:
+        for table, condition in conditions.items():
+            columns = [
+                item[1]
+                for item in connection.execute(f"PRAGMA main.table_info({table});")
+            ]
+            sourceColumns = {
+                item[1]
+                for item in connection.execute(f"PRAGMA source.table_info({table});")
+            }
+            columns = ", ".join(
+                f'"{column}"' for column in columns if column in sourceColumns
+            )
+            connection.execute(
+                f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM source.{table} WHERE {condition};"
+            )
+    connection.execute("DETACH DATABASE source;")
+
+
+def writeShardInfo(connection: sqlite3.Connection, shard: int, numShards: int, by: str):
+    """Records index of shard, number of shards and split key in Shard table.
+
+    Args:
+        connection (sqlite3.Connection): Connection to database of shard
+        shard (int): Index of shard
+        numShards (int): Number of shards
+        by (str): "library" or "session"
+    """
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS Shard (shard INTEGER, shards INTEGER, by TEXT);"
+        )
+        connection.execute("DELETE FROM Shard;")
+        connection.execute(
+            "INSERT INTO Shard (shard, shards, by) VALUES (?, ?, ?);",
+            (shard, numShards, by),
+        )
+
+
+def readShardInfo(connection: sqlite3.Connection) -> dict:
+    """Reads which shard database is.
+
+    Args:
+        connection (sqlite3.Connection): Connection to database
+
+    Returns:
+        dict: shard, shards, by. Empty if database is not a shard.
+    """
+    try:
+        item = connection.execute("SELECT shard, shards, by FROM Shard;").fetchone()
+    except sqlite3.Error:
+        return {}
+    if item is None:
+        return {}
+    return {"shard": item[0], "shards": item[1], "by": item[2]}
@@ -2,7 +2,7 @@ import datetime
 import logging
 import sys
 
-from .dbBase import DbBase
+from .dbBase import DbBase, getTasUrl
 
 
 class DbTAS(DbBase):
@@ -238,7 +238,7 @@ class DbTAS(DbBase):
             bool: True if alive, else False.
         """
         logging.debug("Checking if TAS %s is alive", address)
-        url = f"http://{address}:8080/api"
+        url = getTasUrl(address, "")
         status, _ = super().syncSendGetRequest(url)
         if not status:
             logging.error("Failed to access TAS %s", address)
@@ -257,7 +257,7 @@ class DbTAS(DbBase):
             int: Library ID of given data. -1 if library doens't exist.
         """
         logging.debug("Fetching TAS library id of %s at %s", library, address)
-        url = f"http://{address}:8080/api/libraryIds"
+        url = getTasUrl(address, "/libraryIds")
         status, libraries = super().syncSendGetRequest(url)
         if not status:
             logging.error("Failed to fetch library id")
@@ -286,7 +286,7 @@ class DbTAS(DbBase):
             libraryId = self.getTASLibraryId(address, library)
             if libraryId == -1:
                 return []
-        url = f"http://{address}:8080/api/libraries/{libraryId}/testSessions"
+        url = getTasUrl(address, f"/libraries/{libraryId}/testSessions")
         logging.debug("URL : %s", url)
         status, item = super().syncSendGetRequest(url)
         if not status:
@@ -1,12 +1,19 @@
+import hashlib
+import json
 import logging
+import sqlite3
 import sys
 
+from app.metrics import metrics
+from app.task.tcl import flattenParameters, mergeTestCase, splitTcls
+from app.task.vocab import TclData
+
 from .dbBase import DbBase
 
 
 class DbTestCase(DbBase):
-    def __init__(self, connection, userInfo):
-        super().__init__(connection, userInfo)
+    def __init__(self, connection, userInfo, changeLog=None):
+        super().__init__(connection, userInfo, changeLog)
         self.itemCount = -1
         self.setup()
 
@@ -49,6 +56,14 @@ class DbTestCase(DbBase):
 
     # READ
     def getTestCase(self, testCase: str) -> list:
+        """Fetch every item of test case as compact TCL data.
+
+        Args:
+            testCase (str): Name of test case
+
+        Returns:
+            list: list of tuple(testSessionId[int], TclData)
+        """
         logging.debug("Fetching test case %s", testCase)
         query = f"SELECT * FROM TestCase WHERE testcase='{testCase}';"
         items = super().select(query)
@@ -56,38 +71,95 @@ class DbTestCase(DbBase):
             logging.error("No items found with test case %s", testCase)
             return {}
 
-        testCaseData = []
-        for _, testSessionId, _, boolean, numeric, string in items:
-            testCaseData.append(
-                (testSessionId, eval(boolean), eval(numeric), eval(string))
-            )
+        with metrics.timer("db.decode"):
+            testCaseData = [
+                (testSessionId, TclData(eval(boolean), eval(numeric), eval(string)))
+                for _, testSessionId, _, boolean, numeric, string in items
+            ]
+        logging.debug("Fetched %d items", len(testCaseData))
+        return testCaseData
+
+    def getEveryItem(self) -> list:
+        """Fetch every item in TestCase table. Used for building search models
+        over whole database.
+
+        Returns:
+            list: list of tuple(testSessionId[int], testcase[str], TclData)
+        """
+        logging.debug("Fetching every test case item")
+        query = (
+            "SELECT testSessionId, testcase, boolean, numeric, string FROM TestCase;"
+        )
+        items = super().select(query)
+        if not items:
+            logging.error("Failed to fetch items in TestCase table")
+            return []
+
+        with metrics.timer("db.decode"):
+            testCaseData = [
+                (
+                    testSessionId,
+                    testcase,
+                    TclData(eval(boolean), eval(numeric), eval(string)),
+                )
+                for testSessionId, testcase, boolean, numeric, string in items
+            ]
         logging.debug("Fetched %d items", len(testCaseData))
         return testCaseData
 
     def getTestCaseByTestSessionId(self, testSessionId: int) -> dict:
+        """Fetch test cases of test session as compact TCL data.
+
+        Args:
+            testSessionId (int): ID of test session
+
+        Returns:
+            dict: {testcase : TclData}
+        """
         logging.debug("Fetching test case data with test session id %d", testSessionId)
         query = f"SELECT testcase, boolean, numeric, string FROM TestCase WHERE testSessionId={testSessionId};"
         items = super().select(query)
         if not items:
             logging.debug("Failed to fetch test case data from database")
             return {}
-        testCaseData = {}
-        for testcase, boolean, numeric, string in items:
-            testCaseData[testcase] = {
-                "boolean": eval(boolean),
-                "numeric": eval(numeric),
-                "string": eval(string),
+        with metrics.timer("db.decode"):
+            testCaseData = {
+                testcase: TclData(eval(boolean), eval(numeric), eval(string))
+                for testcase, boolean, numeric, string in items
             }
         logging.debug("Fetched %d test cases", len(testCaseData))
         return testCaseData
 
+    def fetch(self, testSessionUrl: str, syncInfo: dict = None) -> tuple:
+        """Fetch test session data from TAS. When validators of previous fetch
+        are given, request is conditional and unchanged test session is not
+        downloaded again.
+
+        Args:
+            testSessionUrl (str): URL of test session in TAS
+            syncInfo (dict, optional): etag and lastModified of previous fetch.
+            Defaults to None.
+
+        Returns:
+            tuple: Status, test session data(None if not modified) and validators
+        """
+        syncInfo = syncInfo or {}
+        return super().syncSendConditionalGetRequest(
+            testSessionUrl,
+            etag=syncInfo.get("etag", None),
+            lastModified=syncInfo.get("lastModified", None),
+        )
+
     # UPDATE (INSERT)
-    def insert(self, testSessionId: int, testSessionUrl: str) -> list:
+    def insert(
+        self, testSessionId: int, testSessionUrl: str, data: dict = None
+    ) -> list:
         logging.debug("Adding new test case data")
-        status, data = super().syncSendGetRequest(testSessionUrl)
-        if not status:
-            logging.error("Unable to fetch data from TAS")
-            return []
+        if data is None:
+            status, data = super().syncSendGetRequest(testSessionUrl)
+            if not status:
+                logging.error("Unable to fetch data from TAS")
+                return []
 
         testCaseIds = self.isExist(testSessionId)
         if testCaseIds:
@@ -103,8 +175,46 @@ class DbTestCase(DbBase):
             logging.error("Failed to insert new data")
             return []
 
-        logging.debug("Success | IDs : %s", str(testCaseIds))
+        logging.debug("Success | IDs : %s", testCaseIds)
         self.itemCount = super().getItemCount("TestCase")
+        super().logChange("TestCase", testSessionId, "insert")
+        return testCaseIds
+
+    def replace(self, testSessionId: int, data: dict) -> list:
+        """Replaces test case data of test session with data fetched from TAS.
+        Old rows are deleted and new rows are inserted in a single transaction,
+        so readers never see test session without test cases. Old test case
+        data is given to change listeners, so they can take it back without
+        reading whole test case again.
+
+        Args:
+            testSessionId (int): ID of test session
+            data (dict): Test session data from TAS including tsGroups
+
+        Returns:
+            list: IDs of new test case items. Empty list if failed.
+        """
+        logging.debug("Replacing test case data of test session %d", testSessionId)
+        testSuiteData = self.parseTestSuiteData(testSessionId, data["tsGroups"])
+        previous = self.getTestCaseByTestSessionId(testSessionId)
+        query = "INSERT INTO TestCase ('testSessionId', 'testcase', 'boolean', 'numeric', 'string') VALUES (?, ?, ?, ?, ?);"
+        try:
+            with self.transaction():
+                self.connection.execute(
+                    "DELETE FROM TestCase WHERE testSessionId=?;", (testSessionId,)
+                )
+                self.connection.executemany(query, testSuiteData)
+        except sqlite3.Error:
+            logging.error("Error while replacing test case data. Rolled back")
+            return []
+        testCaseIds = self.isExist(testSessionId)
+        if not testCaseIds:
+            logging.error("Failed to replace test case data")
+            return []
+
+        logging.debug("Success | IDs : %s", testCaseIds)
+        self.itemCount = super().getItemCount("TestCase")
+        super().logChange("TestCase", testSessionId, "replace", previous=previous)
         return testCaseIds
 
     def update(self):
@@ -123,108 +233,78 @@ class DbTestCase(DbBase):
             logging.debug("Item doesn't exist")
             return []
         ids = [_id[0] for _id in item]
-        logging.debug("Item exist. ID : %s", str(ids))
+        logging.debug("Item exist. ID : %s", ids)
         return ids
 
+    def isSame(self, testSessionId: int, data: dict) -> bool:
+        """Checks if test case data of test session from TAS is same as stored
+        one. Used for test sessions stored without content hash.
+
+        Args:
+            testSessionId (int): ID of test session
+            data (dict): Test session data from TAS including tsGroups
+
+        Returns:
+            bool: True if every test case and its TCL variables are same
+        """
+        query = f"SELECT testcase, boolean, numeric, string FROM TestCase WHERE testSessionId={testSessionId};"
+        items = super().select(query)
+        if not items:
+            return False
+        rows = self.parseTestSuiteData(testSessionId, data["tsGroups"])
+        stored = {
+            testcase: (eval(boolean), eval(numeric), eval(string))
+            for testcase, boolean, numeric, string in items
+        }
+        fetched = {
+            testcase: (eval(boolean), eval(numeric), eval(string))
+            for _, testcase, boolean, numeric, string in rows
+        }
+        return stored == fetched
+
+    def getContentHash(self, data: dict) -> str:
+        """Hashes test session data, so unchanged test session is detected
+        even when TAS doesn't support conditional request.
+
+        Args:
+            data (dict): Test session data from TAS including tsGroups
+
+        Returns:
+            str: SHA-256 of canonical JSON of tsGroups
+        """
+        content = json.dumps(data.get("tsGroups", []), sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
     def parseTestSuiteData(self, testSessionId: int, tsGroups: dict) -> list:
-        tclData = {}
+        """Parses test cases of test session from TAS into rows of TestCase
+        table. Same test cases are merged as Parser.parseXml does.
 
+        Args:
+            testSessionId (int): ID of test session
+            tsGroups (dict): Test server groups of test session from TAS
+
+        Returns:
+            list: list of tuple(testSessionId, testCase, boolean, numeric, string)
+        """
+        tclData = {}
         for tsGroup in tsGroups:
-            for tc, item in self.parseTestServerGroup(tsGroup).items():
-                if tc not in tclData:
-                    tclData[tc] = item
-                else:
-                    origTclData = tclData[tc]["boolean"]
-                    newTclData = item["boolean"]
-                    for tcl, value in newTclData.items():
-                        if tcl not in origTclData:
-                            tclData[tc]["boolean"][tcl] = value
-                        else:
-                            origValue = origTclData[tcl]
-                            newValue = origValue or value
-                            tclData[tc]["boolean"][tcl] = newValue
-
-        result = []
-        for testCase in tclData.keys():
-            result.append(
-                (
-                    testSessionId,
-                    testCase,
-                    str(tclData[testCase]["boolean"]),
-                    str(tclData[testCase]["numeric"]),
-                    str(tclData[testCase]["string"]),
+            for testCase in tsGroup["testCases"]:
+                boolean, numeric, string = splitTcls(
+                    flattenParameters(testCase["parameters"])
+                )
+                mergeTestCase(
+                    tclData,
+                    testCase["type"],
+                    {"boolean": boolean, "numeric": numeric, "string": string},
                 )
-            )
 
-        return result
-
-    def parseTestServerGroup(self, tsGroupData) -> dict:
-        tsData = {}
-        for testCase in tsGroupData["testCases"]:
-            boolean, numeric, string = self.parseDict(testCase["parameters"])
-
-            if testCase["type"] not in tsData:
-                tsData[testCase["type"]] = {
-                    "boolean": boolean,
-                    "numeric": numeric,
-                    "string": string,
-                }
-            else:
-                # Merge boolean values of same testcase
-                # newValue = origValue OR newValue
-                for tcl, value in boolean.items():
-                    if tcl not in tsData[testCase["type"]]:
-                        tsData[testCase["type"]][tcl] = value
-                    else:
-                        origValue = tsData[testCase["type"]][tcl]
-                        newValue = origValue or value
-                        tsData[testCase["type"]][tcl] = newValue
-        return tsData
-
-    def parseDict(self, data, parent: str = None) -> tuple:
-        boolean = {}
-        numerical = {}
-        string = {}
-        for k, v in data.items():
-            if parent is not None:
-                k = "_".join([parent, k])
-            v = self.typeEncoder(v)
-            if isinstance(v, bool):
-                boolean[k] = v
-            elif isinstance(v, int) or isinstance(v, float):
-                numerical[k] = v
-            elif isinstance(v, str):
-                string[k] = v if v != "" else None
-            elif isinstance(v, dict):
-                _b, _n, _s = self.parseDict(v, parent=k)
-                boolean.update(_b)
-                numerical.update(_n)
-                string.update(_s)
-            elif isinstance(v, list):
-                for _v in v:
-                    if isinstance(_v, dict):
-                        _b, _n, _s = self.parseDict(_v, parent=k)
-                        boolean.update(_b)
-                        numerical.update(_n)
-                        string.update(_s)
-        return boolean, numerical, string
-
-    def typeEncoder(self, value):
-        if value in ["true", "Enabled"]:
-            return True
-        if value in ["false", "Disabled"]:
-            return False
-        if isinstance(value, bool):
-            return value
-        if isinstance(value, str):
-            try:
-                value = int(value)
-                return value
-            except:
-                pass
-            try:
-                value = float(value)
-                return value
-            except:
-                pass
-        return value
+        return [
+            (
+                testSessionId,
+                testCase,
+                str(tcData["boolean"]),
+                str(tcData["numeric"]),
+                str(tcData["string"]),
+            )
+            for testCase, tcData in tclData.items()
+        ]
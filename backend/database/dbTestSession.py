@@ -1,14 +1,40 @@
 import datetime
 import logging
+import re
+import sqlite3
 import sys
 
-from .dbBase import DbBase
+from .dbBase import DbBase, getTasUrl
+
+SYNC_COLUMNS = ("etag", "last_modified", "content_hash")
+
+# BM25 weights of name, description, keywords in full-text search
+TEXT_WEIGHTS = (3.0, 1.0, 2.0)
+
+
+def makeTextQuery(text: str) -> str:
+    """Makes FTS5 query which matches any word of text. Words are quoted, so
+    text can't break syntax of query.
+
+    Args:
+        text (str): Free text, i.e. "volte ipsec attach"
+
+    Returns:
+        str: FTS5 query. None if text has no word.
+    """
+    words = list(
+        dict.fromkeys(word.lower() for word in re.findall(r"[^\W_]+", text or ""))
+    )
+    if not words:
+        return None
+    return " OR ".join(f'"{word}"' for word in words)
 
 
 class DbTestSession(DbBase):
-    def __init__(self, connection, userInfo):
-        super().__init__(connection, userInfo)
+    def __init__(self, connection, userInfo, changeLog=None):
+        super().__init__(connection, userInfo, changeLog)
         self.itemCount = -1
+        self.textSearch = False
         self.setup()
 
     def setup(self) -> None:
@@ -20,11 +46,33 @@ class DbTestSession(DbBase):
             if not self.create():
                 logging.error("Failed to create TestSession table. Aborting...")
                 sys.exit()
+        if not self.migrate():
+            logging.error(
+                "Failed to add sync columns to TestSession table. Aborting..."
+            )
+            sys.exit()
         self.itemCount = super().getItemCount("TestSession")
         if self.itemCount == -1:
             logging.warning("Failed to get item count of TestSession table")
+        self.textSearch = self.setupText()
         logging.info("Setup Finished | %d items in TestSession", self.itemCount)
 
+    def setupText(self) -> bool:
+        """Sets up TestSessionText table, full-text index of test sessions.
+        Index is filled from TestSession table if it is out of sync, i.e. for
+        database created by older version.
+
+        Returns:
+            bool: True if full-text search is available
+        """
+        if not super().isTableExist("TestSessionText"):
+            if not self.createText():
+                logging.warning("SQLite has no FTS5. Full-text search is disabled")
+                return False
+        if super().getItemCount("TestSessionText") != self.itemCount:
+            self.rebuildText()
+        return True
+
     # CREATE
     def create(self) -> bool:
         """Creates TestSession table.
@@ -40,7 +88,10 @@ class DbTestSession(DbBase):
                 keywords TEXT ,
                 description TEXT,
                 status TEXT,
-                last_update DATE
+                last_update DATE,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT
             );"""
         super().execute(query)
         if not super().isTableExist("TestSession"):
@@ -49,6 +100,43 @@ class DbTestSession(DbBase):
         logging.debug("Success")
         return True
 
+    def migrate(self) -> bool:
+        """Adds columns for change detection(etag, last_modified, content_hash)
+        to TestSession table created by older version.
+
+        Returns:
+            bool: True if every column exists
+        """
+        query = "PRAGMA table_info(TestSession);"
+        columns = [item[1] for item in super().select(query)]
+        for column in SYNC_COLUMNS:
+            if column not in columns:
+                logging.info("Adding column %s to TestSession table", column)
+                super().execute(f"ALTER TABLE TestSession ADD COLUMN {column} TEXT;")
+        columns = [item[1] for item in super().select(query)]
+        return all(column in columns for column in SYNC_COLUMNS)
+
+    def createText(self) -> bool:
+        """Creates TestSessionText table. FTS5 table over name, description and
+        keywords of test sessions, with ID of test session as rowid.
+
+        Returns:
+            bool: Result of create query
+        """
+        logging.debug("Creating TestSessionText table")
+        query = """CREATE VIRTUAL TABLE TestSessionText USING fts5(
+                name,
+                description,
+                keywords,
+                tokenize='unicode61'
+            );"""
+        super().execute(query)
+        if not super().isTableExist("TestSessionText"):
+            logging.error("Failed to create TestSessionText table")
+            return False
+        logging.debug("Success")
+        return True
+
     # READ
     def getInfo(self, testSessionId: int) -> dict:
         """Fetch information about given test session.
@@ -65,8 +153,21 @@ class DbTestSession(DbBase):
         if not item:
             logging.debug("Failed to find item with id %d", testSessionId)
             return {}
-        item = item[0]
-        testSession = {
+        testSession = self.makeInfo(item[0])
+        logging.debug("Fetched test session information")
+        return testSession
+
+    def makeInfo(self, item: tuple) -> dict:
+        """Makes information of test session from row of TestSession table.
+
+        Args:
+            item (tuple): id, tasId, name, keywords, description, status,
+            last_update of test session
+
+        Returns:
+            dict: Information about test session
+        """
+        return {
             "id": item[0],
             "tasId": item[1],
             "name": item[2],
@@ -75,8 +176,6 @@ class DbTestSession(DbBase):
             "status": item[5],
             "last_update": item[6],
         }
-        logging.debug("Fetched test session information")
-        return testSession
 
     def getValidTestSessionIds(self) -> list:
         """Fetch test sessions that are able to download from TAS.
@@ -93,6 +192,97 @@ class DbTestSession(DbBase):
         logging.debug("Fetched %d items", len(items))
         return [item[0] for item in items]
 
+    def isValid(self, testSessionId: int) -> bool:
+        """Checks if test session is able to download from TAS.
+
+        Args:
+            testSessionId (int): ID of test session
+
+        Returns:
+            bool: True if test session is valid
+        """
+        query = f"SELECT id FROM TestSession WHERE id={testSessionId} AND status=1;"
+        return bool(super().select(query))
+
+    def getSyncInfo(self, testSessionId: int) -> dict:
+        """Fetch validators of last fetch of test session from TAS.
+
+        Args:
+            testSessionId (int): ID for test session
+
+        Returns:
+            dict: etag, lastModified, contentHash of test session.
+            Empty dict if test session doesn't exist.
+        """
+        logging.debug("Fetching sync information of test session %d", testSessionId)
+        query = f"SELECT etag, last_modified, content_hash FROM TestSession WHERE id={testSessionId};"
+        item = super().select(query)
+        if not item:
+            logging.debug("Failed to find item with id %d", testSessionId)
+            return {}
+        etag, lastModified, contentHash = item[0]
+        return {"etag": etag, "lastModified": lastModified, "contentHash": contentHash}
+
+    def search(self, text: str, limit: int = -1) -> list:
+        """Searches test sessions whose name, description or keywords have
+        words of text, ranked by BM25.
+
+        Args:
+            text (str): Free text to search
+            limit (int, optional): Maximum number of results. Defaults to -1, no limit.
+
+        Returns:
+            list: list of tuple(testSessionId, relevance) in descending relevance.
+        """
+        query = makeTextQuery(text)
+        if not self.textSearch or query is None:
+            return []
+        logging.debug("Searching test sessions with %s", query)
+        weights = ", ".join(str(weight) for weight in TEXT_WEIGHTS)
+        items = super().select(
+            f"SELECT rowid, -bm25(TestSessionText, {weights}) AS relevance "
+            f"FROM TestSessionText WHERE TestSessionText MATCH '{query}' "
+            f"ORDER BY relevance DESC LIMIT {int(limit)};"
+        )
+        logging.debug("Found %d test sessions", len(items))
+        return items
+
+    def searchInfo(self, text: str, limit: int = 20, validOnly: bool = True) -> list:
+        """Searches test sessions like search(), and reads their information
+        in the same query. Status and limit are applied by SQLite, so common
+        words don't read every match.
+
+        Args:
+            text (str): Free text to search
+            limit (int, optional): Maximum number of results. Defaults to 20.
+            validOnly (bool, optional): Only test sessions available on TAS. Defaults to True.
+
+        Returns:
+            list: Information about test sessions with relevance score, in
+            descending relevance.
+        """
+        query = makeTextQuery(text)
+        if not self.textSearch or query is None:
+            return []
+        logging.debug("Searching information of test sessions with %s", query)
+        weights = ", ".join(str(weight) for weight in TEXT_WEIGHTS)
+        condition = "AND TestSession.status=1 " if validOnly else ""
+        items = super().select(
+            "SELECT TestSession.id, TestSession.tasId, TestSession.name, "
+            "TestSession.keywords, TestSession.description, TestSession.status, "
+            f"TestSession.last_update, -bm25(TestSessionText, {weights}) AS relevance "
+            "FROM TestSessionText JOIN TestSession ON TestSession.id=TestSessionText.rowid "
+            f"WHERE TestSessionText MATCH '{query}' {condition}"
+            f"ORDER BY relevance DESC LIMIT {int(limit)};"
+        )
+        results = []
+        for item in items:
+            testSession = self.makeInfo(item)
+            testSession["score"] = item[7]
+            results.append(testSession)
+        logging.debug("Found %d test sessions", len(results))
+        return results
+
     # UPDATE (INSERT)
     def insert(self, tasInfo: dict, testSessionInfo: dict) -> int:
         """Adds new TestSession item to database
@@ -109,7 +299,7 @@ class DbTestSession(DbBase):
         logging.debug("Adding new TestSession item")
         name = testSessionInfo.get("name", None)
         keywords = testSessionInfo.get("keywords", None)
-        description = testSessionInfo.get("description, None")
+        description = testSessionInfo.get("description", None)
         if name is None:
             logging.error("Name should be specified")
             return -1
@@ -142,8 +332,67 @@ class DbTestSession(DbBase):
 
         logging.debug("Success | ID : %d", testSessionId)
         self.itemCount = super().getItemCount("TestSession")
+        self.insertText(testSessionId, name, description, keywords)
+        super().logChange("TestSession", testSessionId, "insert", int(status))
         return testSessionId
 
+    def insertText(
+        self, testSessionId: int, name: str, description: str, keywords: str
+    ) -> bool:
+        """Adds test session to full-text index.
+
+        Args:
+            testSessionId (int): ID of test session
+            name (str): Name of test session
+            description (str): Description of test session
+            keywords (str): Keywords of test session, as stored in TestSession table
+
+        Returns:
+            bool: Result of INSERT query
+        """
+        if not self.textSearch:
+            return False
+        keywords = " ".join(eval(keywords)) if keywords else None
+        query = "INSERT OR REPLACE INTO TestSessionText (rowid, name, description, keywords) VALUES (?, ?, ?, ?);"
+        if super().insert(query, (testSessionId, name, description, keywords)) == -1:
+            logging.error(
+                "Failed to add test session %d to full-text index", testSessionId
+            )
+            return False
+        return True
+
+    def rebuildText(self) -> int:
+        """Fills full-text index with every item of TestSession table.
+
+        Returns:
+            int: Number of indexed test sessions. -1 if failed.
+        """
+        logging.info("Building full-text index of test sessions")
+        items = super().select(
+            "SELECT id, name, description, keywords FROM TestSession;"
+        )
+        rows = [
+            (
+                testSessionId,
+                name,
+                description,
+                " ".join(eval(keywords)) if keywords else None,
+            )
+            for testSessionId, name, description, keywords in items
+        ]
+        try:
+            with self.transaction():
+                self.connection.execute("DELETE FROM TestSessionText;")
+                self.connection.executemany(
+                    "INSERT INTO TestSessionText (rowid, name, description, keywords) VALUES (?, ?, ?, ?);",
+                    rows,
+                )
+        except sqlite3.Error:
+            logging.error("Failed to build full-text index")
+            return -1
+        logging.info("Indexed %d test sessions", len(rows))
+        return len(rows)
+
     # UPDATE
     def update(self):
         return NotImplementedError
@@ -164,6 +413,36 @@ class DbTestSession(DbBase):
         if super().execute(query) == -1:
             logging.error("Failed to update status")
             return False
+        super().logChange("TestSession", id, "status", int(status))
+        logging.debug("Success")
+        return True
+
+    def updateSyncInfo(
+        self, testSessionId: int, validators: dict, contentHash: str
+    ) -> bool:
+        """Stores validators and content hash of test session fetched from TAS,
+        used for conditional GET on next update.
+
+        Args:
+            testSessionId (int): ID of TestSession item
+            validators (dict): etag and lastModified of response
+            contentHash (str): Hash of test session content
+
+        Returns:
+            bool: Result of update action. True if success, else False
+        """
+        logging.debug("Updating sync information of test session %d", testSessionId)
+        query = "UPDATE TestSession SET etag=?, last_modified=?, content_hash=?, last_update=? WHERE id=?;"
+        item = (
+            validators.get("etag", None),
+            validators.get("lastModified", None),
+            contentHash,
+            datetime.date.today(),
+            testSessionId,
+        )
+        if super().insert(query, item) == -1:
+            logging.error("Failed to update sync information")
+            return False
         logging.debug("Success")
         return True
 
@@ -236,16 +515,30 @@ class DbTestSession(DbBase):
             bool: True if exists, else False
         """
         logging.debug("Checking if test session %s exist in TAS", name)
-        address = tasInfo.get("address", None)
-        libraryId = tasInfo.get("libraryId", None)
-        if address is None or libraryId is None:
-            logging.error("TAS address and library ID should be specified")
+        url = self.getUrl(tasInfo, name)
+        if url is None:
             return False
-
-        url = f"http://{address}:8080/api/libraries/{libraryId}/testSessions/{name}"
         status, _ = super().syncSendGetRequest(url)
         if not status:
             logging.debug("Test session doesn't exist")
             return False
         logging.debug("Test session %s is alive", name)
         return True
+
+    def getUrl(self, tasInfo: dict, name: str) -> str:
+        """Makes URL of test session in TAS.
+
+        Args:
+            tasInfo (dict): Information to TAS. Should include
+            address and libraryId.
+            name (str): name of test session
+
+        Returns:
+            str: URL of test session. None if TAS information is missing.
+        """
+        address = tasInfo.get("address", None)
+        libraryId = tasInfo.get("libraryId", None)
+        if address is None or libraryId is None:
+            logging.error("TAS address and library ID should be specified")
+            return None
+        return getTasUrl(address, f"/libraries/{libraryId}/testSessions/{name}")
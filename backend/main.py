@@ -1,40 +1,313 @@
+import asyncio
 import datetime
 import json
 import logging
 import os
-from typing import Dict, List, Union
+import shutil
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Union
 from uuid import UUID, uuid4
+from zipfile import BadZipFile, ZipFile
 
 import aiohttp
-from app import Finder, Parser
+from app import (
+    LSH,
+    Cluster,
+    Finder,
+    IdfScorer,
+    Parser,
+    Profiler,
+    ResultCache,
+    SearchIndex,
+    SimilarityGraph,
+    parsePredicates,
+)
+from app.admission import ADMITTED, AdmissionController, AdmissionLane
+from app.metrics import metrics, newTraceId
+from app.task.vocab import TclData
 from app.utils import Encoder, setLogger, writeFile
-from database import Database
-from fastapi import FastAPI, File, Request, Response, UploadFile, status
+from database import AsyncDatabase, Database, getTasUrl
+from fastapi import FastAPI, File, Form, Request, Response, UploadFile, status
 from fastapi.exceptions import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi_utils.tasks import repeat_every
 from pydantic import BaseModel, Field
 
 # Setup
-setLogger(3)
+setLogger(
+    os.environ.get("CIFINDER_LOG_LEVEL", "INFO"),
+    queued=os.environ.get("CIFINDER_LOG_QUEUED", "1") == "1",
+)
 basePath = os.getcwd()
 
-## Setup Database
-db = Database(os.path.join(basePath, "database"))
+## Setup Database. Initial crawl of empty database runs in background
+db = Database(os.path.join(basePath, "database"), lazy=True)
+## Async access to database for handlers on event loop, on its own thread
+adb = AsyncDatabase(db)
+
+## Create candidate pre-selection modules
+clusterPath = os.path.join(basePath, "database", "cluster.snapshot")
+cluster = Cluster(db, modelPath=clusterPath)
+lshPath = os.path.join(basePath, "database", "lsh.snapshot")
+lsh = LSH(db, modelPath=lshPath)
+
+## Create search index snapshot, shared by every worker through mmap
+searchIndexPath = os.path.join(basePath, "database", "search.snapshot")
+searchIndex = SearchIndex(
+    db,
+    snapshotPath=searchIndexPath,
+    maxOverlay=int(os.environ.get("CIFINDER_SEARCH_OVERLAY_SIZE", 1000)),
+)
+
+## Create IDF scorer of boolean TCL variables
+idfScorerPath = os.path.join(basePath, "database", "idf.snapshot")
+idfScorer = IdfScorer(db, modelPath=idfScorerPath)
 
 ## Create comparison module
-finder = Finder(db)
+finder = Finder(db, cluster=cluster, lsh=lsh, index=searchIndex, scorers=[idfScorer])
+
+## Create similarity graph of stored test sessions for /Similar
+similarityGraphPath = os.path.join(basePath, "database", "similar.snapshot")
+similarityGraph = SimilarityGraph(
+    db,
+    finder,
+    modelPath=similarityGraphPath,
+    topn=int(os.environ.get("CIFINDER_SIMILAR_TOPN", 10)),
+)
+
+## Set when database and search index are ready for /Result
+ready = threading.Event()
+SETUP_RETRY_SECONDS = 60
+
+
+def buildSearchIndex() -> None:
+    """Exports search index snapshot, counts frequency of TCL variables for
+    IDF scorer, builds candidate pre-selection models from database, saves
+    them and reports their recall against exhaustive search.
+    """
+    searchIndex.build()
+    if idfScorer.build():
+        idfScorer.save()
+    for mode, model in [("cluster", cluster), ("lsh", lsh)]:
+        if model.build():
+            model.save()
+            finder.evaluateRecall(mode, sampleSize=20)
+
+
+def initialize() -> None:
+    """Sets up database and loads search index from snapshot. Search index is
+    built if there is no snapshot, and changes of database made after the
+    snapshot are applied.
+    Runs in background thread on startup, so server answers while database is
+    crawled from default TAS.
+    """
+    if ready.is_set():
+        return
+    with metrics.timer("startup.database"):
+        while not db.setup():
+            logging.error(
+                "Failed to set up database. Retrying in %d seconds",
+                SETUP_RETRY_SECONDS,
+            )
+            time.sleep(SETUP_RETRY_SECONDS)
+
+    with metrics.timer("startup.searchIndex"):
+        models = [searchIndex, idfScorer, cluster, lsh]
+        if not all([model.load() for model in models]):
+            buildSearchIndex()
+
+        ## Apply changes of database to search index incrementally
+        for model in models:
+            for change in db.getChanges(model.version):
+                model.apply(change)
+            db.addListener(model.apply)
+        if not searchIndex.isReady():
+            searchIndex.build()
+    ready.set()
+    logging.info("Server is ready. Database version %d", db.version)
+
+    with metrics.timer("startup.similarityGraph"):
+        if not similarityGraph.load() and similarityGraph.build():
+            similarityGraph.save()
+        for change in db.getChanges(similarityGraph.version):
+            similarityGraph.apply(change)
+        db.addListener(similarityGraph.apply)
+        refreshSimilarityGraph()
+
+
+def refreshSimilarityGraph() -> None:
+    """Searches neighbours of test sessions changed since last refresh, and
+    saves similarity graph.
+    """
+    if not similarityGraph.isReady():
+        return
+    with metrics.timer("similarityGraph.refresh"):
+        refreshed = similarityGraph.refresh()
+    if refreshed:
+        logging.info("Refreshed neighbours of %d test sessions", refreshed)
+        similarityGraph.save()
+
+
+## Create cache for search results
+resultCache = ResultCache(maxSize=128)
+db.addListener(resultCache.apply)
+
+## Create on-demand profiler. Disabled unless admin token is set.
+profiler = Profiler(
+    token=os.environ.get("CIFINDER_PROFILE_TOKEN"),
+    profilePath=os.path.join(basePath, "tmp", "profiles"),
+    interval=float(os.environ.get("CIFINDER_PROFILE_INTERVAL", 60)),
+)
 
 ## Create parsing module
 suiteReaderPath = os.path.join(basePath, "res", "SuiteReader.jar")
-parser = Parser(basePath=basePath, suiteReaderPath=suiteReaderPath)
+parser = Parser(
+    basePath=basePath,
+    suiteReaderPath=suiteReaderPath,
+    reader=os.environ.get("CIFINDER_STE_READER", "suiteReader"),
+    profiler=profiler,
+)
 
 ## Make tmp folder
 if not (os.path.isdir(os.path.join(basePath, "tmp"))):
     os.mkdir(os.path.join(basePath, "tmp"))
 
-app = FastAPI()
+## Admission control of /Input(parsing STE) and /Result(searching)
+admission = AdmissionController(
+    [
+        AdmissionLane(
+            "parse",
+            limit=int(os.environ.get("CIFINDER_PARSE_CONCURRENCY", 2)),
+            queueSize=int(os.environ.get("CIFINDER_PARSE_QUEUE", 16)),
+            maxWait=float(os.environ.get("CIFINDER_ADMISSION_MAX_WAIT", 30)),
+        ),
+        AdmissionLane(
+            "search",
+            limit=int(os.environ.get("CIFINDER_SEARCH_CONCURRENCY", os.cpu_count())),
+            queueSize=int(os.environ.get("CIFINDER_SEARCH_QUEUE", 32)),
+            maxWait=float(os.environ.get("CIFINDER_ADMISSION_MAX_WAIT", 30)),
+        ),
+    ]
+)
+
+## Limits of /Batch
+BATCH_MAX_FILES = int(os.environ.get("CIFINDER_BATCH_MAX_FILES", 50))
+BATCH_PARSE_CONCURRENCY = int(os.environ.get("CIFINDER_BATCH_PARSE_CONCURRENCY", 4))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts background initialization and repeated tasks. Server starts
+    answering right away, and /ready tells when /Result can be served.
+    """
+    threading.Thread(target=initialize, name="initialize", daemon=True).start()
+    await removeExpiredSteData()
+    await update()
+    await validate()
+    yield
+    adb.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+PROFILED_ROUTES = ("/Input", "/Result")
+
+
+@app.middleware("http")
+async def profileRequest(request: Request, call_next):
+    """Profiles /Input and /Result when admin asks for it with X-Profile-Token header
+    or profile query parameter. Profile ID is returned in X-Profile-Id header.
+    """
+    if not profiler.isEnabled() or not request.url.path.startswith(PROFILED_ROUTES):
+        return await call_next(request)
+    token = request.headers.get("X-Profile-Token") or request.query_params.get(
+        "profile"
+    )
+    if token is None:
+        return await call_next(request)
+    if not profiler.isAuthorized(token):
+        logging.error("Rejected profile request with invalid token")
+        return PlainTextResponse(
+            "Invalid profile token", status_code=status.HTTP_403_FORBIDDEN
+        )
+
+    session, retryAfter = profiler.start(request.url.path)
+    if session is None:
+        return PlainTextResponse(
+            "Profiler is busy",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retryAfter)},
+        )
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.finish(session)
+    if session.stored:
+        response.headers["X-Profile-Id"] = session.profileId
+    return response
+
+
+@app.middleware("http")
+async def traceRequest(request: Request, call_next):
+    """Assigns trace ID to request and measures elapsed time of each route.
+    Trace ID is taken from X-Trace-Id header if client gives one.
+    """
+    requestId = newTraceId(request.headers.get("X-Trace-Id"))
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route", None)
+    metrics.observe(
+        "request_seconds",
+        ("route", route.path if route is not None else "unmatched"),
+        time.perf_counter() - start,
+        "Elapsed time of each route",
+    )
+    metrics.inc(
+        "responses_total",
+        ("status", response.status_code),
+        help="Number of responses by status code",
+    )
+    response.headers["X-Trace-Id"] = requestId
+    return response
+
+
+def collectMetrics() -> list:
+    """Collects current state of server for /metrics"""
+    cacheStats = resultCache.getStats()
+    return [
+        ("ready", "1 if server is ready for /Result", int(ready.is_set())),
+        ("db_version", "Version of database", db.version),
+        (
+            "search_index_ready",
+            "1 if search index snapshot is used for search",
+            int(searchIndex.isReady()),
+        ),
+        (
+            "similarity_graph_ready",
+            "1 if neighbours of stored test sessions are served by /Similar",
+            int(similarityGraph.isReady()),
+        ),
+        ("parsed_ste_items", "Number of parsed STE data in memory", len(ParsedSteData)),
+        ("result_cache_size", "Number of cached results", cacheStats["size"]),
+        ("result_cache_hits", "Number of result cache hits", cacheStats["hits"]),
+        ("result_cache_misses", "Number of result cache misses", cacheStats["misses"]),
+    ]
+
+
+metrics.addCollector(collectMetrics)
+metrics.addCollector(admission.collect)
+metrics.addCollector(adb.collect)
 
 # # Mount frontend HTML file
 # templatesPath = os.path.join(basePath, "build")
@@ -53,16 +326,60 @@ class tclFilterItem(BaseModel):
     items: list
 
 
+class numericConfigItem(BaseModel):
+    mode: Literal["exact", "tolerance", "relative"] = "relative"
+    tolerance: float = 0.0
+    weight: float = 1.0
+
+
+class textConfigItem(BaseModel):
+    query: Union[str, None] = None
+    weight: float = 1.0
+
+
 class findConfigItem(BaseModel):
     topk: int
     testCaseBoolean: Union[List[tclFilterItem], None] = None
     testCaseString: Union[List[tclFilterItem], None] = None
+    mode: Literal["exact", "cluster", "lsh"] = "exact"
+    numeric: Union[numericConfigItem, None] = None
+    scorer: Literal["count", "idf"] = "count"
+    text: Union[textConfigItem, None] = None
+
+
+class predicateItem(BaseModel):
+    tcl: str
+    value: Union[bool, int, float, str, None] = None
+
+
+class queryItem(BaseModel):
+    testCase: str
+    predicates: List[predicateItem] = []
+    where: Union[str, None] = None  # "VolteEn=true AND TestActivity=Attach"
+    validOnly: bool = True
+    limit: int = 1000
+
+
+class shardFindItem(BaseModel):
+    steData: dict
+    findConfig: findConfigItem
+    frequency: Union[dict, None] = None
+
+
+class shardFrequencyItem(BaseModel):
+    testCases: List[str]
+
+
+class shardDetailItem(BaseModel):
+    steData: dict
+    scores: Dict[int, Union[int, float]]
 
 
 class Item(BaseModel):
     uid: UUID = Field(default_factory=uuid4)
     status: str = "Waiting"  # ['Waiting', 'Reading', 'Parsing', 'Finding', 'Complete']
     filePath: str = None
+    size: int = 0
     steData: dict = None
     topk: dict = None
     time: datetime.datetime = datetime.datetime.now()
@@ -71,7 +388,6 @@ class Item(BaseModel):
 ParsedSteData: Dict[UUID, Item] = {}
 
 
-@app.on_event("startup")
 @repeat_every(seconds=60 * 20)  # 20 minutes
 def removeExpiredSteData() -> None:
     """repeat_every
@@ -92,14 +408,14 @@ def removeExpiredSteData() -> None:
     logging.info("%d items in ParsedSteData", len(ParsedSteData))
 
 
-@app.on_event("startup")
-@repeat_every(seconds=7 * 24 * 60 * 60)  # every week
+@repeat_every(seconds=24 * 60 * 60)  # every day
 def update() -> None:
     """
     Updates test sessions with registered TAS.
-    It will add new test sessions to database
+    It will add new test sessions to database, and replace test cases of
+    modified ones. Search models apply these changes incrementally.
     """
-    if db.last_update == datetime.date.today():
+    if not ready.is_set() or db.last_update == datetime.date.today():
         return
     logging.info("Updating database")
     updated = db.updateTestSession()
@@ -107,9 +423,10 @@ def update() -> None:
         logging.error("Failed to update database")
         return
     logging.info("Updated %d test sessions", updated)
+    if updated:
+        refreshSimilarityGraph()
 
 
-@app.on_event("startup")
 @repeat_every(seconds=24 * 60 * 60)  # every day
 # caveat : investigate server performance impact on repeat_every tasks
 def validate() -> None:
@@ -118,10 +435,11 @@ def validate() -> None:
     It will check if TAS RESTful API is running at given time
     It will check if test session exist in TAS at given time.
     """
-    if db.last_validated == datetime.date.today():
+    if not ready.is_set() or db.last_validated == datetime.date.today():
         return
     logging.info("Validating database")
     db.updateDatabaseStatus()
+    refreshSimilarityGraph()
 
 
 @app.post("/Input")
@@ -139,15 +457,29 @@ async def parseInput(file: UploadFile = File(...)):
     item = Item()
     ParsedSteData[item.uid] = item
     item.status = "Reading"
-    item.filePath = os.path.join(basePath, "tmp", os.path.basename(file.filename))
+    # Same file may be uploaded by many clients at once
+    item.filePath = os.path.join(
+        basePath, "tmp", f"{item.uid.hex}_{os.path.basename(file.filename)}"
+    )
     isWriteSuccess = await writeFile(file, item.filePath)
     if not isWriteSuccess:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="There was an error uploading the file",
         )
-    item.status = "Parsing"
-    item.steData = await parser.parseSte(item.filePath)
+    item.size = os.path.getsize(item.filePath)
+    async with admission["parse"].admit(item.size) as (admissionStatus, retryAfter):
+        if admissionStatus != ADMITTED:
+            del ParsedSteData[item.uid]
+            os.remove(item.filePath)
+            raise HTTPException(
+                admissionStatus,
+                detail="Server is busy parsing other files. Try again later",
+                headers={"Retry-After": str(retryAfter)},
+            )
+        item.status = "Parsing"
+        # Parser profiles its synchronous part, not await of event loop
+        item.steData = await parser.parseSte(item.filePath)
     if not item.steData:
         logging.error("Failed to parse uploaded file")
         raise HTTPException(
@@ -163,11 +495,12 @@ async def parseInput(file: UploadFile = File(...)):
 
     itemToSend = {"key": item.uid}
     itemToSend.update(item.steData)
-    return json.dumps(itemToSend, indent=4, cls=Encoder)
+    with metrics.timer("route.encode"):
+        return json.dumps(itemToSend, indent=4, cls=Encoder)
 
 
 @app.post("/Result/{uid}")
-def result(uid: UUID, findConfig: findConfigItem):
+async def result(uid: UUID, findConfig: findConfigItem):
     """Find similar CI B2B test suite to given uid. It will search inside scope of
     findConfig which includes topk, and certain TCL variables for such testCase.
 
@@ -178,6 +511,12 @@ def result(uid: UUID, findConfig: findConfigItem):
     Returns:
         json_string: returns json string that includes name, top score, and similarity analysis
     """
+    if not ready.is_set():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is being set up. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
     if uid not in ParsedSteData:
         logging.error("No data found with UUID %s", uid)
         raise HTTPException(
@@ -185,21 +524,66 @@ def result(uid: UUID, findConfig: findConfigItem):
             detail=f"No data found with UUID {uid}",
         )
 
+    item = ParsedSteData[uid]
+    async with admission["search"].admit(item.size) as (admissionStatus, retryAfter):
+        if admissionStatus != ADMITTED:
+            raise HTTPException(
+                admissionStatus,
+                detail="Server is busy searching for other files. Try again later",
+                headers={"Retry-After": str(retryAfter)},
+            )
+        return await run_in_threadpool(profileResult, uid, findConfig)
+
+
+def profileResult(uid: UUID, findConfig: findConfigItem) -> str:
+    """Runs createResult under profiler in worker thread.
+
+    Args:
+        uid (UUID): UUID for parsed data
+        findConfig (findConfigItem): Configuration about topk and TCL constraints on search
+
+    Returns:
+        str: json string that includes name, top score, and similarity analysis
+    """
+    with profiler.profile():
+        return createResult(uid, findConfig)
+
+
+def createResult(uid: UUID, findConfig: findConfigItem) -> str:
+    """Runs search pipeline of /Result.
+
+    Args:
+        uid (UUID): UUID for parsed data
+        findConfig (findConfigItem): Configuration about topk and TCL constraints on search
+
+    Returns:
+        str: json string that includes name, top score, and similarity analysis
+    """
     logging.info("Creating result for UUID %s", uid)
     findConfig = findConfig.dict()
-    topk = findConfig["topk"]
-    filterConfigBoolean = {
-        item["testCase"]: item["items"] for item in findConfig["testCaseBoolean"]
-    }
-    filterConfigString = {
-        item["testCase"]: item["items"] for item in findConfig["testCaseString"]
-    }
-    logging.debug("filterConfig - Boolean: %s", str(filterConfigBoolean))
-    logging.debug("filterConfig - String: %s", str(filterConfigString))
+    filterConfigBoolean, filterConfigString = getFilterConfig(findConfig)
 
     item = ParsedSteData[uid]
+    version = db.version
+    cacheKey = getCacheKey(item.steData, findConfig, version)
+    metadata = resultCache.get(cacheKey)
+    if metadata is not None:
+        logging.info("Found cached result for UUID %s", uid)
+        item.status = "Complete"
+        metadata = dict(metadata, name=item.steData["name"])
+        return json.dumps(metadata, indent=4, cls=Encoder)
+
     item.status = "Finding"
-    scores = finder.find(item.steData, filterConfigBoolean, filterConfigString)
+    with metrics.timer("finder.find"):
+        scores = finder.find(
+            item.steData,
+            filterConfigBoolean,
+            filterConfigString,
+            findConfig["mode"],
+            findConfig["numeric"],
+            findConfig["scorer"],
+            textConfig=findConfig["text"],
+        )
     if not scores:
         logging.error("Failed to find simillar CI Tests to given input")
         raise HTTPException(
@@ -208,18 +592,540 @@ def result(uid: UUID, findConfig: findConfigItem):
         )
     logging.info("Found similar CI test suites from Database")
 
-    topkResult, topScore = finder.getTopk(scores, topk)
-    metadata = {"name": item.steData["name"], "topScore": topScore, "info": []}
+    metadata = analyzeResult(item.steData, scores, findConfig["topk"], version)
+    resultCache.put(cacheKey, metadata)
+
+    item.status = "Complete"
+    with metrics.timer("route.encode"):
+        return json.dumps(metadata, indent=4, cls=Encoder)
+
+
+def getFilterConfig(findConfig: dict) -> tuple:
+    """Gets filters of boolean and string TCL variables from findConfig.
+
+    Args:
+        findConfig (dict): Configuration about topk and TCL constraints on search
+
+    Returns:
+        tuple: ({testCase : TCL variables} of boolean, {testCase : TCL variables} of string)
+    """
+    filterConfigBoolean = {
+        item["testCase"]: item["items"] for item in findConfig["testCaseBoolean"] or []
+    }
+    filterConfigString = {
+        item["testCase"]: item["items"] for item in findConfig["testCaseString"] or []
+    }
+    logging.debug("filterConfig - Boolean: %s", filterConfigBoolean)
+    logging.debug("filterConfig - String: %s", filterConfigString)
+    return filterConfigBoolean, filterConfigString
+
+
+def getCacheKey(steData: dict, findConfig: dict, version: int) -> str:
+    """Creates key of result cache for search of parsed STE.
+
+    Args:
+        steData (dict): Parsed STE data
+        findConfig (dict): Configuration about topk and TCL constraints on search
+        version (int): Version of database
+
+    Returns:
+        str: Key of result cache
+    """
+    filterConfigBoolean, filterConfigString = getFilterConfig(findConfig)
+    return resultCache.makeKey(
+        steData["tclData"],
+        {
+            "topk": findConfig["topk"],
+            "mode": findConfig["mode"],
+            "boolean": filterConfigBoolean,
+            "string": filterConfigString,
+            "numeric": findConfig["numeric"],
+            "scorer": findConfig["scorer"],
+            "text": findConfig["text"],
+        },
+        version,
+    )
+
+
+def analyzeResult(
+    steData: dict, scores: dict, topk: int, version: int, details: dict = None
+) -> dict:
+    """Selects top K test sessions from scores and analyzes difference of
+    TCL variables between input and each of them.
+
+    Args:
+        steData (dict): Parsed STE data
+        scores (dict): Scores from finder
+        topk (int): Top K value
+        version (int): Version of database
+        details (dict, optional): Detail of test sessions already read. Defaults to None.
+
+    Returns:
+        dict: name, top score, version and similarity analysis
+    """
+    with metrics.timer("finder.topk"):
+        topkResult, topScore = finder.getTopk(scores, topk)
+    metadata = {
+        "name": steData["name"],
+        "topScore": topScore,
+        "version": version,
+        "info": analyzeTestSessions(steData, topkResult, details),
+    }
+    return metadata
+
+
+def analyzeTestSessions(steData: dict, topkResult: dict, details: dict = None) -> list:
+    """Reads detail of test sessions and analyzes difference of TCL variables
+    between input and each of them.
+
+    Args:
+        steData (dict): Parsed STE data
+        topkResult (dict): {testSessionId : score} of test sessions to analyze
+        details (dict, optional): {testSessionId : detail} read by AsyncDatabase.
+        Defaults to None, which reads detail from database.
+
+    Returns:
+        list: Detail of test sessions with score and analysis
+    """
+    info = []
     for testSessionId, score in topkResult.items():
-        targetTestSession = db.getTestSessionDetail(testSessionId)
-        analysis = finder.analyzeTclDifference(
-            item.steData["tclData"], targetTestSession["tclData"]
-        )
+        if details is not None:
+            # Details may be shared with other requests
+            targetTestSession = dict(details[testSessionId])
+        else:
+            with metrics.timer("db.detail"):
+                targetTestSession = db.getTestSessionDetail(testSessionId)
+        with metrics.timer("finder.analyze"):
+            analysis = finder.analyzeTclDifference(
+                steData["tclData"], targetTestSession["tclData"]
+            )
         targetTestSession.update({"score": score, "testCase": analysis})
-        metadata["info"].append(targetTestSession)
+        info.append(targetTestSession)
+    return info
 
-    item.status = "Complete"
-    return json.dumps(metadata, indent=4, cls=Encoder)
+
+@app.post("/Batch")
+async def batch(files: List[UploadFile] = File(...), findConfig: str = Form(...)):
+    """Searches similar CI B2B test suites of many *.ste files at once.
+    Files can be uploaded one by one or as zip files of *.ste files. They are
+    parsed concurrently, searched together in one search index snapshot, and
+    results are streamed as newline-delimited JSON as each of them completes.
+
+    Args:
+        files (List[UploadFile]): Uploaded *.ste or *.zip files from client
+        findConfig (str): JSON string of findConfigItem shared by every file
+
+    Returns:
+        StreamingResponse: Line of JSON for each STE, including file, status
+        ('Complete', 'Failed', 'Rejected') and result or detail. Rejected
+        line has statusCode(429, 503) and retryAfter of admission control.
+    """
+    if not ready.is_set():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is being set up. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
+    try:
+        findConfig = findConfigItem(**json.loads(findConfig)).dict()
+    except (ValueError, TypeError) as e:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid findConfig: {e}"
+        )
+
+    if admission["parse"].isFull():
+        raise HTTPException(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Server is busy parsing other files. Try again later",
+            headers={"Retry-After": str(admission["parse"].getRetryAfter())},
+        )
+
+    batchPath = os.path.join(basePath, "tmp", f"batch_{uuid4().hex}")
+    os.mkdir(batchPath)
+    steFiles = await readBatchFiles(files, batchPath)
+    if not steFiles or len(steFiles) > BATCH_MAX_FILES:
+        shutil.rmtree(batchPath, ignore_errors=True)
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch should have 1 to {BATCH_MAX_FILES} STE files",
+        )
+    logging.info("Got batch of %d STE files", len(steFiles))
+    return StreamingResponse(
+        streamBatch(steFiles, batchPath, findConfig),
+        media_type="application/x-ndjson",
+    )
+
+
+async def readBatchFiles(files: list, batchPath: str) -> list:
+    """Writes uploaded files of batch into batchPath. *.ste files inside zip
+    files are extracted.
+
+    Args:
+        files (list): Uploaded files
+        batchPath (str): Path to folder of batch
+
+    Returns:
+        list: Paths to *.ste files
+    """
+    steFiles = []
+    for idx, file in enumerate(files):
+        fileName = os.path.basename(file.filename or f"{idx}.ste")
+        filePath = os.path.join(batchPath, f"{idx}_{fileName}")
+        if not await writeFile(file, filePath):
+            continue
+        if not fileName.lower().endswith(".zip"):
+            steFiles.append(filePath)
+            continue
+        try:
+            with ZipFile(filePath) as zipFile:
+                for member in zipFile.infolist():
+                    memberName = os.path.basename(member.filename)
+                    if member.is_dir() or not memberName.lower().endswith(".ste"):
+                        continue
+                    steFile = os.path.join(
+                        batchPath, f"{idx}.{len(steFiles)}_{memberName}"
+                    )
+                    with zipFile.open(member) as src, open(steFile, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    steFiles.append(steFile)
+        except (BadZipFile, OSError):
+            logging.error("Failed to extract zip file %s", fileName)
+        os.remove(filePath)
+    return steFiles
+
+
+async def streamBatch(steFiles: list, batchPath: str, findConfig: dict):
+    """Parses STE files of batch concurrently, searches them together and
+    yields result of each STE as it completes.
+
+    Args:
+        steFiles (list): Paths to *.ste files
+        batchPath (str): Path to folder of batch. Deleted when batch is done.
+        findConfig (dict): Configuration about topk and TCL constraints on search
+
+    Yields:
+        str: Line of JSON for each STE
+    """
+
+    def line(steFile: str, **content) -> str:
+        fileName = os.path.basename(steFile).split("_", 1)[-1]
+        return json.dumps({"file": fileName, **content}, cls=Encoder) + "\n"
+
+    def rejected(steFile: str, admissionStatus: int, retryAfter: int) -> str:
+        return line(
+            steFile,
+            status="Rejected",
+            statusCode=admissionStatus,
+            retryAfter=retryAfter,
+            detail="Server is busy. Try again later",
+        )
+
+    # Batch takes few slots of parse lane at once, so it doesn't fill the queue
+    semaphore = asyncio.Semaphore(BATCH_PARSE_CONCURRENCY)
+    sizes = {steFile: os.path.getsize(steFile) for steFile in steFiles}
+
+    async def parse(steFile: str):
+        async with semaphore, admission["parse"].admit(sizes[steFile]) as (
+            admissionStatus,
+            retryAfter,
+        ):
+            if admissionStatus != ADMITTED:
+                return steFile, (admissionStatus, retryAfter)
+            try:
+                return steFile, await parser.parseSte(steFile, tmpDir=batchPath)
+            except Exception:
+                logging.exception("Failed to parse %s", steFile)
+                return steFile, None
+
+    try:
+        ## Parse concurrently, and answer cached results right away
+        version = db.version
+        pending = []
+        for task in asyncio.as_completed([parse(steFile) for steFile in steFiles]):
+            steFile, steData = await task
+            if isinstance(steData, tuple):
+                yield rejected(steFile, *steData)
+                continue
+            if not steData:
+                yield line(
+                    steFile, status="Failed", detail="Failed to parse given input"
+                )
+                continue
+            cacheKey = getCacheKey(steData, findConfig, version)
+            metadata = resultCache.get(cacheKey)
+            if metadata is not None:
+                metadata = dict(metadata, name=steData["name"])
+                yield line(steFile, status="Complete", result=metadata)
+                continue
+            pending.append((steFile, steData, cacheKey))
+        if not pending:
+            return
+
+        ## Search every STE in one snapshot
+        filterConfigBoolean, filterConfigString = getFilterConfig(findConfig)
+        size = sum(sizes[steFile] for steFile, _, _ in pending)
+        async with admission["search"].admit(size) as (admissionStatus, retryAfter):
+            if admissionStatus != ADMITTED:
+                for steFile, _, _ in pending:
+                    yield rejected(steFile, admissionStatus, retryAfter)
+                return
+            with metrics.timer("finder.findBatch"):
+                scoresList = await run_in_threadpool(
+                    finder.findBatch,
+                    [steData for _, steData, _ in pending],
+                    filterConfigBoolean,
+                    filterConfigString,
+                    findConfig["mode"],
+                    findConfig["numeric"],
+                    findConfig["scorer"],
+                    findConfig["text"],
+                )
+
+        ## Read detail of every result at once, each test session once
+        testSessionIds = []
+        for scores in scoresList:
+            if scores:
+                topkResult, _ = finder.getTopk(scores, findConfig["topk"])
+                testSessionIds.extend(topkResult)
+        with metrics.timer("db.detail"):
+            details = await adb.getTestSessionDetails(testSessionIds)
+        for (steFile, steData, cacheKey), scores in zip(pending, scoresList):
+            if not scores:
+                yield line(
+                    steFile,
+                    status="Failed",
+                    detail="Failed to find similar CI Tests to given input",
+                )
+                continue
+            metadata = await run_in_threadpool(
+                analyzeResult, steData, scores, findConfig["topk"], version, details
+            )
+            resultCache.put(cacheKey, metadata)
+            yield line(steFile, status="Complete", result=metadata)
+    finally:
+        shutil.rmtree(batchPath, ignore_errors=True)
+
+
+@app.post("/Query")
+def query(queryConfig: queryItem):
+    """Finds test sessions whose test case satisfies TCL predicates, without
+    uploading STE. Predicates are given as list of {tcl, value} and/or as
+    where string joined with AND, and answered from inverted index of search
+    index snapshot.
+
+    Args:
+        queryConfig (queryItem): Test case, predicates and limit of test session IDs
+
+    Returns:
+        JSONResponse: test case, count of matching test sessions, their IDs
+        (up to limit) and version of database
+    """
+    snapshot = searchIndex.getSnapshot() if ready.is_set() else None
+    if snapshot is None:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search index is being built. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
+    predicates = [(item.tcl, item.value) for item in queryConfig.predicates]
+    if queryConfig.where:
+        wherePredicates = parsePredicates(queryConfig.where)
+        if wherePredicates is None:
+            raise HTTPException(
+                status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid predicates: {queryConfig.where}",
+            )
+        predicates.extend(wherePredicates)
+    logging.info("Querying %s with %s", queryConfig.testCase, predicates)
+
+    with metrics.timer("query.index"):
+        testSessionIds = snapshot.query(
+            queryConfig.testCase, predicates, queryConfig.validOnly
+        )
+    return JSONResponse(
+        {
+            "testCase": queryConfig.testCase,
+            "count": len(testSessionIds),
+            "testSessionIds": testSessionIds[: max(queryConfig.limit, 0)].tolist(),
+            "version": snapshot.version,
+        }
+    )
+
+
+@app.get("/Search")
+async def searchTestSessions(q: str, limit: int = 20, validOnly: bool = True):
+    """Finds test sessions by words in their name, description and keywords,
+    ranked by BM25 relevance, without uploading STE.
+
+    Args:
+        q (str): Free text to search, i.e. "volte ipsec"
+        limit (int, optional): Maximum number of results. Defaults to 20.
+        validOnly (bool, optional): Only test sessions available on TAS. Defaults to True.
+
+    Returns:
+        JSONResponse: query, count and information of matching test sessions
+        with relevance score, and version of database
+    """
+    if not ready.is_set():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is being set up. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
+    logging.info("Searching test sessions with %s", q)
+    with metrics.timer("search.text"):
+        results = await adb.searchTestSessions(q, max(limit, 0), validOnly)
+    return JSONResponse(
+        {"query": q, "count": len(results), "results": results, "version": db.version}
+    )
+
+
+@app.get("/Similar/{testSessionId}")
+def getSimilarTestSessions(testSessionId: int, limit: int = 10):
+    """Finds stored test sessions most similar to a stored test session from
+    precomputed similarity graph, without uploading STE.
+
+    Args:
+        testSessionId (int): ID of test session
+        limit (int, optional): Maximum number of test sessions. Defaults to 10.
+
+    Returns:
+        JSONResponse: test session ID, neighbours with name and score, whether
+        neighbours wait for refresh, and version of similarity graph
+    """
+    if not similarityGraph.isReady():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Similarity graph is being built. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
+    with metrics.timer("similar.lookup"):
+        items = similarityGraph.getNeighbors(testSessionId, max(limit, 0))
+    if items is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND,
+            detail=f"No test session with ID {testSessionId} in similarity graph",
+        )
+    neighbors = []
+    for neighborId, score in items:
+        info = db.TESTSESSION.getInfo(neighborId)
+        neighbors.append({"id": neighborId, "name": info.get("name"), "score": score})
+    return JSONResponse(
+        {
+            "testSessionId": testSessionId,
+            "count": len(neighbors),
+            "neighbors": neighbors,
+            "stale": similarityGraph.isStale(testSessionId),
+            "version": similarityGraph.version,
+        }
+    )
+
+
+def readShardSteData(steData: dict) -> dict:
+    """Converts parsed STE data sent by coordinator as JSON to compact TCL data.
+
+    Args:
+        steData (dict): Parsed STE data with TCL data as dictionary
+
+    Returns:
+        dict: Parsed STE data with TCL data as TclData
+    """
+    tclData = {
+        testCase: TclData.fromDict(tcData)
+        for testCase, tcData in steData["tclData"].items()
+    }
+    return dict(steData, tclData=tclData)
+
+
+@app.post("/Shard/Find")
+def shardFind(shardItem: shardFindItem):
+    """Scores test sessions of this shard for coordinator. Only tie-inclusive
+    top K of this shard is returned, which is enough for coordinator to merge
+    exact top K over every shard.
+
+    Args:
+        shardItem (shardFindItem): Parsed STE data and search configuration
+
+    Returns:
+        Response: version of database and {testSessionId : scores} of top K
+    """
+    if not ready.is_set():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is being set up. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
+    findConfig = shardItem.findConfig.dict()
+    filterConfigBoolean, filterConfigString = getFilterConfig(findConfig)
+    steData = readShardSteData(shardItem.steData)
+    scorer = findConfig["scorer"]
+    if scorer == IdfScorer.name and shardItem.frequency is not None:
+        # Weight with frequency of every shard, same as single backend
+        scorer = IdfScorer.fromFrequency(shardItem.frequency)
+    version = db.version
+    with metrics.timer("finder.find"):
+        scores = finder.find(
+            steData,
+            filterConfigBoolean,
+            filterConfigString,
+            findConfig["mode"],
+            findConfig["numeric"],
+            scorer,
+            textConfig=findConfig["text"],
+        )
+    topkScores = {}
+    if scores:
+        with metrics.timer("finder.topk"):
+            topkResult, _ = finder.getTopk(scores, findConfig["topk"])
+        topkScores = {
+            testSessionId: scores[testSessionId] for testSessionId in topkResult
+        }
+    content = {"version": version, "scores": topkScores}
+    with metrics.timer("route.encode"):
+        return Response(json.dumps(content, cls=Encoder), media_type="application/json")
+
+
+@app.post("/Shard/Frequency")
+def shardFrequency(shardItem: shardFrequencyItem):
+    """Gives counts of IDF scorer for coordinator, which merges them over
+    every shard before search with "idf" scorer.
+
+    Args:
+        shardItem (shardFrequencyItem): Names of test cases of input
+
+    Returns:
+        Response: {testCase : {total, tcls, counts}} of this shard
+    """
+    if not idfScorer.isReady():
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="IDF scorer is being set up. Try again later",
+            headers={"Retry-After": str(SETUP_RETRY_SECONDS)},
+        )
+    content = {"frequency": idfScorer.getFrequency(shardItem.testCases)}
+    with metrics.timer("route.encode"):
+        return Response(json.dumps(content, cls=Encoder), media_type="application/json")
+
+
+@app.post("/Shard/Detail")
+async def shardDetail(shardItem: shardDetailItem):
+    """Analyzes test sessions of this shard selected by coordinator.
+
+    Args:
+        shardItem (shardDetailItem): Parsed STE data and {testSessionId : score}
+
+    Returns:
+        Response: Detail of test sessions with score and analysis
+    """
+    steData = readShardSteData(shardItem.steData)
+    with metrics.timer("db.detail"):
+        details = await adb.getTestSessionDetails(list(shardItem.scores))
+    info = await run_in_threadpool(
+        analyzeTestSessions, steData, shardItem.scores, details
+    )
+    content = {"info": info}
+    with metrics.timer("route.encode"):
+        return Response(json.dumps(content, cls=Encoder), media_type="application/json")
 
 
 @app.post("/Download")
@@ -240,7 +1146,7 @@ async def downloadSte(address: str, libraryId: int, name: str, deleteSte: bool =
     """
     logging.info("Downloading STE")
 
-    url = f"http://{address}:8080/api/testSuites?action=export"
+    url = getTasUrl(address, "/testSuites?action=export")
     headers = {"Authorization": "Basic c21zOmExYjJjM2Q0"}
     params = {
         "library": libraryId,
@@ -260,3 +1166,67 @@ async def downloadSte(address: str, libraryId: int, name: str, deleteSte: bool =
             detail="Failed to generate download link",
         )
     return Response(content=steData, media_type="application/binary")
+
+
+@app.get("/ready")
+def getReadiness():
+    """Readiness probe. Server is ready when database is set up and search
+    index is loaded.
+
+    Returns:
+        JSONResponse: 200 if ready, 503 if not
+    """
+    content = {"ready": ready.is_set(), "version": db.version}
+    return JSONResponse(
+        content,
+        status_code=(
+            status.HTTP_200_OK
+            if ready.is_set()
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
+
+
+@app.get("/metrics")
+def getMetrics():
+    """Exports metrics in Prometheus text format.
+
+    Returns:
+        PlainTextResponse: Metrics of hot path stages, routes and server state
+    """
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/Profile/{profileId}")
+def getProfile(profileId: str, request: Request, format: str = "text"):
+    """Returns profile saved by profiled request. Needs admin token.
+
+    Args:
+        profileId (str): ID from X-Profile-Id header of profiled request
+        format (str, optional): "text" for summary, "pstats" for raw pstats file. Defaults to "text".
+
+    Raises:
+        HTTPException: Raised when token is invalid or profile doesn't exist
+
+    Returns:
+        Response: Text summary sorted by cumulative time or pstats file
+    """
+    token = request.headers.get("X-Profile-Token") or request.query_params.get(
+        "profile"
+    )
+    if not profiler.isAuthorized(token):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Invalid profile token")
+    filePath, summary = profiler.getProfile(profileId)
+    if filePath is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, detail=f"No profile found with ID {profileId}"
+        )
+    if format == "pstats":
+        return FileResponse(
+            filePath,
+            media_type="application/octet-stream",
+            filename=os.path.basename(filePath),
+        )
+    return PlainTextResponse(summary)
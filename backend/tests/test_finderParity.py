@@ -0,0 +1,122 @@
+import json
+import os
+import random
+
+import pytest
+import xmltodict
+from app import Finder, IdfScorer, Parser, SearchIndex
+from benchmark.generator import Generator
+from benchmark.runner import SUITE_READER_PATH
+from database import Database
+
+NUMERIC_CONFIG = {"mode": "tolerance", "tolerance": 0.1, "weight": 1.0}
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    """Synthetic database with search index and IDF scorer that apply
+    changes of database, and inputs parsed from Sessions.xml files."""
+    workDir = str(tmp_path_factory.mktemp("finderParity"))
+    paths = Generator(numTestSessions=60, numTcls=400).makeCorpus(workDir, numXml=3)
+    db = Database(os.path.join(workDir, "database"))
+    index = SearchIndex(db, os.path.join(workDir, "database", "search.snapshot"))
+    idfScorer = IdfScorer(db)
+    assert index.build() and idfScorer.build()
+    db.addListener(index.apply)
+    db.addListener(idfScorer.apply)
+
+    parser = Parser(
+        basePath=workDir, suiteReaderPath=SUITE_READER_PATH, reader="native"
+    )
+    inputStes = []
+    for xmlFile in paths["xmlFiles"]:
+        with open(xmlFile, "r") as f:
+            inputStes.append(parser.parseXml(xmltodict.parse(f.read())))
+    with open(paths["payloadFile"], "r") as f:
+        payloads = json.load(f)["testSessions"]
+    return {
+        "db": db,
+        "index": index,
+        "indexed": Finder(db, index=index, scorers=[idfScorer]),
+        "unindexed": Finder(db, scorers=[idfScorer]),
+        "inputStes": inputStes,
+        "payloads": payloads,
+    }
+
+
+def getFindArgs(inputSte: dict, case: str, rng: random.Random) -> tuple:
+    """Builds input and filters of find() for given case."""
+    filterConfigBoolean, filterConfigString, numericConfig = {}, {}, None
+    testCase = rng.choice(sorted(inputSte["tclData"]))
+    tcData = inputSte["tclData"][testCase]
+    if case == "boolean":
+        tcls = sorted(tcData["boolean"])
+        filterConfigBoolean[testCase] = rng.sample(tcls, min(2, len(tcls)))
+    elif case == "string":
+        tcls = sorted(tcData["string"])
+        filterConfigString[testCase] = rng.sample(tcls, min(1, len(tcls)))
+    elif case == "numeric":
+        numericConfig = NUMERIC_CONFIG
+    elif case == "noTestActivity":
+        # Without TestActivity, string TCL variables are not compared
+        inputSte = dict(
+            inputSte,
+            tclData={
+                name: dict(
+                    item,
+                    string={
+                        tcl: value
+                        for tcl, value in item["string"].items()
+                        if tcl != "TestActivity"
+                    },
+                )
+                for name, item in inputSte["tclData"].items()
+            },
+        )
+    return inputSte, filterConfigBoolean, filterConfigString, numericConfig
+
+
+def assertSameScores(indexed: dict, unindexed: dict) -> None:
+    assert indexed.keys() == unindexed.keys()
+    for testSessionId, item in indexed.items():
+        expected = unindexed[testSessionId]
+        assert sorted(item["testCase"]) == sorted(expected["testCase"])
+        for key in ["boolean", "string", "numeric"]:
+            assert item[key] == pytest.approx(expected[key]), (testSessionId, key)
+
+
+def checkParity(corpus: dict, scorer: str, case: str) -> None:
+    rng = random.Random(f"{scorer}-{case}")
+    for inputSte in corpus["inputStes"]:
+        inputSte, filterBoolean, filterString, numericConfig = getFindArgs(
+            inputSte, case, rng
+        )
+        args = (inputSte, filterBoolean, filterString, "exact", numericConfig, scorer)
+        indexed = corpus["indexed"].find(*args)
+        unindexed = corpus["unindexed"].find(*args)
+        assert unindexed
+        assertSameScores(indexed, unindexed)
+
+
+CASES = ["none", "boolean", "string", "numeric", "noTestActivity"]
+
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("scorer", ["count", "idf"])
+def test_indexMatchesDatabase(corpus, scorer, case):
+    checkParity(corpus, scorer, case)
+
+
+@pytest.mark.parametrize("case", CASES)
+@pytest.mark.parametrize("scorer", ["count", "idf"])
+def test_overlayMatchesDatabase(corpus, scorer, case):
+    db, index = corpus["db"], corpus["index"]
+    if not index.getSnapshot().changed:
+        # Test sessions replaced after snapshot are scored from overlay
+        rng = random.Random(0)
+        testSessionIds = db.TESTSESSION.getValidTestSessionIds()
+        for testSessionId in rng.sample(testSessionIds, 5):
+            payload = rng.choice(corpus["payloads"])
+            assert db.TESTCASE.replace(testSessionId, {"tsGroups": payload["tsGroups"]})
+        assert index.getSnapshot().changed
+    checkParity(corpus, scorer, case)
@@ -0,0 +1,31 @@
+import asyncio
+import glob
+import os
+import shutil
+
+import pytest
+from app import Parser
+from benchmark.runner import SUITE_READER_PATH
+from benchmark.steParity import compare
+
+FIXTURES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "*.ste"))
+)
+
+
+@pytest.fixture
+def parser(tmp_path):
+    return Parser(basePath=str(tmp_path), suiteReaderPath=SUITE_READER_PATH)
+
+
+@pytest.mark.parametrize("steFile", FIXTURES, ids=os.path.basename)
+def test_nativeReaderReadsFixture(parser, steFile):
+    xmlData = parser.readSessionsXml(steFile)
+    assert xmlData is not None
+    assert parser.parseXml(xmlData)["tclData"]
+
+
+@pytest.mark.skipif(shutil.which("java") is None, reason="Java is not available")
+@pytest.mark.parametrize("steFile", FIXTURES, ids=os.path.basename)
+def test_nativeReaderMatchesSuiteReader(parser, steFile, tmp_path):
+    assert asyncio.run(compare(parser, steFile, str(tmp_path))) == "SAME"